@@ -0,0 +1,238 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from data import *
+from logic import RULE_SPECS, suitable_mask
+from rasters import open_layer, open_layers
+from rule_files import install_from_environment
+
+# --- TILED AREA SCAN ---
+# Sweeps a whole region cell by cell instead of checking entered sites: the
+# raster layers (see rasters.py) are read one tile at a time and a project's
+# rules are checked on every cell of the tile at once (logic.suitable_mask).
+#
+# The scan grid is the grid of the first layer (or --grid). Layers on that
+# grid are read as windows; other layers are sampled at its cell centres.
+# Tiles are bands of whole grid rows, about TILE_CELLS cells each, so every
+# read is contiguous and candidate runs never cross a tile edge. Tiles run on
+# a process pool with at most two per worker in flight: memory depends on the
+# tile size and the worker count, not on the area.
+#
+# Outputs:
+#   mask (.npy)        uint8 per cell: 1 suitable, 0 not, 255 no data in a
+#                      layer the project checks. Written tile by tile through
+#                      a memory map, openable with np.load(..., mmap_mode='r').
+#   candidates (.csv)  the suitable cells as runs along a grid row: row, first
+#                      and last column, cell count and the run's bounds.
+#
+# Rules whose field has no layer are checked against --site values (a JSON
+# object of site_details fields) when given, and skipped otherwise. Rule files
+# named by ADVISOR_RULES (see rule_files.py) are loaded here and in every worker.
+#
+# Usage:
+#   python area_scan.py layers --project "Single-Family Home" --mask suitable.npy --candidates suitable.csv
+#   python area_scan.py layers --project "Warehouse (Industrial)" --mask m.npy --site site.json --workers 16
+
+TILE_CELLS = 1 << 20 # cells per tile (a band of whole rows)
+NODATA_CELL = 255
+CANDIDATE_COLUMNS = ['row', 'first_col', 'last_col', 'cells', 'north', 'south', 'west', 'east']
+
+def site_columns(site):
+    """
+    Converts a (partial) site_details dict into one-element rule columns
+    (logic.pack_sites layout). Option keys become their scores and score
+    fields given directly are ignored. Raises ValueError for unknown fields or values.
+    """
+    columns = {}
+    score_fields = {score_field for score_field, _ in SITE_OPTION_FIELDS.values()}
+    for field, value in site.items():
+        if field == 'zoning':
+            if value not in ZONING_OPTIONS:
+                raise ValueError(f"Unknown zoning '{value}'.")
+            columns['zoning'] = np.array([list(ZONING_OPTIONS).index(value)], dtype=np.intp)
+        elif field in SITE_OPTION_FIELDS:
+            score_field, options = SITE_OPTION_FIELDS[field]
+            if value not in options:
+                raise ValueError(f"Unknown {field} '{value}'.")
+            columns[score_field] = np.array([options[value]['score']], dtype=np.float64)
+        elif field in SITE_NUMERIC_FIELDS:
+            try:
+                columns[field] = np.array([float(value)], dtype=np.float64)
+            except (TypeError, ValueError):
+                raise ValueError(f"Field '{field}' must be a number, got {value!r}.")
+        elif field not in score_fields and field != 'project_heading':
+            raise ValueError(f"'{field}' is not a site_details field.")
+    return columns
+
+def row_runs(suitable):
+    """(row, first column, last column) of each run of True cells in a 2-D mask, row by row."""
+    rows, cols = suitable.shape
+    edges = np.zeros((rows, cols + 2), dtype=np.int8)
+    edges[:, 1:-1] = suitable
+    steps = np.diff(edges, axis=1)
+    starts = np.argwhere(steps == 1)
+    ends = np.argwhere(steps == -1)
+    return np.column_stack([starts[:, 0], starts[:, 1], ends[:, 1] - 1])
+
+# --- TILES (run in the workers) ---
+
+_BAND_STATE = {} # (layers path, grid path, mask path) -> (layers, grid layer, mask memmap)
+
+def _band_state(job):
+    if job not in _BAND_STATE:
+        layers_path, grid_path, mask_path = job
+        layers = open_layers(layers_path)
+        grid = open_layer(grid_path) if grid_path else layers[0]
+        _BAND_STATE[job] = layers, grid, np.load(mask_path, mmap_mode='r+')
+    return _BAND_STATE[job]
+
+def _scan_band(job, project, fields, row, rows):
+    # Checks grid rows [row, row + rows) and writes them into the mask.
+    # Returns (row, suitable cells, no-data cells, runs).
+    layers, grid, mask = _band_state(job)
+    columns = {}
+    valid = np.ones(rows * grid.cols, dtype=bool)
+    for layer in layers:
+        if layer.rule_field not in fields:
+            continue # the project does not check it: no need to read it
+        if layer.same_grid(grid):
+            values, ok = layer.read_window(row, 0, rows, grid.cols)
+        else:
+            values, ok = layer.sample_grid(*grid.cell_centres(row, 0, rows, grid.cols))
+        field, column, ok = layer.rule_column(values, ok)
+        columns[field] = column
+        valid &= ok
+    suitable = suitable_mask(columns, project, len(valid))[0] & valid
+    band = np.where(valid, suitable, NODATA_CELL).astype(np.uint8)
+    mask[row:row + rows] = band.reshape(rows, grid.cols)
+    mask.flush()
+    runs = row_runs(suitable.reshape(rows, grid.cols))
+    runs[:, 0] += row
+    return row, int(suitable.sum()), int(valid.size - valid.sum()), runs
+
+# --- SCAN ---
+
+def _write_candidates(writer, grid, runs):
+    header = grid.header
+    row, first, last = runs.T
+    writer.writerows(zip(
+        row.tolist(), first.tolist(), last.tolist(), (last - first + 1).tolist(),
+        (header['north'] - row * header['cell_lat']).tolist(), (header['north'] - (row + 1) * header['cell_lat']).tolist(),
+        (header['west'] + first * header['cell_lon']).tolist(), (header['west'] + (last + 1) * header['cell_lon']).tolist(),
+    ))
+
+def scan_area(layers_path, project, mask_path, candidates=None, site=None, grid_path=None, workers=None,
+              tile_cells=TILE_CELLS):
+    """
+    Checks every cell of the scan grid against `project` and writes the mask
+    to `mask_path` (.npy) and the candidate runs to the open text file
+    `candidates` (CSV, optional). `site` holds site_details values for the
+    fields without a layer. `workers` defaults to every CPU core; 1 runs in
+    this process. Returns a summary dict (cells, suitable, no_data and the
+    rules checked by layers, by the site values and not at all).
+    Raises ValueError for bad layers, an unknown project or failing site values.
+    """
+    if project not in CONSTRUCTION_RULES:
+        raise ValueError(f"Unknown project '{project}'.")
+    layers = open_layers(layers_path)
+    if not layers:
+        raise ValueError(f"{layers_path}: no layers.")
+    grid = open_layer(grid_path) if grid_path else layers[0]
+    layer_fields = {}
+    for layer in layers:
+        if layer.rule_field in layer_fields:
+            raise ValueError(f"{layer_fields[layer.rule_field]} and {layer.header_path} both fill {layer.field}.")
+        layer_fields[layer.rule_field] = layer.header_path
+
+    fixed = {field: column for field, column in site_columns(site or {}).items() if field not in layer_fields}
+    passed, by_site = suitable_mask(fixed, project, 1)
+    if not passed.all():
+        failed = [field for field in fixed if not suitable_mask({field: fixed[field]}, project, 1)[0][0]]
+        raise ValueError(f"No cell can suit '{project}': the site values of {failed} fail its rules.")
+    rules = CONSTRUCTION_RULES[project]
+    fields = {RULE_SPECS[key][0] for key in rules if key in RULE_SPECS} & set(layer_fields)
+    if not fields:
+        raise ValueError(f"No layer feeds a rule of '{project}' (the layers fill: {', '.join(sorted(layer_fields))}).")
+    summary = {
+        'cells': grid.rows * grid.cols, 'suitable': 0, 'no_data': 0,
+        'checked_by_layers': [key for key in RULE_SPECS if key in rules and RULE_SPECS[key][0] in fields],
+        'checked_by_site': by_site,
+        'not_checked': [key for key in RULE_SPECS if key in rules and RULE_SPECS[key][0] not in fields
+                        and key not in by_site],
+    }
+
+    np.lib.format.open_memmap(mask_path, mode='w+', dtype=np.uint8, shape=(grid.rows, grid.cols)).flush()
+    job = (layers_path, grid_path, os.path.abspath(mask_path))
+    band_rows = max(1, tile_cells // grid.cols)
+    bands = [(row, min(band_rows, grid.rows - row)) for row in range(0, grid.rows, band_rows)]
+    writer = None
+    if candidates is not None:
+        writer = csv.writer(candidates)
+        writer.writerow(CANDIDATE_COLUMNS)
+
+    def collect(result):
+        _, suitable, no_data, runs = result
+        summary['suitable'] += suitable
+        summary['no_data'] += no_data
+        if writer is not None:
+            _write_candidates(writer, grid, runs)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for row, rows in bands:
+            collect(_scan_band(job, project, fields, row, rows))
+        _BAND_STATE.pop(job, None)
+        return summary
+    with ProcessPoolExecutor(max_workers=workers, initializer=install_from_environment) as pool:
+        pending = deque()
+        for row, rows in bands:
+            pending.append(pool.submit(_scan_band, job, project, fields, row, rows))
+            if len(pending) >= workers * 2:
+                collect(pending.popleft().result())
+        while pending:
+            collect(pending.popleft().result())
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find every grid cell of an area that suits a project.")
+    parser.add_argument('layers', help="Raster layer directory (see rasters.py).")
+    parser.add_argument('--project', required=True, help="Project name (a CONSTRUCTION_RULES key).")
+    parser.add_argument('--mask', required=True, metavar='PATH', help="Suitability mask to write (.npy).")
+    parser.add_argument('--candidates', metavar='PATH', help="CSV of candidate cell runs to write.")
+    parser.add_argument('--site', metavar='JSON',
+                        help="JSON object of site_details values for the fields without a layer.")
+    parser.add_argument('--grid', metavar='HEADER', help="Layer header whose grid is scanned (default: the first layer).")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: all CPU cores).")
+    parser.add_argument('--tile-cells', type=int, default=TILE_CELLS, help=f"Cells per tile (default {TILE_CELLS}).")
+    args = parser.parse_args(argv)
+
+    try:
+        install_from_environment()
+        site = None
+        if args.site:
+            with open(args.site, encoding='utf-8') as handle:
+                site = json.load(handle)
+        if args.candidates:
+            with open(args.candidates, 'w', encoding='utf-8', newline='') as handle:
+                summary = scan_area(args.layers, args.project, args.mask, handle, site, args.grid, args.workers,
+                                    args.tile_cells)
+        else:
+            summary = scan_area(args.layers, args.project, args.mask, None, site, args.grid, args.workers,
+                                args.tile_cells)
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 2
+
+    print(f"{summary['suitable']} of {summary['cells']} cells suit '{args.project}' "
+          f"({summary['no_data']} without data).", file=sys.stderr)
+    if summary['not_checked']:
+        print(f"Not checked (no layer or site value): {', '.join(summary['not_checked'])}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
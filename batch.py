@@ -0,0 +1,341 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from data import *
+from logic import (
+    check_suitability, find_suitable_projects, generate_report_text, merge_rule_profile, open_report_bundle,
+    report_file_name, rule_profile_json, rule_profiling_enabled, start_rule_profiling, stop_rule_profiling,
+)
+import store
+from history import INSERT_CHUNK_SIZE, AnalysisHistory
+from hazards import fill_hazard_proximity_stream, load_hazard_index
+from rasters import fill_from_layers_stream, open_layers
+from boreholes import fill_from_boreholes_stream, load_borehole_summaries
+from rule_files import install_from_environment
+
+# --- HEADLESS BATCH SCREENING ---
+# Streams site rows from a CSV or JSONL file through check_suitability and
+# writes one result per site and project. Every stage is a generator, so only
+# the row being processed is held in memory, however large the input file is.
+#
+# Usage:
+#   python batch.py sites.csv -o results.jsonl
+#   python batch.py sites.jsonl --project "Farm Barn" --output-format csv
+#   python batch.py parcels.csv -o results.csv --workers 32 --chunk-size 5000
+#   python batch.py parcels.csv -o results.jsonl --history history.sqlite3
+#   python batch.py parcels.csv -o results.jsonl --hazards hazards.csv --layers layers
+#   python batch.py parcels.csv -o results.jsonl --boreholes readings.csv
+
+RESULT_COLUMNS = ['row', 'project_heading', 'project', 'suitable', 'issues', 'error']
+
+def detect_format(path, default='jsonl'):
+    """Guesses 'csv', 'jsonl' or 'store' (a store.py directory) from a path."""
+    if path and path != '-' and store.is_store(path):
+        return 'store'
+    if path and path.lower().endswith('.csv'):
+        return 'csv'
+    if path and path.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return default
+
+class InvalidRow:
+    """Stands in for an input line that could not be decoded; parse_site reports it as that row's error."""
+
+    def __init__(self, error):
+        self.error = error
+
+def read_rows(handle, fmt):
+    """
+    Yields one raw dict per site row. CSV values are strings;
+    JSONL values keep whatever types the file used. Blank lines are skipped,
+    and a line that is not valid JSON is passed on as an InvalidRow.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(handle)
+    else:
+        for line in handle:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as error:
+                    yield InvalidRow(f"Invalid JSON: {error}.")
+
+def _to_number(value, kind):
+    if kind is int:
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    return float(value)
+
+def parse_site(row):
+    """
+    Converts a raw row into a site_details dict shaped like the one
+    ui.render_input_tab builds. Scores are derived from the option keys.
+    Raises KeyError for missing fields and ValueError for bad values.
+    """
+    if isinstance(row, InvalidRow):
+        raise ValueError(row.error)
+    if not isinstance(row, dict):
+        raise ValueError("row must be a JSON object")
+    site = {'project_heading': row.get('project_heading') or "Untitled Site"}
+
+    zoning = row['zoning']
+    if not isinstance(zoning, str) or zoning not in ZONING_OPTIONS:
+        raise ValueError(f"Unknown zoning '{zoning}'.")
+    site['zoning'] = zoning
+
+    for field, kind in SITE_NUMERIC_FIELDS.items():
+        try:
+            site[field] = _to_number(row[field], kind)
+        except (TypeError, ValueError):
+            raise ValueError(f"Field '{field}' must be a number, got {row[field]!r}.")
+
+    for key_field, (score_field, options) in SITE_OPTION_FIELDS.items():
+        option = row[key_field]
+        if not isinstance(option, str) or option not in options:
+            raise ValueError(f"Unknown {key_field} '{option}'.")
+        site[key_field] = option
+        site[score_field] = options[option]['score']
+
+    return site
+
+def parse_sites(rows, start=1):
+    """
+    Yields (row number, site_details, error) for each raw row.
+    Rows that fail to parse are passed on with site_details None
+    so one bad row does not stop a multi-GB run.
+    """
+    for number, row in enumerate(rows, start=start):
+        try:
+            yield number, parse_site(row), None
+        except KeyError as error:
+            yield number, None, f"Missing field {error}."
+        except ValueError as error:
+            yield number, None, str(error)
+
+def evaluate_sites(parsed, projects, reports=False, first_failure=False, keep_sites=False):
+    """
+    Yields one result record per site and project. With reports=True each
+    record also carries the full text report under 'report'. With
+    first_failure=True each record lists only the first issue found (reports
+    still get the full list). With keep_sites=True each record carries the
+    parsed site_details under 'site' (for the analysis history).
+    """
+    for number, site, error in parsed:
+        if site is None:
+            yield {'row': number, 'project_heading': None, 'project': None,
+                   'suitable': None, 'issues': [], 'error': error}
+            continue
+        suitable_projects = find_suitable_projects(site) if reports else None
+        for project in projects:
+            issues = check_suitability(site, project, first_failure=first_failure and not reports)
+            record = {'row': number, 'project_heading': site['project_heading'], 'project': project,
+                      'suitable': not issues, 'issues': issues, 'error': None}
+            if reports:
+                record['report'] = generate_report_text(site, project, issues, suitable_projects)
+            if keep_sites:
+                record['site'] = site
+            yield record
+
+# --- PARALLEL (SHARDED) EXECUTION ---
+
+def chunked(iterable, size):
+    """Yields lists of up to `size` items from an iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _evaluate_chunk(rows, start, projects, reports, first_failure=False, profile=False, keep_sites=False):
+    # Runs in a worker process; returns the whole chunk's records at once,
+    # plus the chunk's rule counters when profiling.
+    if profile:
+        start_rule_profiling()
+    records = list(evaluate_sites(parse_sites(rows, start), projects, reports, first_failure, keep_sites))
+    return records, stop_rule_profiling() if profile else None
+
+def _collect(future):
+    records, profile = future.result()
+    if profile:
+        merge_rule_profile(profile)
+    return records
+
+def evaluate_rows_parallel(rows, projects, workers=None, chunk_size=1000, reports=False, first_failure=False,
+                           keep_sites=False):
+    """
+    Parses and evaluates raw rows on a process pool, yielding result records
+    in input order. Rows are sent to the workers in chunks of `chunk_size`,
+    and at most two chunks per worker are in flight, so memory stays bounded.
+    `workers` defaults to every CPU core; 1 runs in this process.
+    While rule profiling is on here, the workers' counters are merged into it.
+    Each worker installs the ADVISOR_RULES rule files itself, so the pool
+    checks the same rules under any process start method.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from evaluate_sites(parse_sites(rows), projects, reports, first_failure, keep_sites)
+        return
+
+    profile = rule_profiling_enabled()
+    with ProcessPoolExecutor(max_workers=workers, initializer=install_from_environment) as pool:
+        pending = deque()
+        start = 1
+        for chunk in chunked(rows, chunk_size):
+            pending.append(pool.submit(
+                _evaluate_chunk, chunk, start, projects, reports, first_failure, profile, keep_sites
+            ))
+            start += len(chunk)
+            if len(pending) >= workers * 2:
+                yield from _collect(pending.popleft())
+        while pending:
+            yield from _collect(pending.popleft())
+
+def _save_history(records, history, chunk_size=INSERT_CHUNK_SIZE):
+    # Saves each record's site, issues and report into the analysis history,
+    # a transaction per chunk, then passes the records on without their site.
+    for chunk in chunked(records, chunk_size):
+        history.record_many((record for record in chunk if record['error'] is None), 'batch', chunk_size)
+        for record in chunk:
+            record.pop('site', None)
+            yield record
+
+def _store_reports(records, bundle):
+    # Moves each record's report text into the bundle (see logic.open_report_bundle).
+    for record in records:
+        report = record.pop('report', None)
+        if report is not None:
+            bundle.writestr(report_file_name(record['row'], record['project']), report)
+        yield record
+
+def write_results(records, handle, fmt):
+    """Writes result records as JSONL or CSV. Returns the number written."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(handle, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(dict(record, issues=' | '.join(record['issues'])))
+            count += 1
+    else:
+        for record in records:
+            handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Screen a CSV/JSONL file of sites against the construction rules."
+    )
+    parser.add_argument('input', help="Site file (.csv or .jsonl), store directory, or '-' for stdin.")
+    parser.add_argument('-o', '--output', default='-', help="Result file, or '-' for stdout (default).")
+    parser.add_argument('--input-format', choices=['csv', 'jsonl', 'store'], help="Defaults to the input file extension.")
+    parser.add_argument('--output-format', choices=['csv', 'jsonl'], help="Defaults to the output file extension.")
+    parser.add_argument('-p', '--project', action='append', dest='projects', metavar='NAME',
+                        help="Project to check (repeatable). Defaults to every project.")
+    parser.add_argument('-w', '--workers', type=int, default=0,
+                        help="Worker processes. 0 (default) uses every CPU core, 1 runs serially.")
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help="Rows sent to a worker at a time (default 1000).")
+    parser.add_argument('--reports', metavar='PATH',
+                        help="Also write a text report per site and project into PATH (.zip file or directory).")
+    parser.add_argument('--first-failure', action='store_true',
+                        help="Stop at each site's first violation (faster pass/fail screening; one issue per result).")
+    parser.add_argument('--hazards', metavar='PATH',
+                        help="CSV of hazardous sites: rows with latitude/longitude get hazardous_site_proximity_ft "
+                             "measured from it.")
+    parser.add_argument('--layers', metavar='PATH',
+                        help="Raster layer directory (see rasters.py): rows with latitude/longitude get the "
+                             "layers' fields sampled from it.")
+    parser.add_argument('--boreholes', metavar='PATH',
+                        help="Borehole readings CSV (see boreholes.py): rows with a site_id get the soil fields "
+                             "aggregated from their site's readings.")
+    parser.add_argument('--borehole-config', metavar='JSON',
+                        help="Aggregate config for --boreholes (default: boreholes.DEFAULT_AGGREGATES).")
+    parser.add_argument('--history', metavar='PATH',
+                        help="Also save every result (and report) into the SQLite analysis history at PATH.")
+    parser.add_argument('--rule-profile', metavar='PATH',
+                        help="Write per-rule evaluation/violation/time counters as JSON to PATH.")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.workers < 0 or args.chunk_size < 1:
+        print("--workers must be >= 0 and --chunk-size must be >= 1.", file=sys.stderr)
+        return 2
+    if args.history and args.first_failure:
+        print("--history saves complete results: it cannot be combined with --first-failure.", file=sys.stderr)
+        return 2
+    try:
+        install_from_environment()
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 2
+    projects = args.projects or list(CONSTRUCTION_RULES)
+    for project in projects:
+        if project not in CONSTRUCTION_RULES:
+            print(f"Unknown project '{project}'. Choose from: {', '.join(CONSTRUCTION_RULES)}", file=sys.stderr)
+            return 2
+
+    try:
+        hazard_index = load_hazard_index(args.hazards) if args.hazards else None
+        layers = open_layers(args.layers) if args.layers else []
+        summaries = load_borehole_summaries(args.boreholes, args.borehole_config) if args.boreholes else None
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 2
+
+    input_format = args.input_format or detect_format(args.input)
+    output_format = args.output_format or detect_format(args.output)
+
+    if input_format == 'store':
+        source = None
+    else:
+        source = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8')
+    target = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+    history = AnalysisHistory(args.history) if args.history else None
+    if args.rule_profile:
+        start_rule_profiling()
+    try:
+        if source is None:
+            rows = store.read_sites(store.open_store(args.input))
+        else:
+            rows = read_rows(source, input_format)
+        if hazard_index is not None:
+            rows = fill_hazard_proximity_stream(rows, hazard_index)
+        if layers:
+            rows = fill_from_layers_stream(rows, layers)
+        if summaries is not None:
+            rows = fill_from_boreholes_stream(rows, summaries)
+        records = evaluate_rows_parallel(
+            rows, projects, args.workers, args.chunk_size, bool(args.reports), args.first_failure, bool(args.history)
+        )
+        if history is not None:
+            records = _save_history(records, history)
+        if args.reports:
+            with open_report_bundle(args.reports) as bundle:
+                count = write_results(_store_reports(records, bundle), target, output_format)
+        else:
+            count = write_results(records, target, output_format)
+    finally:
+        if source is not None and source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+        if history is not None:
+            history.close()
+
+    if args.rule_profile:
+        with open(args.rule_profile, 'w', encoding='utf-8') as handle:
+            handle.write(rule_profile_json() + "\n")
+        stop_rule_profiling()
+    print(f"Wrote {count} results.", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
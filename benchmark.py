@@ -0,0 +1,256 @@
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import timeit
+from data import *
+from logic import (
+    RULE_SPECS, check_suitability, check_suitability_batch, format_rules_for_display,
+    generate_report_text, get_compiled_rules, simulate_suitability,
+)
+from site_profile import SiteProfile
+
+# --- BENCHMARK SUITE ---
+# Times the rule engine, report generation and a headless rerun of the Streamlit
+# app on synthetic sites, and saves the timings as JSON so runs can be compared.
+# The uncached functions are timed (cache.py would turn repeats into lookups).
+#
+# Usage:
+#   python benchmark.py -o baseline.json
+#   python benchmark.py -o current.json --compare baseline.json
+#
+# --compare prints each timing against the baseline and exits with status 1 if
+# any benchmark is more than --threshold times slower.
+
+RESULTS_VERSION = 1
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+# --- SYNTHETIC SITES ---
+# Realistic (low, high) range of every numeric field, wide enough that each
+# project's rules both pass and fail. Option fields pick any key of their table.
+SITE_VALUE_RANGES = {
+    'fsi_available': (0.2, 4.0),
+    'envelope_width': (15.0, 400.0),
+    'envelope_depth': (15.0, 400.0),
+    'slope_pct': (0.0, 30.0),
+    'protected_trees_count': (0, 40),
+    'spt_n': (2, 50),
+    'bearing_capacity': (40.0, 400.0),
+    'cbr_pct': (1.0, 30.0),
+    'plate_load_settlement_mm': (0.5, 40.0),
+    'proctor_compaction': (80.0, 102.0),
+    'plasticity_index': (0, 45),
+    'ucs_kpa': (20.0, 300.0),
+    'cohesion_kpa': (0.0, 50.0),
+    'friction_angle_deg': (15.0, 42.0),
+    'permeability_cm_sec': (0.0000001, 0.01),
+    'percent_fines': (0.0, 90.0),
+    'core_cutter_density': (1300.0, 2200.0),
+    'soil_ph': (4.0, 10.0),
+    'groundwater_depth': (0.0, 40.0),
+    'percolation_rate_min_inch': (1.0, 120.0),
+    'soil_resistivity_ohm_m': (5.0, 150.0),
+    'wetland_percentage': (0.0, 30.0),
+    'air_quality_aqi': (10, 250),
+    'noise_level_dba': (35.0, 85.0),
+    'hazardous_site_proximity_ft': (0.0, 20000.0),
+    'pop_density_per_sq_km': (10, 15000),
+}
+
+def random_site(rng, project_heading="Synthetic Site"):
+    """One random site_details dict, laid out like the input form builds it."""
+    site = {'project_heading': project_heading, 'zoning': rng.choice(FORM_CHOICES['zoning_choice'])}
+    for field, kind in SITE_NUMERIC_FIELDS.items():
+        low, high = SITE_VALUE_RANGES[field]
+        site[field] = rng.randint(low, high) if kind is int else round(rng.uniform(low, high), 7)
+    for key_field, (_, options) in SITE_OPTION_FIELDS.items():
+        site[key_field] = rng.choice(list(options))
+    # Derives the scores and puts every field in form order.
+    return SiteProfile.from_dict(site).to_dict()
+
+# score field -> (key field, options table), to pick keys that meet a score rule
+_SCORE_SOURCES = {score_field: (key_field, options) for key_field, (score_field, options) in SITE_OPTION_FIELDS.items()}
+
+def suitable_site(rng, project_name, project_heading="Synthetic Site"):
+    """A random site that passes every rule of project_name."""
+    site = random_site(rng, project_heading)
+    bounds = {}
+    for rule in get_compiled_rules(project_name):
+        op = RULE_SPECS[rule.key][1]
+        if op == 'in':
+            site[rule.field] = rng.choice(sorted(rule.limit))
+            continue
+        low, high = bounds.get(rule.field, SITE_VALUE_RANGES.get(rule.field, (float('-inf'), float('inf'))))
+        bounds[rule.field] = (max(low, rule.limit), high) if op == 'min' else (low, min(high, rule.limit))
+    for field, (low, high) in bounds.items():
+        if field in _SCORE_SOURCES:
+            key_field, options = _SCORE_SOURCES[field]
+            site[key_field] = rng.choice([key for key, option in options.items() if low <= option['score'] <= high])
+        elif SITE_NUMERIC_FIELDS[field] is int:
+            low = math.ceil(low)
+            site[field] = rng.randint(low, max(low, math.floor(high)))
+        else:
+            site[field] = rng.uniform(low, high) if low < high else low
+    return SiteProfile.from_dict(site).to_dict()
+
+def generate_sites(count, seed=0, suitable_share=0.25):
+    """
+    `count` sites; the same seed always gives the same sites. About
+    `suitable_share` of them pass one (random) project; the rest are fully random
+    and nearly always fail several rules.
+    """
+    rng = random.Random(seed)
+    projects = list(CONSTRUCTION_RULES)
+    sites = []
+    for number in range(count):
+        heading = f"Synthetic Site {number}"
+        if rng.random() < suitable_share:
+            sites.append(suitable_site(rng, rng.choice(projects), heading))
+        else:
+            sites.append(random_site(rng, heading))
+    return sites
+
+# --- TIMING ---
+
+def time_call(func, number, repeat):
+    """
+    Runs func() `number` times per sample, `repeat` samples.
+    Returns the timings in seconds per call (best and median of the samples).
+    """
+    samples = [total / number for total in timeit.repeat(func, number=number, repeat=repeat)]
+    return {
+        'number': number,
+        'repeat': repeat,
+        'best_s': min(samples),
+        'median_s': statistics.median(samples),
+    }
+
+def _apptest_benchmarks(repeat):
+    # Imported here so the engine benchmarks run without Streamlit installed.
+    from streamlit.testing.v1 import AppTest
+
+    # Submitting saves to the analysis history: keep benchmark runs out of the user's.
+    previous_history = os.environ.get('ADVISOR_HISTORY')
+    os.environ['ADVISOR_HISTORY'] = 'off'
+    try:
+        app = AppTest.from_file(APP_PATH, default_timeout=60)
+        results = {'app_first_run': time_call(app.run, 1, 1)}
+        results['app_rerun'] = time_call(app.run, 1, repeat)
+
+        def submit():
+            app.button[0].click().run()
+        results['app_submit'] = time_call(submit, 1, repeat)
+    finally:
+        if previous_history is None:
+            del os.environ['ADVISOR_HISTORY']
+        else:
+            os.environ['ADVISOR_HISTORY'] = previous_history
+    if app.exception:
+        raise RuntimeError(f"main.py raised: {app.exception[0].value}")
+    return results
+
+def run_benchmarks(site_count=2000, seed=0, repeat=5, include_app=True):
+    """Runs every benchmark. Returns the results document (see RESULTS_VERSION)."""
+    sites = generate_sites(site_count, seed)
+    projects = list(CONSTRUCTION_RULES)
+    site, project = sites[0], projects[0]
+    issues = check_suitability(site, project)
+    passing_site = suitable_site(random.Random(seed), project)
+
+    def bulk_check(first_failure=False):
+        for each_site in sites:
+            for each_project in projects:
+                check_suitability(each_site, each_project, first_failure)
+
+    def all_rules():
+        for each_project in projects:
+            format_rules_for_display(each_project)
+
+    results = {
+        'check_suitability': time_call(lambda: check_suitability(site, project), 2000, repeat),
+        'check_suitability_pass': time_call(lambda: check_suitability(passing_site, project), 2000, repeat),
+        'check_suitability_bulk': time_call(bulk_check, 1, repeat),
+        'check_suitability_bulk_first_failure': time_call(lambda: bulk_check(True), 1, repeat),
+        'check_suitability_batch': time_call(lambda: check_suitability_batch(sites, projects), 1, repeat),
+        'generate_report_text': time_call(lambda: generate_report_text(site, project, issues, projects), 500, repeat),
+        'format_rules_for_display_all': time_call(all_rules, 50, repeat),
+        'simulate_suitability_100k': time_call(lambda: simulate_suitability(passing_site, samples=100000, seed=seed), 1, repeat),
+    }
+    skipped = {}
+    if include_app:
+        try:
+            results.update(_apptest_benchmarks(repeat))
+        except ImportError as error:
+            skipped['app'] = f"Streamlit is not available ({error})."
+
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {'sites': site_count, 'projects': len(projects), 'seed': seed, 'repeat': repeat},
+        'results': results,
+        'skipped': skipped,
+    }
+
+def compare_results(current, baseline, threshold=1.25):
+    """
+    Yields (name, baseline seconds, current seconds, ratio, regressed) for every
+    benchmark in both documents, comparing best times per call.
+    """
+    for name, timing in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['best_s']
+        after = timing['best_s']
+        ratio = after / before if before else float('inf')
+        yield name, before, after, ratio, ratio > threshold
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the suitability engine, reports and app reruns.")
+    parser.add_argument('-o', '--output', default='-', help="Results JSON file, or '-' for stdout (default).")
+    parser.add_argument('--sites', type=int, default=2000, help="Synthetic sites for the bulk benchmarks (default 2000).")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for the synthetic sites (default 0).")
+    parser.add_argument('--repeat', type=int, default=5, help="Samples per benchmark (default 5).")
+    parser.add_argument('--no-app', action='store_true', help="Skip the Streamlit AppTest benchmarks.")
+    parser.add_argument('--compare', metavar='BASELINE', help="Results JSON of an earlier run to compare against.")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="Slowdown ratio that counts as a regression (default 1.25).")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.sites < 1 or args.repeat < 1:
+        print("--sites and --repeat must be >= 1.", file=sys.stderr)
+        return 2
+
+    document = run_benchmarks(args.sites, args.seed, args.repeat, include_app=not args.no_app)
+    text = json.dumps(document, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(text + "\n")
+    for name, reason in document['skipped'].items():
+        print(f"Skipped {name}: {reason}", file=sys.stderr)
+
+    if not args.compare:
+        return 0
+    with open(args.compare, encoding='utf-8') as handle:
+        baseline = json.load(handle)
+    if baseline['parameters'] != document['parameters']:
+        print("Warning: the baseline was run with different parameters.", file=sys.stderr)
+    regressions = 0
+    for name, before, after, ratio, regressed in compare_results(document, baseline, args.threshold):
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:32} {before * 1e3:11.3f} ms -> {after * 1e3:11.3f} ms  x{ratio:.2f}{flag}", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
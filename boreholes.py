@@ -0,0 +1,362 @@
+import argparse
+import csv
+import io
+import itertools
+import json
+import math
+import re
+import sys
+import numpy as np
+from data import *
+
+# --- BOREHOLE LOG INGESTION ---
+# Derives site_details fields (spt_n, cohesion_kpa, groundwater_depth, ...)
+# from borehole logs instead of typing in one value per site. A readings CSV
+# has one row per reading:
+#
+#   site_id, borehole_id, depth_ft, spt_n, cohesion_kpa, ..., groundwater_depth_ft
+#
+# (blank cells are missing readings). Each field is aggregated in two steps:
+# per borehole over a depth range (e.g. the minimum SPT N down to the
+# foundation depth), then across the site's boreholes (e.g. the weakest
+# borehole). See DEFAULT_AGGREGATES; a JSON config can replace them:
+#
+#   {"foundation_depth_ft": 15,
+#    "fields": {"ucs_kpa": {"column": "ucs_kpa", "aggregate": "percentile", "q": 10, "boreholes": "min"}}}
+#
+#   aggregate  min, max, mean, median, percentile (with "q", 0-100),
+#              weighted_mean (each reading stands for the soil down to the
+#              next deeper reading of its borehole), shallowest
+#   depth      "foundation" (surface to foundation_depth_ft, the default),
+#              "all", or [top, bottom] in ft
+#   boreholes  min, max, mean or median across the site's boreholes
+#
+# The CSV is streamed in chunks; each chunk's sites are grouped and aggregated
+# with numpy in one pass. The readings of a site must be contiguous in the
+# file (exports usually are; otherwise sort by site first), boreholes of one
+# site may be interleaved. Memory is a chunk plus the largest site.
+#
+# Usage:
+#   python boreholes.py readings.csv -o site_parameters.jsonl
+#   python boreholes.py readings.csv --config aggregates.json --output-format csv
+#   python batch.py sites.csv -o results.jsonl --boreholes readings.csv   (rows matched on site_id)
+
+DEFAULT_FOUNDATION_DEPTH_FT = 20.0 # readings above this describe the bearing soil
+READ_CHUNK_SIZE = 200000 # readings per aggregation pass
+
+# site_details field -> how it is computed from the readings.
+DEFAULT_AGGREGATES = {
+    'spt_n': {'column': 'spt_n', 'aggregate': 'min', 'boreholes': 'min'},
+    'ucs_kpa': {'column': 'ucs_kpa', 'aggregate': 'percentile', 'q': 10, 'boreholes': 'min'},
+    'cohesion_kpa': {'column': 'cohesion_kpa', 'aggregate': 'weighted_mean', 'boreholes': 'min'},
+    'friction_angle_deg': {'column': 'friction_angle_deg', 'aggregate': 'weighted_mean', 'boreholes': 'min'},
+    'plasticity_index': {'column': 'plasticity_index', 'aggregate': 'max', 'boreholes': 'max'},
+    'percent_fines': {'column': 'percent_fines', 'aggregate': 'weighted_mean', 'boreholes': 'max'},
+    'core_cutter_density': {'column': 'core_cutter_density', 'aggregate': 'weighted_mean', 'boreholes': 'min'},
+    'soil_ph': {'column': 'soil_ph', 'aggregate': 'median', 'boreholes': 'median'},
+    'groundwater_depth': {'column': 'groundwater_depth_ft', 'aggregate': 'min', 'depth': 'all', 'boreholes': 'min'},
+}
+
+BOREHOLE_AGGREGATES = ('min', 'max', 'mean', 'median', 'percentile', 'weighted_mean', 'shallowest')
+SITE_AGGREGATES = ('min', 'max', 'mean', 'median')
+
+# CSV header names accepted for each key column.
+SITE_ID_COLUMNS = ('site_id', 'site')
+BOREHOLE_COLUMNS = ('borehole_id', 'borehole', 'bh')
+DEPTH_COLUMNS = ('depth_ft', 'depth')
+
+SITE_ID_FIELD = 'site_id' # the key of a batch row that summaries are matched on
+
+# Whitespace-only and quoted empty cells ("") as spreadsheets export them: missing, like blank cells.
+_BLANK_CELL = re.compile(r'(?<=[,\n])(?:[ \t]+|[ \t]*"[ \t]*"[ \t]*)(?=[,\n])')
+
+def validate_aggregates(fields, source="<aggregates>"):
+    """
+    Checks a {site_details field: spec} mapping (see the module comment).
+    Raises ValueError listing every problem found.
+    """
+    errors = []
+    for field, spec in fields.items():
+        if field not in SITE_NUMERIC_FIELDS:
+            errors.append(f"'{field}' is not a numeric site_details field")
+            continue
+        if not isinstance(spec, dict) or not isinstance(spec.get('column'), str):
+            errors.append(f"{field}: needs a 'column' name")
+            continue
+        aggregate = spec.get('aggregate')
+        if aggregate not in BOREHOLE_AGGREGATES:
+            errors.append(f"{field}: 'aggregate' must be one of {', '.join(BOREHOLE_AGGREGATES)}")
+        if spec.get('boreholes', 'min') not in SITE_AGGREGATES:
+            errors.append(f"{field}: 'boreholes' must be one of {', '.join(SITE_AGGREGATES)}")
+        q = spec.get('q')
+        if aggregate == 'percentile' and (isinstance(q, bool) or not isinstance(q, (int, float)) or not 0 <= q <= 100):
+            errors.append(f"{field}: 'percentile' needs a 'q' between 0 and 100")
+        depth = spec.get('depth', 'foundation')
+        if depth not in ('foundation', 'all'):
+            if (not isinstance(depth, list) or len(depth) != 2
+                    or not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in depth)
+                    or depth[0] >= depth[1]):
+                errors.append(f"{field}: 'depth' must be \"foundation\", \"all\" or [top, bottom] with top < bottom")
+        elif depth == 'all' and aggregate == 'weighted_mean':
+            errors.append(f"{field}: 'weighted_mean' needs a bounded depth range")
+    if errors:
+        raise ValueError(f"{source}: invalid aggregates:\n  " + "\n  ".join(errors))
+
+def load_aggregate_config(path):
+    """Reads a JSON aggregate config. Returns (fields, foundation depth in ft)."""
+    with open(path, encoding='utf-8') as handle:
+        try:
+            config = json.load(handle)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"{path}: {error}")
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: expected a JSON object.")
+    fields = config.get('fields', DEFAULT_AGGREGATES)
+    if not isinstance(fields, dict):
+        raise ValueError(f"{path}: 'fields' must be a mapping.")
+    validate_aggregates(fields, path)
+    foundation_depth_ft = config.get('foundation_depth_ft', DEFAULT_FOUNDATION_DEPTH_FT)
+    if isinstance(foundation_depth_ft, bool) or not isinstance(foundation_depth_ft, (int, float)) or foundation_depth_ft <= 0:
+        raise ValueError(f"{path}: 'foundation_depth_ft' must be a positive number.")
+    return fields, float(foundation_depth_ft)
+
+# --- VECTORIZED GROUP-BY ---
+
+def group_aggregate(groups, values, how, count, q=None, weights=None):
+    """
+    Aggregates `values` by integer group code (0 .. count - 1) in one pass:
+    a stable sort by group, then reduceat over the group runs. NaN values
+    (and zero weights) are ignored. 'shallowest' takes each group's first
+    value in input order. Returns one float64 per group, NaN for empty groups.
+    """
+    result = np.full(count, np.nan)
+    keep = ~np.isnan(values)
+    if weights is not None:
+        keep &= weights > 0
+    groups, values = groups[keep], values[keep]
+    if not len(values):
+        return result
+    order = np.lexsort((values, groups)) if how in ('median', 'percentile') else np.argsort(groups, kind='stable')
+    groups, values = groups[order], values[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    present = groups[starts]
+    sizes = np.diff(np.r_[starts, len(values)])
+    if how == 'min':
+        result[present] = np.minimum.reduceat(values, starts)
+    elif how == 'max':
+        result[present] = np.maximum.reduceat(values, starts)
+    elif how == 'mean':
+        result[present] = np.add.reduceat(values, starts) / sizes
+    elif how == 'weighted_mean':
+        weights = weights[keep][order]
+        result[present] = np.add.reduceat(values * weights, starts) / np.add.reduceat(weights, starts)
+    elif how == 'shallowest':
+        result[present] = values[starts]
+    else:
+        # Linear interpolation between the closest ranks, like np.percentile
+        position = starts + (sizes - 1) * ((50 if how == 'median' else q) / 100)
+        low = np.floor(position).astype(np.intp)
+        high = np.minimum(low + 1, starts + sizes - 1)
+        result[present] = values[low] + (values[high] - values[low]) * (position - low)
+    return result
+
+def _depth_range(spec, foundation_depth_ft):
+    depth = spec.get('depth', 'foundation')
+    if depth == 'foundation':
+        return 0.0, foundation_depth_ft
+    if depth == 'all':
+        return -math.inf, math.inf
+    return float(depth[0]), float(depth[1])
+
+def borehole_values(spec, boreholes, depths, values, count, foundation_depth_ft):
+    """
+    One field's value per borehole (NaN without readings in range), for
+    readings sorted by borehole code and then depth.
+    """
+    top, bottom = _depth_range(spec, foundation_depth_ft)
+    aggregate = spec['aggregate']
+    valid = ~np.isnan(values) & ~np.isnan(depths)
+    if aggregate != 'weighted_mean':
+        inside = valid & (depths >= top) & (depths <= bottom)
+        return group_aggregate(boreholes[inside], values[inside], aggregate, count, spec.get('q'))
+    # Each reading covers [its depth, the next deeper reading's depth) of its
+    # borehole, the deepest down to the range bottom; readings at the same depth
+    # share that interval. Weights are the overlap with the range.
+    boreholes, depths, values = boreholes[valid], depths[valid], values[valid]
+    if not len(depths):
+        return np.full(count, np.nan)
+    starts = np.flatnonzero(np.r_[True, (boreholes[1:] != boreholes[:-1]) | (depths[1:] != depths[:-1])])
+    below = np.full(len(starts), bottom)
+    same_borehole = boreholes[starts[1:]] == boreholes[starts[:-1]]
+    below[:-1][same_borehole] = depths[starts[1:]][same_borehole]
+    below = np.repeat(below, np.diff(np.r_[starts, len(depths)]))
+    weights = np.minimum(below, bottom) - np.maximum(depths, top)
+    return group_aggregate(boreholes, values, 'weighted_mean', count, weights=np.maximum(weights, 0))
+
+def _first_appearance_codes(values):
+    # Integer codes for an array of keys, numbered in order of first appearance.
+    keys, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+    rank = np.empty(len(keys), dtype=np.intp)
+    rank[np.argsort(first, kind='stable')] = np.arange(len(keys))
+    return keys[np.argsort(first, kind='stable')], rank[inverse.ravel()]
+
+def aggregate_sites(sites, boreholes, depths, readings, fields, foundation_depth_ft):
+    """
+    Aggregates the readings of whole sites: arrays of site ids, borehole ids
+    and depths, and {column: float64 array} of the readings (NaN = missing).
+    Returns [(site id, {field: value})] in order of first appearance.
+    """
+    site_ids, site_codes = _first_appearance_codes(sites)
+    borehole_names, borehole_codes = np.unique(boreholes, return_inverse=True)
+    _, boreholes = _first_appearance_codes(site_codes * len(borehole_names) + borehole_codes.ravel())
+    borehole_sites = np.zeros(boreholes.max() + 1 if len(boreholes) else 0, dtype=np.intp)
+    borehole_sites[boreholes] = site_codes
+
+    order = np.lexsort((depths, boreholes))
+    boreholes, depths = boreholes[order], depths[order]
+    site_values = {}
+    for field, spec in fields.items():
+        if spec['column'] not in readings:
+            continue
+        values = readings[spec['column']][order]
+        per_borehole = borehole_values(spec, boreholes, depths, values, len(borehole_sites), foundation_depth_ft)
+        site_values[field] = group_aggregate(borehole_sites, per_borehole, spec.get('boreholes', 'min'), len(site_ids))
+
+    summaries = []
+    for code, site_id in enumerate(site_ids.tolist()):
+        values = {}
+        for field, column in site_values.items():
+            value = column[code].item()
+            if not math.isnan(value):
+                values[field] = int(round(value)) if SITE_NUMERIC_FIELDS[field] is int else round(value, 4)
+        summaries.append((site_id, values))
+    return summaries
+
+def _column(header, candidates):
+    for position, name in enumerate(header):
+        if name.strip().lower() in candidates:
+            return position
+    return None
+
+def _parse_lines(lines, id_positions, number_positions):
+    # (ids: object array (lines, 2), numbers: float64 array (lines, columns)) for CSV lines.
+    # numpy's parser has no notion of a missing number: blank cells become "nan" first.
+    text = ("\n" + "".join(lines)).replace("\n,", "\nnan,")
+    text = text.replace(",,", ",nan,").replace(",,", ",nan,").replace(",\n", ",nan\n")
+    if not text.endswith("\n"):
+        text += "nan\n" if text.endswith(",") else "\n"
+    if '"' in text or ' ' in text or '\t' in text: # rare, and a regex pass is slower than the replaces
+        text = _BLANK_CELL.sub("nan", text)
+    ids = np.loadtxt(io.StringIO(text), delimiter=',', quotechar='"', usecols=id_positions, dtype=object, ndmin=2)
+    numbers = np.loadtxt(io.StringIO(text), delimiter=',', quotechar='"', usecols=number_positions,
+                         dtype=np.float64, ndmin=2)
+    return ids, numbers
+
+def read_borehole_summaries(handle, fields=None, foundation_depth_ft=DEFAULT_FOUNDATION_DEPTH_FT,
+                            chunk_size=READ_CHUNK_SIZE):
+    """
+    Streams a readings CSV (an open text file) and yields (site id,
+    {field: value}) for each site, in file order. Fields whose column is not
+    in the file are left out. Raises ValueError for a bad file.
+    """
+    fields = DEFAULT_AGGREGATES if fields is None else fields
+    header = next(csv.reader([handle.readline().lstrip('\ufeff')]), [])
+    id_positions = (_column(header, SITE_ID_COLUMNS), _column(header, BOREHOLE_COLUMNS))
+    number_positions = [_column(header, DEPTH_COLUMNS)]
+    if None in id_positions or None in number_positions:
+        raise ValueError("the readings need site_id, borehole_id and depth_ft columns.")
+    columns = []
+    for spec in fields.values():
+        position = _column(header, (spec['column'].lower(),))
+        if position is not None and spec['column'] not in columns:
+            columns.append(spec['column'])
+            number_positions.append(position)
+
+    # The readings of the chunk's last site may continue in the next chunk: carry them over.
+    completed = set()
+    carried_ids, carried_numbers = np.empty((0, 2), dtype=object), np.empty((0, len(number_positions)))
+    line = 2
+    while True:
+        lines = list(itertools.islice(handle, chunk_size))
+        if lines:
+            try:
+                ids, numbers = _parse_lines(lines, id_positions, number_positions)
+            except ValueError as error:
+                raise ValueError(f"lines {line}-{line + len(lines) - 1}: {error}")
+            line += len(lines)
+            ids, numbers = np.concatenate([carried_ids, ids]), np.concatenate([carried_numbers, numbers])
+            others = np.flatnonzero(ids[:, 0] != ids[-1, 0]) if len(ids) else np.empty(0, dtype=np.intp)
+            end = others[-1] + 1 if len(others) else 0
+        else:
+            ids, numbers, end = carried_ids, carried_numbers, len(carried_ids)
+        carried_ids, carried_numbers = ids[end:], numbers[end:]
+        if end:
+            readings = {column: numbers[:end, index] for index, column in enumerate(columns, start=1)}
+            for site_id, values in aggregate_sites(ids[:end, 0], ids[:end, 1], numbers[:end, 0], readings,
+                                                   fields, foundation_depth_ft):
+                if site_id in completed:
+                    raise ValueError(f"the readings of site '{site_id}' are not contiguous (sort the file by site).")
+                completed.add(site_id)
+                yield site_id, values
+        if not lines:
+            return
+
+def load_borehole_summaries(path, config=None):
+    """{site id: {field: value}} for a readings CSV, with an optional JSON aggregate config."""
+    fields, foundation_depth_ft = load_aggregate_config(config) if config else (DEFAULT_AGGREGATES, DEFAULT_FOUNDATION_DEPTH_FT)
+    with open(path, encoding='utf-8-sig') as handle:
+        try:
+            return dict(read_borehole_summaries(handle, fields, foundation_depth_ft))
+        except ValueError as error:
+            raise ValueError(f"{path}: {error}")
+
+def fill_from_boreholes_stream(rows, summaries):
+    """Yields the raw site rows, each updated with the summary of its site_id (if any)."""
+    for row in rows:
+        if isinstance(row, dict) and row.get(SITE_ID_FIELD) is not None:
+            row.update(summaries.get(str(row[SITE_ID_FIELD]), {}))
+        yield row
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate borehole readings into site_details fields per site.")
+    parser.add_argument('readings', help="Readings CSV (site_id, borehole_id, depth_ft and reading columns).")
+    parser.add_argument('-o', '--output', help="Output file (default: stdout).")
+    parser.add_argument('--output-format', choices=('jsonl', 'csv'), default='jsonl')
+    parser.add_argument('--config', metavar='JSON', help="Aggregate config (default: DEFAULT_AGGREGATES).")
+    parser.add_argument('--foundation-depth', type=float,
+                        help=f"Foundation depth in ft (default: the config's, or {DEFAULT_FOUNDATION_DEPTH_FT:g}).")
+    args = parser.parse_args(argv)
+
+    try:
+        fields, foundation_depth_ft = (load_aggregate_config(args.config) if args.config
+                                       else (DEFAULT_AGGREGATES, DEFAULT_FOUNDATION_DEPTH_FT))
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 2
+    foundation_depth_ft = args.foundation_depth or foundation_depth_ft
+
+    output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        with open(args.readings, encoding='utf-8-sig') as handle:
+            summaries = read_borehole_summaries(handle, fields, foundation_depth_ft)
+            if args.output_format == 'csv':
+                writer = csv.DictWriter(output, fieldnames=[SITE_ID_FIELD] + list(fields), restval='')
+                writer.writeheader()
+                for site_id, values in summaries:
+                    writer.writerow({SITE_ID_FIELD: site_id, **values})
+            else:
+                for site_id, values in summaries:
+                    output.write(json.dumps({SITE_ID_FIELD: site_id, **values}) + "\n")
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return 2
+    except ValueError as error:
+        print(f"{args.readings}: {error}", file=sys.stderr)
+        return 2
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
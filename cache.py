@@ -0,0 +1,140 @@
+import datetime
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+from data import *
+from logic import (
+    RULE_SPECS, SITE_SUMMARY_SECTIONS, check_suitability, format_rules_for_display,
+    format_site_summary, generate_report_text, generate_rules_text, rules_generation, start_evaluation,
+)
+
+# --- RESULT CACHE ---
+# Process-wide memo of analysis results, shared by every Streamlit session and
+# rerun (modules are imported once per server process). Entries are addressed
+# by a digest of exactly the inputs the result depends on, so resubmitting the
+# same site - under any heading, from any session - is a cache hit.
+#
+# Cached values are shared: treat what these functions return as read-only.
+
+DEFAULT_MAX_ENTRIES = 10000
+
+class LRUCache:
+    """Thread-safe, size-bounded mapping with least-recently-used eviction."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached value for key, calling compute() on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        # Compute outside the lock; two sessions missing at once just both compute.
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Counters as a plain dict (JSON-ready)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+RESULT_CACHE = LRUCache()
+
+# Every site field check_suitability reads: the compared values and the option
+# keys quoted in messages. The heading and untested fields are left out on purpose.
+ANALYSIS_FIELDS = tuple(sorted(
+    {spec[0] for spec in RULE_SPECS.values()} | {spec[3] for spec in RULE_SPECS.values() if spec[3]}
+))
+
+# Every site field the report tab's summary shows.
+SUMMARY_FIELDS = tuple(
+    field for _, entries in SITE_SUMMARY_SECTIONS for _, _, fields in entries for field in fields
+)
+
+def content_key(kind, *parts):
+    """
+    Digest of a canonical text form of the parts. repr() keeps 30 and 30.0
+    apart, which matters because they render differently in messages.
+    """
+    digest = hashlib.blake2b(repr((kind,) + parts).encode('utf-8'), digest_size=16)
+    return digest.hexdigest()
+
+_RULES_VERSIONS = {} # project -> (rules dict, version number)
+_VERSION_NUMBERS = itertools.count(1)
+
+def _rules_version(project_name):
+    # Cache entries follow the rules object, so replacing a project's rules
+    # (e.g. loading a new rule set) never serves stale results. The dict is
+    # held here, so a new one never matches an old entry; edits in place are
+    # picked up through rules_changed().
+    rules = CONSTRUCTION_RULES.get(project_name)
+    known = _RULES_VERSIONS.get(project_name)
+    if known is None or known[0] is not rules:
+        known = (rules, next(_VERSION_NUMBERS))
+        _RULES_VERSIONS[project_name] = known
+    return known[1], rules_generation()
+
+def cached_check_suitability(site_details, project_name):
+    """check_suitability, memoized on the analysis fields of the site."""
+    values = tuple(site_details[field] for field in ANALYSIS_FIELDS)
+    key = content_key('issues', values, project_name, _rules_version(project_name))
+    return RESULT_CACHE.get_or_compute(key, lambda: check_suitability(site_details, project_name))
+
+def cached_start_evaluation(site_details, project_name):
+    """start_evaluation, memoized like cached_check_suitability (reevaluate never modifies the state)."""
+    values = tuple(site_details[field] for field in ANALYSIS_FIELDS)
+    key = content_key('evaluation', values, project_name, _rules_version(project_name))
+    return RESULT_CACHE.get_or_compute(key, lambda: start_evaluation(site_details, project_name))
+
+def cached_generate_report_text(site_details, desired_project, project_issues, suitable_projects=None):
+    """generate_report_text, memoized on every input plus today's date (printed in the report)."""
+    key = content_key(
+        'report', sorted(dict(site_details).items()), desired_project, tuple(project_issues),
+        None if suitable_projects is None else tuple(suitable_projects), datetime.date.today().isoformat()
+    )
+    return RESULT_CACHE.get_or_compute(
+        key, lambda: generate_report_text(site_details, desired_project, project_issues, suitable_projects)
+    )
+
+def cached_format_site_summary(site_details):
+    """format_site_summary, memoized on the fields it shows."""
+    key = content_key('summary', tuple(site_details[field] for field in SUMMARY_FIELDS))
+    return RESULT_CACHE.get_or_compute(key, lambda: format_site_summary(site_details))
+
+def cached_format_rules_for_display(project_name):
+    """format_rules_for_display, memoized per project."""
+    key = content_key('rules', project_name, _rules_version(project_name))
+    return RESULT_CACHE.get_or_compute(key, lambda: format_rules_for_display(project_name))
+
+def cached_generate_rules_text(project_name):
+    """generate_rules_text, memoized per project."""
+    key = content_key('rules_text', project_name, _rules_version(project_name))
+    return RESULT_CACHE.get_or_compute(key, lambda: generate_rules_text(project_name))
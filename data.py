@@ -1,5 +1,6 @@
 # --- 1. DATA DICTIONARIES (The "Indexes") ---
 # This file stores all data structures (options and rules).
+from types import MappingProxyType as _MappingProxyType
 
 # --- Legal, Survey & Site ---
 ZONING_OPTIONS = {
@@ -311,4 +312,155 @@ CONSTRUCTION_RULES = {
         'min_utility_level': 0, # Often 'None'
         'max_traffic_impact_score': 0,
     }
-}
\ No newline at end of file
+}
+
+# --- 3. SITE DETAILS SCHEMA ---
+# The fields of a site_details dict (as built by ui.render_input_tab), used to
+# read site rows from files outside the Streamlit form.
+
+# Plain numeric fields -> the type the form produces for them.
+SITE_NUMERIC_FIELDS = {
+    # Legal, Survey & Site
+    'fsi_available': float,
+    'envelope_width': float,
+    'envelope_depth': float,
+    'slope_pct': float,
+    'protected_trees_count': int,
+    # Geotechnical (Soil Properties)
+    'spt_n': int,
+    'bearing_capacity': float,
+    'cbr_pct': float,
+    'plate_load_settlement_mm': float,
+    'proctor_compaction': float,
+    'plasticity_index': int,
+    'ucs_kpa': float,
+    'cohesion_kpa': float,
+    'friction_angle_deg': float,
+    'permeability_cm_sec': float,
+    'percent_fines': float,
+    'core_cutter_density': float,
+    'soil_ph': float,
+    # Geotechnical (Water & Contaminants)
+    'groundwater_depth': float,
+    'percolation_rate_min_inch': float,
+    'soil_resistivity_ohm_m': float,
+    # Environmental & Risk
+    'wetland_percentage': float,
+    'air_quality_aqi': int,
+    'noise_level_dba': float,
+    'hazardous_site_proximity_ft': float,
+    # Infrastructure & Community
+    'pop_density_per_sq_km': int,
+}
+
+# Option-backed fields: key field -> (score field, options table).
+# The score is always derived from the key, exactly as the form does.
+SITE_OPTION_FIELDS = {
+    'soil_texture_key': ('soil_texture_score', SOIL_TEXTURE_OPTIONS),
+    'contaminant_key': ('contaminant_score', SOIL_CONTAMINANT_OPTIONS),
+    'water_quality_key': ('water_quality_score', WATER_QUALITY_OPTIONS),
+    'eia_key': ('eia_score', EIA_STATUS_OPTIONS),
+    'phase1_key': ('phase1_score', PHASE1_ESA_OPTIONS),
+    'phase2_key': ('phase2_score', PHASE2_ESA_OPTIONS),
+    'biodiversity_key': ('biodiversity_score', BIODIVERSITY_IMPACT_OPTIONS),
+    'flood_key': ('flood_score', FLOOD_RISK_OPTIONS),
+    'drainage_key': ('drainage_score', DRAINAGE_OPTIONS),
+    'seismic_key': ('seismic_score', SEISMIC_ZONE_OPTIONS),
+    'utility_key': ('utility_level', UTILITY_OPTIONS),
+    'traffic_key': ('traffic_score', TRAFFIC_IMPACT_OPTIONS),
+}
+
+
+# site_details field -> the st.session_state key of its form widget,
+# in the order ui.render_input_tab lays the dict out.
+SITE_SESSION_KEYS = {
+    'project_heading': 'project_heading',
+    # Legal & Survey
+    'zoning': 'zoning_choice',
+    'fsi_available': 'fsi_available',
+    'envelope_width': 'envelope_width',
+    'envelope_depth': 'envelope_depth',
+    'slope_pct': 'slope_pct',
+    'protected_trees_count': 'vegetation_survey',
+    # Geotechnical (Soil)
+    'spt_n': 'spt_n_value',
+    'bearing_capacity': 'bearing_capacity_kpa',
+    'cbr_pct': 'cbr_pct',
+    'plate_load_settlement_mm': 'plate_load_settlement_mm',
+    'proctor_compaction': 'proctor_compaction_pct',
+    'plasticity_index': 'plasticity_index',
+    'ucs_kpa': 'ucs_kpa',
+    'soil_texture_key': 'soil_texture_choice',
+    'cohesion_kpa': 'cohesion_kpa',
+    'friction_angle_deg': 'friction_angle_deg',
+    'permeability_cm_sec': 'permeability_cm_sec',
+    'percent_fines': 'percent_fines',
+    'core_cutter_density': 'core_cutter_density',
+    'soil_ph': 'soil_ph',
+    # Geotechnical (Water & Contaminants)
+    'groundwater_depth': 'groundwater_depth_ft',
+    'percolation_rate_min_inch': 'percolation_rate_min_inch',
+    'soil_resistivity_ohm_m': 'soil_resistivity_ohm_m',
+    'contaminant_key': 'contaminant_choice',
+    'water_quality_key': 'water_quality_choice',
+    # Environmental & Risk
+    'eia_key': 'eia_choice',
+    'phase1_key': 'phase1_choice',
+    'phase2_key': 'phase2_choice',
+    'biodiversity_key': 'biodiversity_choice',
+    'wetland_percentage': 'wetland_percentage',
+    'flood_key': 'flood_choice',
+    'drainage_key': 'drainage_choice',
+    'seismic_key': 'seismic_choice',
+    'air_quality_aqi': 'air_quality_aqi',
+    'noise_level_dba': 'noise_level_dba',
+    'hazardous_site_proximity_ft': 'hazardous_site_proximity_ft',
+    # Infrastructure & Community
+    'utility_key': 'utility_choice',
+    'pop_density_per_sq_km': 'pop_density_per_sq_km',
+    'traffic_key': 'traffic_choice',
+}
+
+# --- 4. SCORE -> KEY INDEXES ---
+# Every options table with scores, by name.
+SCORED_OPTIONS = {
+    'SOIL_TEXTURE_OPTIONS': SOIL_TEXTURE_OPTIONS,
+    'SOIL_CONTAMINANT_OPTIONS': SOIL_CONTAMINANT_OPTIONS,
+    'WATER_QUALITY_OPTIONS': WATER_QUALITY_OPTIONS,
+    'EIA_STATUS_OPTIONS': EIA_STATUS_OPTIONS,
+    'PHASE1_ESA_OPTIONS': PHASE1_ESA_OPTIONS,
+    'PHASE2_ESA_OPTIONS': PHASE2_ESA_OPTIONS,
+    'BIODIVERSITY_IMPACT_OPTIONS': BIODIVERSITY_IMPACT_OPTIONS,
+    'FLOOD_RISK_OPTIONS': FLOOD_RISK_OPTIONS,
+    'DRAINAGE_OPTIONS': DRAINAGE_OPTIONS,
+    'SEISMIC_ZONE_OPTIONS': SEISMIC_ZONE_OPTIONS,
+    'UTILITY_OPTIONS': UTILITY_OPTIONS,
+    'TRAFFIC_IMPACT_OPTIONS': TRAFFIC_IMPACT_OPTIONS,
+}
+
+# Read-only score -> option key map for each table above, keyed by id() of the
+# table so logic.get_key_from_score can find it from the dict it is given.
+# Built once at import; two options sharing a score is a data error.
+SCORE_INDEXES = {}
+for _name, _options in SCORED_OPTIONS.items():
+    _index = {}
+    for _key, _option in _options.items():
+        if _option['score'] in _index:
+            raise ValueError(
+                f"{_name}: '{_key}' and '{_index[_option['score']]}' share score {_option['score']}."
+            )
+        _index[_option['score']] = _key
+    SCORE_INDEXES[id(_options)] = _MappingProxyType(_index)
+
+# --- 5. FORM DROPDOWN CHOICES ---
+# Widget key -> the choices of that selectbox on the input form, built once at
+# import and shared by state.py (defaults) and ui.py (widgets). Read-only.
+FORM_CHOICES = {SITE_SESSION_KEYS['zoning']: tuple(ZONING_OPTIONS)}
+for _key_field, (_, _options) in SITE_OPTION_FIELDS.items():
+    FORM_CHOICES[SITE_SESSION_KEYS[_key_field]] = tuple(_options)
+
+# --- 6. SITE COORDINATES ---
+# Optional WGS84 position of a site in decimal degrees. Not part of
+# site_details: batch rows and the input form may carry them so fields can be
+# derived from local GIS data (see hazards.py).
+SITE_COORDINATE_FIELDS = ('latitude', 'longitude')
@@ -0,0 +1,321 @@
+import argparse
+import csv
+import itertools
+import math
+import os
+import sys
+import threading
+import numpy as np
+from data import *
+
+# --- HAZARD PROXIMITY INDEX ---
+# Computes `hazardous_site_proximity_ft` (distance to the nearest known
+# hazardous site) from site coordinates instead of typing it in. Hazard points
+# come from a local CSV with latitude/longitude columns (and optionally a name).
+#
+# Points are placed on the Earth as 3-D vectors and bucketed into a pyramid of
+# uniform grids, each cell twice the size of the level below. A query checks
+# the 2 x 2 x 2 block of cells nearest to it, finest level first, and is done
+# as soon as its nearest candidate is within half a cell size (nothing
+# unchecked can be closer).
+# So a site in a dense area only looks at a few nearby points, and a remote
+# site only looks at a few coarse cells. All queries of a batch go through
+# each level together as numpy array operations.
+#
+# Distances are great-circle distances on a spherical Earth, capped at
+# max_distance_ft: a site with no hazard within that radius gets the cap.
+#
+# Usage:
+#   ADVISOR_HAZARDS=hazards.csv streamlit run main.py
+#   python batch.py parcels.csv -o results.jsonl --hazards hazards.csv
+#   python hazards.py hazards.csv 40.7128 -74.0060
+
+EARTH_RADIUS_FT = 6371008.8 * 3.280839895 # mean Earth radius
+DEFAULT_BASE_CELL_FT = 1000.0
+DEFAULT_MAX_DISTANCE_FT = 26400.0 # 5 miles: well above every project's minimum
+QUERY_CHUNK_SIZE = 65536 # queries per pass (8 cell lookups each)
+MAX_CANDIDATE_PAIRS = 4_000_000 # (query, point) distances computed at once
+
+# CSV header names accepted for each column.
+LATITUDE_COLUMNS = ('latitude', 'lat', 'y')
+LONGITUDE_COLUMNS = ('longitude', 'lon', 'lng', 'long', 'x')
+NAME_COLUMNS = ('name', 'id', 'site_name')
+
+# The 8 cell offsets of a 2 x 2 x 2 block from its lower corner.
+_BLOCK = np.array(list(itertools.product((0, 1), repeat=3)), dtype=np.int64)
+_KEY_BITS = 21 # per axis; cell coordinates are offset into [0, 2**21)
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+_BLOCK_KEY_DELTAS = (_BLOCK[:, 0] << (2 * _KEY_BITS)) + (_BLOCK[:, 1] << _KEY_BITS) + _BLOCK[:, 2]
+
+def to_unit_xyz(latitudes, longitudes):
+    """(n, 3) array of positions on the unit sphere for coordinates in degrees."""
+    phi = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lam = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_phi = np.cos(phi)
+    return np.stack([cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)], axis=-1)
+
+def _cell_keys(cells):
+    # One int64 per (i, j, k) cell (any leading shape).
+    shifted = cells + _KEY_OFFSET
+    return (shifted[..., 0] << (2 * _KEY_BITS)) | (shifted[..., 1] << _KEY_BITS) | shifted[..., 2]
+
+def _chord_ft(distance_ft):
+    # Straight-line (chord) length for a great-circle distance.
+    return 2 * EARTH_RADIUS_FT * math.sin(min(distance_ft, math.pi * EARTH_RADIUS_FT) / (2 * EARTH_RADIUS_FT))
+
+def valid_coordinates(latitudes, longitudes):
+    """Boolean mask of finite coordinates within [-90, 90] x [-180, 180]."""
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        return (np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180)
+
+class HazardIndex:
+    """Nearest-hazard lookups over a fixed set of points (see the module comment)."""
+
+    def __init__(self, latitudes, longitudes, names=None,
+                 base_cell_ft=DEFAULT_BASE_CELL_FT, max_distance_ft=DEFAULT_MAX_DISTANCE_FT):
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        if latitudes.shape != longitudes.shape or latitudes.ndim != 1:
+            raise ValueError("latitudes and longitudes must be 1-D arrays of the same length.")
+        if not valid_coordinates(latitudes, longitudes).all():
+            raise ValueError("Hazard coordinates must be within [-90, 90] latitude and [-180, 180] longitude.")
+        if base_cell_ft < 25 or max_distance_ft <= 0:
+            raise ValueError("base_cell_ft must be >= 25 ft and max_distance_ft must be positive.")
+        self.names = None if names is None else list(names)
+        self.max_distance_ft = float(max_distance_ft)
+        self._points = to_unit_xyz(latitudes, longitudes) * EARTH_RADIUS_FT
+        self._max_chord = _chord_ft(self.max_distance_ft)
+
+        # Per level (up to cells of twice the cap): cell size, the occupied
+        # cells' keys (sorted), where each cell's points start in `order` and
+        # how many there are, and `order`.
+        self._levels = []
+        cell = float(base_cell_ft)
+        while True:
+            keys = _cell_keys(np.floor(self._points / cell).astype(np.int64))
+            order = np.argsort(keys, kind='stable')
+            cells, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+            self._levels.append((cell, cells, starts, counts, order))
+            if cell / 2 >= self._max_chord:
+                break
+            cell *= 2
+
+    def __len__(self):
+        return len(self._points)
+
+    def _lookup(self, level, queries):
+        # (starts in `order`, point counts) of the 8 cells nearest each query, as (n, 8) arrays.
+        cell, cells, cell_starts, cell_counts, _ = level
+        # The block's lower corner is the cell containing the point half a cell
+        # below the query on every axis. Looking cells up in key order is much
+        # faster (searchsorted reuses the previous bounds), and the 8 block keys
+        # are fixed offsets of the corner's key, so sorting the corners sorts all.
+        keys = _cell_keys(np.floor(queries / cell - 0.5).astype(np.int64))
+        by_key = np.argsort(keys)
+        needles = keys[by_key] + _BLOCK_KEY_DELTAS[:, None]
+        positions = np.minimum(np.searchsorted(cells, needles), len(cells) - 1)
+        occupied = cells[positions] == needles
+        starts = np.empty((len(queries), len(_BLOCK)), dtype=np.int64)
+        counts = np.empty((len(queries), len(_BLOCK)), dtype=np.int64)
+        starts[by_key] = cell_starts[positions].T
+        counts[by_key] = np.where(occupied, cell_counts[positions], 0).T
+        return starts, counts
+
+    def _search(self, level, queries, best, best_index):
+        # Updates best (squared distance) / best_index for the points in the 8 cells nearest each query.
+        order = level[-1]
+        starts, counts = self._lookup(level, queries)
+        per_query = counts.sum(axis=1)
+
+        # Groups of consecutive queries with at most MAX_CANDIDATE_PAIRS candidates between them.
+        cumulative = np.cumsum(per_query)
+        bounds = np.searchsorted(cumulative, np.arange(MAX_CANDIDATE_PAIRS, cumulative[-1], MAX_CANDIDATE_PAIRS), 'left')
+        for first, last in zip(np.r_[0, bounds], np.r_[bounds, len(queries)]):
+            last = max(last, first + 1)
+            group_counts = counts[first:last].ravel()
+            total = int(group_counts.sum())
+            if total == 0:
+                continue
+            # Every (query, candidate point) pair of the group, query by query.
+            segment_starts = np.cumsum(group_counts) - group_counts
+            positions = np.repeat(starts[first:last].ravel() - segment_starts, group_counts) + np.arange(total)
+            points = order[positions]
+            query_ids = np.repeat(np.arange(first, last), per_query[first:last])
+            squared = ((queries[query_ids] - self._points[points]) ** 2).sum(axis=1)
+
+            # Minimum per query: segments are contiguous, so reduceat then locate the winner.
+            lengths = per_query[first:last]
+            found = np.flatnonzero(lengths) + first
+            segment_bounds = np.cumsum(lengths[lengths > 0]) - lengths[lengths > 0]
+            minima = np.minimum.reduceat(squared, segment_bounds)
+            hits = np.flatnonzero(squared == np.repeat(minima, lengths[lengths > 0]))
+            _, first_hit = np.unique(query_ids[hits], return_index=True)
+            closer = minima < best[found]
+            best[found[closer]] = minima[closer]
+            best_index[found[closer]] = points[hits[first_hit]][closer]
+
+    def nearest(self, latitudes, longitudes):
+        """
+        Distance in ft to the nearest hazard and its position in the index, for
+        arrays of coordinates. Where no hazard is within max_distance_ft the
+        distance is max_distance_ft and the position -1. Raises ValueError for
+        invalid coordinates.
+        """
+        latitudes = np.atleast_1d(np.asarray(latitudes, dtype=np.float64))
+        longitudes = np.atleast_1d(np.asarray(longitudes, dtype=np.float64))
+        if not valid_coordinates(latitudes, longitudes).all():
+            raise ValueError("Site coordinates must be within [-90, 90] latitude and [-180, 180] longitude.")
+        distances = np.full(len(latitudes), self.max_distance_ft)
+        indexes = np.full(len(latitudes), -1, dtype=np.int64)
+        if not len(self._points):
+            return distances, indexes
+
+        for start in range(0, len(latitudes), QUERY_CHUNK_SIZE):
+            queries = to_unit_xyz(latitudes[start:start + QUERY_CHUNK_SIZE], longitudes[start:start + QUERY_CHUNK_SIZE])
+            queries *= EARTH_RADIUS_FT
+            best = np.full(len(queries), np.inf)
+            best_index = np.full(len(queries), -1, dtype=np.int64)
+            active = np.arange(len(queries))
+            for level in self._levels:
+                if not active.size:
+                    break
+                sub_best, sub_index = best[active], best_index[active]
+                self._search(level, queries[active], sub_best, sub_index)
+                best[active], best_index[active] = sub_best, sub_index
+                # Anything not yet checked is farther than half a cell size.
+                active = active[sub_best > (level[0] / 2) ** 2]
+
+            chord = np.sqrt(best)
+            within = chord <= self._max_chord
+            arc = 2 * EARTH_RADIUS_FT * np.arcsin(np.minimum(chord[within] / (2 * EARTH_RADIUS_FT), 1.0))
+            distances[start:start + len(queries)][within] = np.minimum(arc, self.max_distance_ft)
+            indexes[start:start + len(queries)][within] = best_index[within]
+        return distances, indexes
+
+    def nearest_one(self, latitude, longitude):
+        """(distance in ft, hazard name or None) for one site."""
+        distances, indexes = self.nearest([latitude], [longitude])
+        index = int(indexes[0])
+        name = self.names[index] if self.names is not None and index >= 0 else None
+        return float(distances[0]), name
+
+def _column(header, candidates):
+    for name in header:
+        if name.strip().lower() in candidates:
+            return name
+    return None
+
+def load_hazard_points(path):
+    """
+    Reads hazard points from a CSV file. Returns (latitudes, longitudes, names);
+    names is None without a name/id column. Raises ValueError for a bad file.
+    """
+    latitudes, longitudes, names = [], [], []
+    with open(path, newline='', encoding='utf-8') as handle:
+        reader = csv.DictReader(handle)
+        header = reader.fieldnames or []
+        latitude_column = _column(header, LATITUDE_COLUMNS)
+        longitude_column = _column(header, LONGITUDE_COLUMNS)
+        name_column = _column(header, NAME_COLUMNS)
+        if latitude_column is None or longitude_column is None:
+            raise ValueError(f"{path}: needs latitude and longitude columns.")
+        for number, row in enumerate(reader, start=2):
+            try:
+                latitudes.append(float(row[latitude_column]))
+                longitudes.append(float(row[longitude_column]))
+            except (TypeError, ValueError):
+                raise ValueError(f"{path}, line {number}: coordinates must be numbers.")
+            if name_column is not None:
+                names.append(row[name_column])
+    return np.array(latitudes), np.array(longitudes), names if name_column is not None else None
+
+def load_hazard_index(path, **options):
+    """HazardIndex over the points of a CSV file (options as for HazardIndex)."""
+    latitudes, longitudes, names = load_hazard_points(path)
+    return HazardIndex(latitudes, longitudes, names, **options)
+
+# --- FILLING SITE ROWS ---
+
+def row_coordinates(rows):
+    """
+    (positions, latitudes, longitudes) arrays for the raw site rows (dicts)
+    in the list that have valid latitude/longitude values.
+    """
+    positions, latitudes, longitudes = [], [], []
+    for position, row in enumerate(rows):
+        if not isinstance(row, dict):
+            continue
+        try:
+            latitude, longitude = (float(row[field]) for field in SITE_COORDINATE_FIELDS)
+        except (KeyError, TypeError, ValueError):
+            continue
+        positions.append(position)
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+    latitudes, longitudes = np.array(latitudes, dtype=np.float64), np.array(longitudes, dtype=np.float64)
+    valid = valid_coordinates(latitudes, longitudes)
+    return np.array(positions, dtype=np.int64)[valid], latitudes[valid], longitudes[valid]
+
+def fill_hazard_proximity(rows, index):
+    """
+    Sets hazardous_site_proximity_ft on every raw site row (dict) in the list
+    that has valid latitude/longitude values; other rows keep their own value.
+    Returns the number of rows filled.
+    """
+    positions, latitudes, longitudes = row_coordinates(rows)
+    distances, _ = index.nearest(latitudes, longitudes)
+    for position, distance in zip(positions.tolist(), distances.tolist()):
+        rows[position]['hazardous_site_proximity_ft'] = round(distance, 1)
+    return len(positions)
+
+def fill_hazard_proximity_stream(rows, index, chunk_size=QUERY_CHUNK_SIZE):
+    """fill_hazard_proximity over an iterable of rows, a chunk at a time. Yields the rows."""
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        fill_hazard_proximity(chunk, index)
+        yield from chunk
+
+_HAZARD_INDEX = None
+_HAZARD_INDEX_LOCK = threading.Lock()
+
+def get_hazard_index():
+    """
+    The process-wide index of the CSV at ADVISOR_HAZARDS, built on first use.
+    None when the variable is not set. Raises ValueError for a bad file.
+    """
+    global _HAZARD_INDEX
+    path = os.environ.get('ADVISOR_HAZARDS')
+    if not path:
+        return None
+    with _HAZARD_INDEX_LOCK:
+        if _HAZARD_INDEX is None or _HAZARD_INDEX[0] != path:
+            _HAZARD_INDEX = (path, load_hazard_index(path))
+        return _HAZARD_INDEX[1]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distance from a site to the nearest hazardous site.")
+    parser.add_argument('hazards', help="CSV of hazard points (latitude, longitude and optionally name columns).")
+    parser.add_argument('latitude', type=float)
+    parser.add_argument('longitude', type=float)
+    parser.add_argument('--max-distance', type=float, default=DEFAULT_MAX_DISTANCE_FT,
+                        help=f"Search radius in ft (default {DEFAULT_MAX_DISTANCE_FT:g}).")
+    args = parser.parse_args(argv)
+    try:
+        index = load_hazard_index(args.hazards, max_distance_ft=args.max_distance)
+        distance, name = index.nearest_one(args.latitude, args.longitude)
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 2
+    if distance >= index.max_distance_ft:
+        print(f"No hazard within {index.max_distance_ft:g} ft.")
+    else:
+        print(f"{distance:.1f} ft" + (f" ({name})" if name else ""))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+from cache import content_key
+
+# --- ANALYSIS HISTORY ---
+# Every analysis (site, project, issues and optionally the text report) saved
+# to a local SQLite database, so past results can be looked up and browsed
+# after the session ends. Sites are stored once per distinct set of
+# measurements; each analysis of one is a row in `analyses`.
+#
+#   sites     id, fingerprint (digest of the measurements), details (JSON)
+#   analyses  id, site_id, project_heading, project, zoning, suitable,
+#             issue_count, issues (JSON), created (ISO time), source
+#   reports   analysis_id, report
+#
+# `analyses` is indexed on project (with suitable), suitable, zoning and
+# created. Pages are read newest first by id (keyset pagination), which those
+# indexes serve without sorting for equality filters.
+#
+# The app writes to ADVISOR_HISTORY (default DEFAULT_HISTORY_PATH);
+# `python batch.py sites.csv --history results.sqlite3` bulk-loads batch results.
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser('~'), '.local', 'share', 'construction-advisor', 'history.sqlite3')
+DEFAULT_PAGE_SIZE = 50
+INSERT_CHUNK_SIZE = 10000
+_LOOKUP_BATCH = 500 # fingerprints per IN (...) query
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sites (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    details TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    site_id INTEGER NOT NULL REFERENCES sites(id),
+    project_heading TEXT,
+    project TEXT NOT NULL,
+    zoning TEXT NOT NULL,
+    suitable INTEGER NOT NULL,
+    issue_count INTEGER NOT NULL,
+    issues TEXT NOT NULL,
+    created TEXT NOT NULL,
+    source TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reports (
+    analysis_id INTEGER PRIMARY KEY REFERENCES analyses(id),
+    report TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_project ON analyses(project, suitable);
+CREATE INDEX IF NOT EXISTS analyses_suitable ON analyses(suitable);
+CREATE INDEX IF NOT EXISTS analyses_zoning ON analyses(zoning);
+CREATE INDEX IF NOT EXISTS analyses_created ON analyses(created);
+CREATE INDEX IF NOT EXISTS analyses_site ON analyses(site_id, project);
+"""
+
+HISTORY_COLUMNS = ['id', 'created', 'project_heading', 'project', 'zoning', 'suitable', 'issue_count', 'source']
+
+def site_fingerprint(site_details):
+    """Digest of a site's measurements (the heading is left out, like cache.py does)."""
+    return content_key('site', sorted((field, value) for field, value in site_details.items() if field != 'project_heading'))
+
+def _site_json(site_details):
+    return json.dumps({field: value for field, value in site_details.items() if field != 'project_heading'})
+
+def _filters(project=None, suitable=None, zoning=None, date_from=None, date_to=None):
+    # WHERE clause and parameters for the history filters (None = any).
+    # Dates are ISO strings; date_to is inclusive of the whole day.
+    clauses, parameters = [], []
+    for column, value in (('project', project), ('zoning', zoning)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            parameters.append(value)
+    if suitable is not None:
+        clauses.append("suitable = ?")
+        parameters.append(int(bool(suitable)))
+    if date_from is not None:
+        clauses.append("created >= ?")
+        parameters.append(str(date_from))
+    if date_to is not None:
+        clauses.append("created < ?")
+        parameters.append((datetime.date.fromisoformat(str(date_to)[:10]) + datetime.timedelta(days=1)).isoformat())
+    return clauses, parameters
+
+class AnalysisHistory:
+    """
+    The analysis history database. One connection, shared by every thread
+    (Streamlit sessions) behind a lock; writes are batched into transactions.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    # --- writing ---
+
+    def _site_ids(self, sites):
+        # fingerprint -> site id for the given {fingerprint: site}, inserting new sites.
+        cursor = self._connection.cursor()
+        cursor.executemany(
+            "INSERT OR IGNORE INTO sites (fingerprint, details) VALUES (?, ?)",
+            ((fingerprint, _site_json(site)) for fingerprint, site in sites.items())
+        )
+        fingerprints = list(sites)
+        ids = {}
+        for start in range(0, len(fingerprints), _LOOKUP_BATCH):
+            batch = fingerprints[start:start + _LOOKUP_BATCH]
+            placeholders = ", ".join("?" * len(batch))
+            ids.update(cursor.execute(f"SELECT fingerprint, id FROM sites WHERE fingerprint IN ({placeholders})", batch))
+        return ids
+
+    def _insert_chunk(self, chunk, source, created):
+        # One transaction: the chunk's sites, analyses and reports. Analysis
+        # ids are assigned here (under the write lock) so reports can refer to them.
+        connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Batch results repeat each site once per project: digest each site object once.
+            by_object = {}
+            for entry in chunk:
+                if id(entry['site']) not in by_object:
+                    by_object[id(entry['site'])] = site_fingerprint(entry['site'])
+            fingerprints = [by_object[id(entry['site'])] for entry in chunk]
+            site_ids = self._site_ids(dict(zip(fingerprints, (entry['site'] for entry in chunk))))
+            next_id = connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM analyses").fetchone()[0]
+            analyses, reports = [], []
+            for analysis_id, (entry, fingerprint) in enumerate(zip(chunk, fingerprints), next_id):
+                site, issues = entry['site'], entry['issues']
+                analyses.append((
+                    analysis_id, site_ids[fingerprint], site.get('project_heading'), entry['project'],
+                    site['zoning'], int(not issues), len(issues), json.dumps(issues), created, source,
+                ))
+                if entry.get('report') is not None:
+                    reports.append((analysis_id, entry['report']))
+            connection.executemany("INSERT INTO analyses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", analyses)
+            connection.executemany("INSERT INTO reports VALUES (?, ?)", reports)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return next_id
+
+    def record_many(self, entries, source='batch', chunk_size=INSERT_CHUNK_SIZE):
+        """
+        Saves analyses in transactions of `chunk_size`. Each entry is a dict
+        with 'site' (site_details), 'project', 'issues' and optionally 'report'.
+        Accepts any iterable (e.g. a generator of millions). Returns the count saved.
+        """
+        created = datetime.datetime.now().isoformat(timespec='seconds')
+        count = 0
+        chunk = []
+        for entry in entries:
+            chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                with self._lock:
+                    self._insert_chunk(chunk, source, created)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            with self._lock:
+                self._insert_chunk(chunk, source, created)
+            count += len(chunk)
+        return count
+
+    def record(self, site_details, project, issues, report=None, source='app'):
+        """Saves one analysis. Returns its id."""
+        entry = {'site': site_details, 'project': project, 'issues': issues, 'report': report}
+        with self._lock:
+            return self._insert_chunk([entry], source, datetime.datetime.now().isoformat(timespec='seconds'))
+
+    # --- reading ---
+
+    def _row(self, row):
+        record = dict(zip(HISTORY_COLUMNS, row))
+        record['suitable'] = bool(record['suitable'])
+        return record
+
+    def page(self, project=None, suitable=None, zoning=None, date_from=None, date_to=None,
+             before_id=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Up to `limit` analyses matching the filters, newest first. For the next
+        page pass the last returned id as `before_id`.
+        """
+        clauses, parameters = _filters(project, suitable, zoning, date_from, date_to)
+        if before_id is not None:
+            clauses.append("id < ?")
+            parameters.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = f"SELECT {', '.join(HISTORY_COLUMNS)} FROM analyses {where} ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._connection.execute(query, parameters + [limit]).fetchall()
+        return [self._row(row) for row in rows]
+
+    def count(self, project=None, suitable=None, zoning=None, date_from=None, date_to=None):
+        """Number of analyses matching the filters."""
+        clauses, parameters = _filters(project, suitable, zoning, date_from, date_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            return self._connection.execute(f"SELECT COUNT(*) FROM analyses {where}", parameters).fetchone()[0]
+
+    def get(self, analysis_id):
+        """One analysis with its issues, site details and report (None if not saved), or None."""
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT {', '.join('a.' + column for column in HISTORY_COLUMNS)}, a.issues, s.details, r.report "
+                "FROM analyses a JOIN sites s ON s.id = a.site_id "
+                "LEFT JOIN reports r ON r.analysis_id = a.id WHERE a.id = ?",
+                (analysis_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        record = self._row(row[:len(HISTORY_COLUMNS)])
+        issues, details, report = row[len(HISTORY_COLUMNS):]
+        record.update(issues=json.loads(issues), site_details=json.loads(details), report=report)
+        return record
+
+    def lookup(self, site_details, project=None):
+        """Past analyses of these exact measurements (any heading), newest first."""
+        clauses = ["s.fingerprint = ?"]
+        parameters = [site_fingerprint(site_details)]
+        if project is not None:
+            clauses.append("a.project = ?")
+            parameters.append(project)
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join('a.' + column for column in HISTORY_COLUMNS)} "
+                f"FROM analyses a JOIN sites s ON s.id = a.site_id WHERE {' AND '.join(clauses)} ORDER BY a.id DESC",
+                parameters
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+_HISTORY = None
+_HISTORY_LOCK = threading.Lock()
+
+def get_history():
+    """
+    The process-wide history at ADVISOR_HISTORY (or DEFAULT_HISTORY_PATH),
+    opened on first use. Returns None if it cannot be opened (the app then
+    just runs without history); ADVISOR_HISTORY=off disables it.
+    """
+    global _HISTORY
+    path = os.environ.get('ADVISOR_HISTORY', DEFAULT_HISTORY_PATH)
+    if path == 'off':
+        return None
+    with _HISTORY_LOCK:
+        if _HISTORY is None or _HISTORY.path != path:
+            try:
+                _HISTORY = AnalysisHistory(path)
+            except (OSError, sqlite3.Error):
+                return None
+        return _HISTORY
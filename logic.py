@@ -1,5 +1,14 @@
+import bisect
 import datetime
+import io
 import json
+import operator
+import os
+import threading
+import time
+import zipfile
+from collections import namedtuple
+import numpy as np
 from data import *
 
 # --- 3. HELPER FUNCTIONS & ANALYSIS LOGIC ---
@@ -7,6 +16,10 @@ from data import *
 
 def get_key_from_score(options_dict, score):
     """Helper to find the text key (e.g., 'Stable') for a given score (e.g., 2)."""
+    index = SCORE_INDEXES.get(id(options_dict))
+    if index is not None:
+        return index.get(score, "Unknown")
+    # Tables not listed in data.SCORED_OPTIONS fall back to a scan.
     for key, data in options_dict.items():
         if data['score'] == score:
             return key
@@ -16,191 +29,1056 @@ def format_option(option_key, options_dict):
     """Helper function for formatting selectbox options"""
     return f"{option_key} ({options_dict[option_key]['desc']})"
 
-def check_suitability(site_details, project_name):
+# --- RULE SPECIFICATIONS ---
+# One entry per rule key understood by the engine, in the order issues are reported:
+#   rule key -> (site field, operator, message template, label field, options table)
+# Operators: 'min' fails when the value is below the limit, 'max' when above it,
+# and 'in' when the value is not one of the allowed entries.
+# Templates are rendered with {value}, {limit}, {label} (the site's option key),
+# {required} (the option key of the limit score) and {rules[...]} (the project rules).
+RULE_SPECS = {
+    # Legal, Survey & Site
+    'zoning_allowed': ('zoning', 'in', "**Zoning Violation:** Site is '{value}', but project requires one of `[{limit}]`.", None, None),
+    'min_fsi': ('fsi_available', 'min', "**FSI Violation:** Site FSI is `{value}`, but project requires a minimum of `{limit}`.", None, None),
+    'min_envelope_width_ft': ('envelope_width', 'min', "**Size Violation:** Site envelope width is `{value}ft`, but project requires a minimum of `{limit}ft`.", None, None),
+    'min_envelope_depth_ft': ('envelope_depth', 'min', "**Size Violation:** Site envelope depth is `{value}ft`, but project requires a minimum of `{limit}ft`.", None, None),
+    'max_slope_pct': ('slope_pct', 'max', "**Topography Violation:** Site slope is `{value}%`, but project requires a maximum of `{limit}%`.", None, None),
+    'max_protected_trees_count': ('protected_trees_count', 'max', "**Vegetation Violation:** Site has `{value}` protected trees, but project allows a maximum of `{limit}`.", None, None),
+    # Geotechnical (Soil Properties)
+    'min_spt_n': ('spt_n', 'min', "**SPT Violation:** Site SPT N-value is `{value}`, but project requires a minimum of `{limit}`.", None, None),
+    'min_bearing_capacity_kpa': ('bearing_capacity', 'min', "**Bearing Capacity Violation:** Site capacity is `{value} kPa`, but project requires a minimum of `{limit} kPa`.", None, None),
+    'min_cbr_pct': ('cbr_pct', 'min', "**CBR Violation:** Site CBR is `{value}%`, but project requires a minimum of `{limit}%`.", None, None),
+    'max_plate_load_settlement_mm': ('plate_load_settlement_mm', 'max', "**Plate Load Violation:** Site settlement is `{value}mm`, but project allows a maximum of `{limit}mm`.", None, None),
+    'min_proctor_compaction_pct': ('proctor_compaction', 'min', "**Compaction Violation:** Site compaction is `{value}%`, but project requires a minimum of `{limit}%`.", None, None),
+    'max_plasticity_index': ('plasticity_index', 'max', "**Atterberg Violation:** Site Plasticity Index is `{value}`, but project requires a maximum of `{limit}` (less is better).", None, None),
+    'min_ucs_kpa': ('ucs_kpa', 'min', "**UCS Violation:** Site UCS is `{value} kPa`, but project requires a minimum of `{limit} kPa`.", None, None),
+    'min_soil_texture_score': ('soil_texture_score', 'min', "**Soil Texture Violation:** Site soil is '{label}', but project requires at least '{required}'.", 'soil_texture_key', SOIL_TEXTURE_OPTIONS),
+    'min_cohesion_kpa': ('cohesion_kpa', 'min', "**Cohesion Violation:** Site cohesion is `{value} kPa`, but project requires a minimum of `{limit} kPa`.", None, None),
+    'min_friction_angle_deg': ('friction_angle_deg', 'min', "**Friction Angle Violation:** Site friction angle is `{value}°`, but project requires a minimum of `{limit}°`.", None, None),
+    'min_soil_ph': ('soil_ph', 'min', "**Soil pH Violation:** Site pH is `{value}`, but project requires it to be between `{rules[min_soil_ph]}` and `{rules[max_soil_ph]}`.", None, None),
+    'max_soil_ph': ('soil_ph', 'max', "**Soil pH Violation:** Site pH is `{value}`, but project requires it to be between `{rules[min_soil_ph]}` and `{rules[max_soil_ph]}`.", None, None),
+    # Geotechnical (Water & Contaminants)
+    'min_groundwater_depth_ft': ('groundwater_depth', 'min', "**Groundwater Violation:** Water table is at `{value} ft`, but project requires it to be deeper than `{limit} ft`.", None, None),
+    'max_percolation_rate_min_inch': ('percolation_rate_min_inch', 'max', "**Percolation Violation:** Site percolation rate is `{value} min/inch`, but project requires a maximum of `{limit} min/inch` (faster is better).", None, None),
+    'min_soil_resistivity_ohm_m': ('soil_resistivity_ohm_m', 'min', "**Resistivity Violation:** Site resistivity is `{value} Ohm-m`, but project requires a minimum of `{limit} Ohm-m` (higher is less corrosive).", None, None),
+    'max_contaminant_score': ('contaminant_score', 'max', "**Contaminant Violation:** Site has '{label}' contaminants, but project allows a maximum of '{required}'.", 'contaminant_key', SOIL_CONTAMINANT_OPTIONS),
+    'max_water_quality_score': ('water_quality_score', 'max', "**Water Quality Violation:** Site water is '{label}', but project allows a maximum of '{required}'.", 'water_quality_key', WATER_QUALITY_OPTIONS),
+    # Environmental & Risk
+    'min_eia_status_score': ('eia_score', 'min', "**EIA Violation:** Site EIA status is '{label}', but project requires at least '{required}'.", 'eia_key', EIA_STATUS_OPTIONS),
+    'min_phase1_score': ('phase1_score', 'min', "**Phase I ESA Violation:** Site status is '{label}', but project requires at least '{required}'.", 'phase1_key', PHASE1_ESA_OPTIONS),
+    'min_phase2_score': ('phase2_score', 'min', "**Phase II ESA Violation:** Site status is '{label}', but project requires at least '{required}'.", 'phase2_key', PHASE2_ESA_OPTIONS),
+    'max_biodiversity_impact_score': ('biodiversity_score', 'max', "**Biodiversity Violation:** Site impact is '{label}', but project allows a maximum of '{required}'.", 'biodiversity_key', BIODIVERSITY_IMPACT_OPTIONS),
+    'max_wetland_percentage': ('wetland_percentage', 'max', "**Wetland Violation:** Site is `{value}%` wetland, but project allows a maximum of `{limit}%`.", None, None),
+    'max_flood_risk_score': ('flood_score', 'max', "**Flood Risk Violation:** Site is in '{label}', but project allows a maximum of '{required}'.", 'flood_key', FLOOD_RISK_OPTIONS),
+    'max_drainage_score': ('drainage_score', 'max', "**Drainage Violation:** Site drainage is '{label}', but project allows a maximum of '{required}'.", 'drainage_key', DRAINAGE_OPTIONS),
+    'max_seismic_zone_score': ('seismic_score', 'max', "**Seismic Violation:** Site is in '{label}', but project allows a maximum of '{required}'.", 'seismic_key', SEISMIC_ZONE_OPTIONS),
+    'max_air_quality_aqi': ('air_quality_aqi', 'max', "**Air Quality Violation:** Local AQI is `{value}`, but project requires a maximum of `{limit}`.", None, None),
+    'max_noise_level_dba': ('noise_level_dba', 'max', "**Noise Violation:** Average noise is `{value} dBA`, but project requires a maximum of `{limit} dBA`.", None, None),
+    'min_hazardous_site_proximity_ft': ('hazardous_site_proximity_ft', 'min', "**Hazardous Site Violation:** Site is `{value} ft` from a known hazard, but project requires a minimum of `{limit} ft`.", None, None),
+    # Infrastructure & Community
+    'min_utility_level': ('utility_level', 'min', "**Utility Violation:** Project requires '{required}', but site is '{label}'.", 'utility_key', UTILITY_OPTIONS),
+    'max_pop_density_per_sq_km': ('pop_density_per_sq_km', 'max', "**Population Density Violation:** Site density is `{value}/km²`, which is outside the project's allowed range.", None, None),
+    'min_pop_density_per_sq_km': ('pop_density_per_sq_km', 'min', "**Population Density Violation:** Site density is `{value}/km²`, which is outside the project's allowed range.", None, None),
+    'max_traffic_impact_score': ('traffic_score', 'max', "**Traffic Violation:** Site traffic impact is '{label}', but project allows a maximum of '{required}'.", 'traffic_key', TRAFFIC_IMPACT_OPTIONS),
+}
+
+def _not_in(value, allowed):
+    return value not in allowed
+
+# Maps a spec operator to a predicate that returns True when the rule is VIOLATED.
+RULE_OPERATORS = {
+    'min': operator.lt,
+    'max': operator.gt,
+    'in': _not_in,
+}
+
+# A single precompiled check: `test(site_details[field], limit)` is True on a violation.
+# `message` is the template with every project-level value already filled in, leaving
+# one %s for the site's `message_field` (its value, or its option key for score rules).
+CompiledRule = namedtuple('CompiledRule', ['key', 'field', 'test', 'limit', 'message', 'message_field'])
+
+_COMPILED_RULES = {} # project name -> (rules dict, rule generation, compiled tuple)
+
+def _escape_percent(value):
+    return format(value).replace('%', '%%')
+
+def compile_rules(rules):
+    """
+    Compiles one project's entry from CONSTRUCTION_RULES into a tuple of
+    CompiledRule predicates, ordered as the issues are reported.
+    Unknown rule keys are ignored, as they always have been.
+    """
+    escaped_rules = {key: _escape_percent(value) for key, value in rules.items()}
+    compiled = []
+    for key, (field, op, template, label_field, options) in RULE_SPECS.items():
+        if key not in rules:
+            continue
+        limit = rules[key]
+        if op == 'in':
+            limit_text = ', '.join(limit)
+            limit = frozenset(limit)
+        else:
+            limit_text = limit
+        required = get_key_from_score(options, limit) if options is not None else None
+        message = template.replace('%', '%%').format(
+            value='%s', label='%s', rules=escaped_rules,
+            limit=_escape_percent(limit_text), required=_escape_percent(required)
+        )
+        compiled.append(CompiledRule(key, field, RULE_OPERATORS[op], limit, message, label_field or field))
+    return tuple(compiled)
+
+def get_compiled_rules(project_name):
+    """
+    Returns the compiled predicate table for a project, compiling it on first use.
+    The table is rebuilt whenever CONSTRUCTION_RULES[project_name] is replaced
+    or rules_changed() is called. Raises KeyError for unknown projects.
+    """
+    rules = CONSTRUCTION_RULES[project_name]
+    cached = _COMPILED_RULES.get(project_name)
+    if cached is None or cached[0] is not rules or cached[1] != _RULES_GENERATION:
+        cached = (rules, _RULES_GENERATION, compile_rules(rules))
+        _COMPILED_RULES[project_name] = cached
+    return cached[2]
+
+def register_compiled_rules(project_name, rules, compiled):
+    """
+    Installs a table compiled earlier (e.g. loaded from disk) for a project,
+    so get_compiled_rules uses it while CONSTRUCTION_RULES[project_name] is
+    `rules` and rules_changed() is not called again.
+    """
+    _COMPILED_RULES[project_name] = (rules, _RULES_GENERATION, compiled)
+
+# --- RULE INSTRUMENTATION (opt-in) ---
+# While profiling is on, every rule evaluated by evaluate_rules, is_suitable
+# and check_suitability_batch is counted per rule key: evaluations, violations
+# and the time spent comparing. It is off by default and then costs one check
+# per call. The counters are process-wide (shared by every Streamlit session).
+
+_RULE_PROFILE = None # rule key -> [evaluations, violations, seconds] while profiling
+_RULE_PROFILE_LOCK = threading.Lock()
+
+def start_rule_profiling(reset=True):
+    """Turns the per-rule counters on (clearing them unless reset=False)."""
+    global _RULE_PROFILE
+    with _RULE_PROFILE_LOCK:
+        if reset or _RULE_PROFILE is None:
+            _RULE_PROFILE = {}
+
+def stop_rule_profiling():
+    """Turns the counters off. Returns what they had recorded (see get_rule_profile)."""
+    global _RULE_PROFILE
+    profile = get_rule_profile()
+    with _RULE_PROFILE_LOCK:
+        _RULE_PROFILE = None
+    return profile
+
+def rule_profiling_enabled():
+    return _RULE_PROFILE is not None
+
+def _record_rule_profile(samples):
+    # samples: iterable of (rule key, evaluations, violations, seconds)
+    with _RULE_PROFILE_LOCK:
+        if _RULE_PROFILE is None:
+            return
+        for key, evaluations, violations, seconds in samples:
+            counters = _RULE_PROFILE.setdefault(key, [0, 0, 0.0])
+            counters[0] += evaluations
+            counters[1] += violations
+            counters[2] += seconds
+
+def get_rule_profile():
+    """
+    Returns the counters as {rule key: {'evaluations', 'violations',
+    'violation_rate', 'seconds', 'mean_us'}}, most violated rule first.
+    Empty when profiling is off.
+    """
+    with _RULE_PROFILE_LOCK:
+        recorded = {key: list(counters) for key, counters in (_RULE_PROFILE or {}).items()}
+    profile = {}
+    for key, (evaluations, violations, seconds) in sorted(recorded.items(), key=lambda item: -item[1][1]):
+        profile[key] = {
+            'evaluations': evaluations,
+            'violations': violations,
+            'violation_rate': violations / evaluations if evaluations else 0.0,
+            'seconds': seconds,
+            'mean_us': seconds / evaluations * 1e6 if evaluations else 0.0,
+        }
+    return profile
+
+def merge_rule_profile(profile):
+    """
+    Adds counters from get_rule_profile() (e.g. returned by a worker process)
+    to this process's counters. Does nothing while profiling is off.
+    """
+    _record_rule_profile(
+        (key, counters['evaluations'], counters['violations'], counters['seconds'])
+        for key, counters in profile.items()
+    )
+
+def rule_profile_json(indent=2):
+    """get_rule_profile() as a JSON string."""
+    return json.dumps(get_rule_profile(), indent=indent)
+
+def _evaluate_profiled(rules, site_details, first_only=False):
+    # The instrumented twin of evaluate_rules / is_suitable.
+    violations = []
+    samples = []
+    clock = time.perf_counter
+    for rule in rules:
+        started = clock()
+        violated = rule.test(site_details[rule.field], rule.limit)
+        samples.append((rule.key, 1, int(violated), clock() - started))
+        if violated:
+            violations.append(rule)
+            if first_only:
+                break
+    _record_rule_profile(samples)
+    return violations
+
+def evaluate_rules(site_details, project_name):
+    """
+    Runs only the comparisons for a project and returns the violated CompiledRules.
+    No messages are built; pass the result to render_issues() when they are needed.
+    """
+    if _RULE_PROFILE is not None:
+        return _evaluate_profiled(get_compiled_rules(project_name), site_details)
+    return [rule for rule in get_compiled_rules(project_name)
+            if rule.test(site_details[rule.field], rule.limit)]
+
+def render_issue(rule, site_details):
+    """Renders the issue message for one violated CompiledRule."""
+    return rule.message % (site_details[rule.message_field],)
+
+def render_issues(violations, site_details):
+    """Renders the issue messages for a list of violated CompiledRules."""
+    issues = []
+    reported = None
+    for rule in violations:
+        # Paired min/max checks (e.g. soil pH) share one message; report it once.
+        if rule.message == reported:
+            continue
+        issues.append(rule.message % (site_details[rule.message_field],))
+        reported = rule.message
+    return issues
+
+# --- FIRST-FAILURE SCREENING ---
+# Pass/fail screening only needs the first violation, so it tries the rules
+# most selective first. A rule's selectivity is its observed violation rate
+# (see update_screening_order) or else an estimate from the options tables.
+
+UNKNOWN_REJECTION_RATE = 0.5 # numeric rules: no value distribution to estimate from
+MIN_OBSERVATIONS = 100 # evaluations needed before an observed rate is trusted
+
+_OBSERVED_RATES = {} # rule key -> observed violation rate
+_SCREENING_ORDERS = {} # project name -> (rules dict, rules in screening order)
+
+def estimate_rejection_rate(rule_key, limit):
+    """
+    Share of a rule's possible values that violate it: for zoning and
+    option-backed rules, the share of options that fail; otherwise
+    UNKNOWN_REJECTION_RATE.
+    """
+    field, op, _, _, options = RULE_SPECS[rule_key]
+    test = RULE_OPERATORS[op]
+    if op == 'in':
+        options = CATEGORICAL_FIELDS[field]
+        return sum(test(option, limit) for option in options) / len(options)
+    if options:
+        return sum(test(option['score'], limit) for option in options.values()) / len(options)
+    return UNKNOWN_REJECTION_RATE
+
+def rejection_rate(rule_key, limit):
+    """The observed violation rate of a rule if known, else its estimate."""
+    observed = _OBSERVED_RATES.get(rule_key)
+    return observed if observed is not None else estimate_rejection_rate(rule_key, limit)
+
+def update_screening_order(profile=None):
+    """
+    Reorders first-failure screening by observed violation rates: those of
+    rules with at least MIN_OBSERVATIONS evaluations in `profile` (default:
+    the current rule profile). Rates observed in first-failure mode are
+    conditional on the earlier rules passing. Returns the rates now in use.
+    """
+    profile = get_rule_profile() if profile is None else profile
+    for key, counters in profile.items():
+        if counters['evaluations'] >= MIN_OBSERVATIONS:
+            _OBSERVED_RATES[key] = counters['violations'] / counters['evaluations']
+    _SCREENING_ORDERS.clear()
+    return dict(_OBSERVED_RATES)
+
+def get_screening_order(project_name):
+    """
+    Returns a project's CompiledRules, most likely to fail first (ties keep
+    report order). Raises KeyError for unknown projects.
+    """
+    rules = CONSTRUCTION_RULES[project_name]
+    cached = _SCREENING_ORDERS.get(project_name)
+    if cached is None or cached[0] is not rules:
+        ordered = sorted(get_compiled_rules(project_name), key=lambda rule: -rejection_rate(rule.key, rule.limit))
+        cached = (rules, tuple(ordered))
+        _SCREENING_ORDERS[project_name] = cached
+    return cached[1]
+
+def first_violation(site_details, project_name):
+    """
+    Returns the first violated CompiledRule in screening order, or None if
+    the project suits the site.
+    """
+    rules = get_screening_order(project_name)
+    if _RULE_PROFILE is not None:
+        violations = _evaluate_profiled(rules, site_details, first_only=True)
+        return violations[0] if violations else None
+    for rule in rules:
+        if rule.test(site_details[rule.field], rule.limit):
+            return rule
+    return None
+
+def is_suitable(site_details, project_name):
+    """Fast pass/fail check. Returns True if the project has no violations."""
+    return first_violation(site_details, project_name) is None
+
+def check_suitability(site_details, project_name, first_failure=False):
     """
     Checks a single project against the site details.
     Returns a list of issues. If the list is empty, the project is suitable.
+    With first_failure=True, stops at the first violation found (most
+    selective rules first) and returns only that issue.
     """
     if project_name not in CONSTRUCTION_RULES:
         return ["Invalid project name selected."]
-        
+
+    if first_failure:
+        rule = first_violation(site_details, project_name)
+        return [] if rule is None else [render_issue(rule, site_details)]
+    return render_issues(evaluate_rules(site_details, project_name), site_details)
+
+
+# --- PROJECT INDEX ("Which projects fit this site?") ---
+# Answers the question for every project at once. Bit i of each mask stands for the
+# i-th project. For every rule key the distinct thresholds are sorted into
+# breakpoints, and each interval between breakpoints maps to the mask of projects
+# a value in that interval satisfies. ANDing one mask per rule gives the answer.
+
+_PROJECT_INDEX = {} # (id, size, generation) of the rules dict -> index
+_RULES_GENERATION = 0 # bumped by rules_changed()
+
+def build_project_index(rules_by_project=None):
+    """
+    Builds the bitset index for a {project name: rules} dict
+    (CONSTRUCTION_RULES by default). Returns a dict with the project order,
+    the mask of all projects and one (field, op, table, default mask) check per rule key.
+    """
+    if rules_by_project is None:
+        rules_by_project = CONSTRUCTION_RULES
+    projects = list(rules_by_project)
+    all_mask = (1 << len(projects)) - 1
+    checks = []
+    for key, (field, op, *_) in RULE_SPECS.items():
+        having = [(1 << bit, rules[key]) for bit, rules in enumerate(rules_by_project.values()) if key in rules]
+        if not having:
+            continue
+        # Projects without this rule pass it whatever the value.
+        present = ''.join('1' if key in rules else '0' for rules in reversed(rules_by_project.values()))
+        free = all_mask & ~int(present, 2)
+
+        if op == 'in':
+            lookup = {}
+            for project_bit, allowed in having:
+                for option in allowed:
+                    lookup[option] = lookup.get(option, free) | project_bit
+            checks.append((field, op, lookup, free))
+            continue
+
+        breakpoints = sorted({limit for _, limit in having})
+        positions = {limit: position for position, limit in enumerate(breakpoints)}
+        at_limit = [0] * len(breakpoints) # projects whose limit is each breakpoint
+        for project_bit, limit in having:
+            at_limit[positions[limit]] |= project_bit
+        # Running ORs: linear in the breakpoints, not one pass per project.
+        masks = [free] * (len(breakpoints) + 1)
+        if op == 'min':
+            # Passes once value >= limit: every interval from just above the limit up.
+            for slot in range(1, len(masks)):
+                masks[slot] = masks[slot - 1] | at_limit[slot - 1]
+        else:
+            # Passes while value <= limit: every interval up to the limit itself.
+            for slot in range(len(breakpoints) - 1, -1, -1):
+                masks[slot] = masks[slot + 1] | at_limit[slot]
+        checks.append((field, op, breakpoints, masks))
+
+    return {'projects': projects, 'all': all_mask, 'checks': checks}
+
+def rules_changed():
+    """
+    Call after changing CONSTRUCTION_RULES in place (replacing, renaming or
+    editing a project's rules, e.g. loading a rule file over existing
+    projects) so the project index, the compiled rule tables and the cached
+    results are rebuilt. The index only notices on its own when the number of
+    projects changes.
+    """
+    global _RULES_GENERATION
+    _RULES_GENERATION += 1
+
+def rules_generation():
+    """A number that changes on every rules_changed() call."""
+    return _RULES_GENERATION
+
+def get_project_index():
+    """
+    Returns the index for CONSTRUCTION_RULES. It is rebuilt when the number of
+    projects changes or rules_changed() was called; any other change in place
+    needs a rules_changed() call to show up.
+    """
+    cache_key = (id(CONSTRUCTION_RULES), len(CONSTRUCTION_RULES), _RULES_GENERATION)
+    index = _PROJECT_INDEX.get(cache_key)
+    if index is None:
+        _PROJECT_INDEX.clear()
+        index = _PROJECT_INDEX[cache_key] = build_project_index()
+    return index
+
+def find_suitable_projects(site_details, index=None):
+    """
+    Returns the names of every project the site satisfies, in CONSTRUCTION_RULES order,
+    without running check_suitability once per project.
+    """
+    if index is None:
+        index = get_project_index()
+    mask = index['all']
+    for field, op, table, default in index['checks']:
+        value = site_details[field]
+        if op == 'min':
+            mask &= default[bisect.bisect_right(table, value)]
+        elif op == 'max':
+            mask &= default[bisect.bisect_left(table, value)]
+        else:
+            mask &= table.get(value, default)
+        if not mask:
+            return []
+
+    projects = index['projects']
+    suitable = []
+    while mask:
+        lowest = mask & -mask
+        suitable.append(projects[lowest.bit_length() - 1])
+        mask ^= lowest
+    return suitable
+
+# --- BATCH (VECTORIZED) EVALUATION ---
+# The rule axis of every batch result follows RULE_SPECS order.
+RULE_KEYS = tuple(RULE_SPECS)
+
+# Categorical site fields checked with the 'in' operator, packed as integer
+# codes into their options table. Unknown values get the code len(options).
+CATEGORICAL_FIELDS = {
+    'zoning': ZONING_OPTIONS,
+}
+
+def pack_sites(sites):
+    """
+    Packs an iterable of site detail dicts into column arrays, one per field
+    read by RULE_SPECS. Numeric fields become float64 arrays and categorical
+    fields become integer codes (see CATEGORICAL_FIELDS).
+    """
+    sites = list(sites)
+    count = len(sites)
+    columns = {}
+    for field, op, *_ in RULE_SPECS.values():
+        if field in columns:
+            continue
+        if field in CATEGORICAL_FIELDS:
+            options = CATEGORICAL_FIELDS[field]
+            codes = {key: code for code, key in enumerate(options)}
+            columns[field] = np.fromiter(
+                (codes.get(site[field], len(options)) for site in sites), dtype=np.intp, count=count
+            )
+        else:
+            columns[field] = np.fromiter((site[field] for site in sites), dtype=np.float64, count=count)
+    return columns
+
+def _batch_rule_violations(key, values, project_rules, out):
+    # Fills out[site, project] with whether rule `key` is violated, for a column
+    # of site values and each project's rules dict.
+    field, op, *_ = RULE_SPECS[key]
+    if op == 'in':
+        options = CATEGORICAL_FIELDS[field]
+        # Row per project, column per option code (plus one for unknown values).
+        allowed = np.zeros((len(project_rules), len(options) + 1), dtype=bool)
+        for row, rules in enumerate(project_rules):
+            if key not in rules:
+                allowed[row, :] = True
+                continue
+            for code, option in enumerate(options):
+                allowed[row, code] = option in rules[key]
+        out[...] = ~allowed[:, values].T
+    else:
+        # Missing rules become NaN, which never compares as a violation.
+        limits = np.array([rules.get(key, np.nan) for rules in project_rules], dtype=np.float64)
+        compare = np.less if op == 'min' else np.greater
+        compare(values[:, None], limits[None, :], out=out)
+
+def check_suitability_batch(sites, projects=None):
+    """
+    Evaluates many sites against many projects in one vectorized pass.
+    `sites` is a list of site detail dicts or the column dict from pack_sites();
+    `projects` defaults to every project in CONSTRUCTION_RULES.
+    Returns a boolean array of shape (sites, projects, len(RULE_KEYS)) that is
+    True where a rule is violated. A site suits a project when
+    `not result[site, project].any()`. Raises KeyError for unknown projects.
+    """
+    columns = sites if isinstance(sites, dict) else pack_sites(sites)
+    if projects is None:
+        projects = list(CONSTRUCTION_RULES)
+    project_rules = [CONSTRUCTION_RULES[name] for name in projects]
+    count = len(next(iter(columns.values()))) if columns else 0
+
+    violations = np.zeros((count, len(project_rules), len(RULE_KEYS)), dtype=bool)
+    samples = []
+    for index, key in enumerate(RULE_KEYS):
+        field = RULE_SPECS[key][0]
+        if not any(key in rules for rules in project_rules):
+            continue
+        started = time.perf_counter()
+        _batch_rule_violations(key, columns[field], project_rules, violations[:, :, index])
+        if _RULE_PROFILE is not None:
+            checked = [row for row, rules in enumerate(project_rules) if key in rules]
+            samples.append((key, count * len(checked), int(violations[:, checked, index].sum()),
+                            time.perf_counter() - started))
+    if samples:
+        _record_rule_profile(samples)
+    return violations
+
+def suitable_mask(columns, project_name, count=None):
+    """
+    Checks one project against column arrays (pack_sites layout) and returns
+    (mask, checked rule keys): mask is True where none of the checked rules
+    is violated. Rules whose field is not in `columns` are not checked, so a
+    partial set of columns (e.g. raster layers of an area) can be screened.
+    `count` (the number of sites) defaults to the columns' length; pass it
+    when `columns` may be empty. Raises KeyError for an unknown project.
+    """
     rules = CONSTRUCTION_RULES[project_name]
-    issues = []
-    
-    # --- Check Legal, Survey & Site ---
-    if 'zoning_allowed' in rules and site_details['zoning'] not in rules['zoning_allowed']:
-        issues.append(f"**Zoning Violation:** Site is '{site_details['zoning']}', but project requires one of `[{', '.join(rules['zoning_allowed'])}]`.")
-    if 'min_fsi' in rules and site_details['fsi_available'] < rules['min_fsi']:
-        issues.append(f"**FSI Violation:** Site FSI is `{site_details['fsi_available']}`, but project requires a minimum of `{rules['min_fsi']}`.")
-    if 'min_envelope_width_ft' in rules and site_details['envelope_width'] < rules['min_envelope_width_ft']:
-        issues.append(f"**Size Violation:** Site envelope width is `{site_details['envelope_width']}ft`, but project requires a minimum of `{rules['min_envelope_width_ft']}ft`.")
-    if 'min_envelope_depth_ft' in rules and site_details['envelope_depth'] < rules['min_envelope_depth_ft']:
-        issues.append(f"**Size Violation:** Site envelope depth is `{site_details['envelope_depth']}ft`, but project requires a minimum of `{rules['min_envelope_depth_ft']}ft`.")
-    if 'max_slope_pct' in rules and site_details['slope_pct'] > rules['max_slope_pct']:
-        issues.append(f"**Topography Violation:** Site slope is `{site_details['slope_pct']}%`, but project requires a maximum of `{rules['max_slope_pct']}%`.")
-    if 'max_protected_trees_count' in rules and site_details['protected_trees_count'] > rules['max_protected_trees_count']:
-        issues.append(f"**Vegetation Violation:** Site has `{site_details['protected_trees_count']}` protected trees, but project allows a maximum of `{rules['max_protected_trees_count']}`.")
-
-    # --- Check Geotechnical (Soil Properties) ---
-    if 'min_spt_n' in rules and site_details['spt_n'] < rules['min_spt_n']:
-        issues.append(f"**SPT Violation:** Site SPT N-value is `{site_details['spt_n']}`, but project requires a minimum of `{rules['min_spt_n']}`.")
-    if 'min_bearing_capacity_kpa' in rules and site_details['bearing_capacity'] < rules['min_bearing_capacity_kpa']:
-        issues.append(f"**Bearing Capacity Violation:** Site capacity is `{site_details['bearing_capacity']} kPa`, but project requires a minimum of `{rules['min_bearing_capacity_kpa']} kPa`.")
-    if 'min_cbr_pct' in rules and site_details['cbr_pct'] < rules['min_cbr_pct']:
-        issues.append(f"**CBR Violation:** Site CBR is `{site_details['cbr_pct']}%`, but project requires a minimum of `{rules['min_cbr_pct']}%`.")
-    if 'max_plate_load_settlement_mm' in rules and site_details['plate_load_settlement_mm'] > rules['max_plate_load_settlement_mm']:
-        issues.append(f"**Plate Load Violation:** Site settlement is `{site_details['plate_load_settlement_mm']}mm`, but project allows a maximum of `{rules['max_plate_load_settlement_mm']}mm`.")
-    if 'min_proctor_compaction_pct' in rules and site_details['proctor_compaction'] < rules['min_proctor_compaction_pct']:
-        issues.append(f"**Compaction Violation:** Site compaction is `{site_details['proctor_compaction']}%`, but project requires a minimum of `{rules['min_proctor_compaction_pct']}%`.")
-    if 'max_plasticity_index' in rules and site_details['plasticity_index'] > rules['max_plasticity_index']:
-        issues.append(f"**Atterberg Violation:** Site Plasticity Index is `{site_details['plasticity_index']}`, but project requires a maximum of `{rules['max_plasticity_index']}` (less is better).")
-    if 'min_ucs_kpa' in rules and site_details['ucs_kpa'] < rules['min_ucs_kpa']:
-        issues.append(f"**UCS Violation:** Site UCS is `{site_details['ucs_kpa']} kPa`, but project requires a minimum of `{rules['min_ucs_kpa']} kPa`.")
-    if 'min_soil_texture_score' in rules and site_details['soil_texture_score'] < rules['min_soil_texture_score']:
-        req_texture = get_key_from_score(SOIL_TEXTURE_OPTIONS, rules['min_soil_texture_score'])
-        issues.append(f"**Soil Texture Violation:** Site soil is '{site_details['soil_texture_key']}', but project requires at least '{req_texture}'.")
-    if 'min_cohesion_kpa' in rules and site_details['cohesion_kpa'] < rules['min_cohesion_kpa']:
-        issues.append(f"**Cohesion Violation:** Site cohesion is `{site_details['cohesion_kpa']} kPa`, but project requires a minimum of `{rules['min_cohesion_kpa']} kPa`.")
-    if 'min_friction_angle_deg' in rules and site_details['friction_angle_deg'] < rules['min_friction_angle_deg']:
-        issues.append(f"**Friction Angle Violation:** Site friction angle is `{site_details['friction_angle_deg']}°`, but project requires a minimum of `{rules['min_friction_angle_deg']}°`.")
-    if ('min_soil_ph' in rules and site_details['soil_ph'] < rules['min_soil_ph']) or \
-       ('max_soil_ph' in rules and site_details['soil_ph'] > rules['max_soil_ph']):
-        issues.append(f"**Soil pH Violation:** Site pH is `{site_details['soil_ph']}`, but project requires it to be between `{rules['min_soil_ph']}` and `{rules['max_soil_ph']}`.")
-    
-    # --- Check Geotechnical (Water & Contaminants) ---
-    if 'min_groundwater_depth_ft' in rules and site_details['groundwater_depth'] < rules['min_groundwater_depth_ft']:
-        issues.append(f"**Groundwater Violation:** Water table is at `{site_details['groundwater_depth']} ft`, but project requires it to be deeper than `{rules['min_groundwater_depth_ft']} ft`.")
-    if 'max_percolation_rate_min_inch' in rules and site_details['percolation_rate_min_inch'] > rules['max_percolation_rate_min_inch']:
-        issues.append(f"**Percolation Violation:** Site percolation rate is `{site_details['percolation_rate_min_inch']} min/inch`, but project requires a maximum of `{rules['max_percolation_rate_min_inch']} min/inch` (faster is better).")
-    if 'min_soil_resistivity_ohm_m' in rules and site_details['soil_resistivity_ohm_m'] < rules['min_soil_resistivity_ohm_m']:
-        issues.append(f"**Resistivity Violation:** Site resistivity is `{site_details['soil_resistivity_ohm_m']} Ohm-m`, but project requires a minimum of `{rules['min_soil_resistivity_ohm_m']} Ohm-m` (higher is less corrosive).")
-    if 'max_contaminant_score' in rules and site_details['contaminant_score'] > rules['max_contaminant_score']:
-        req_contaminant = get_key_from_score(SOIL_CONTAMINANT_OPTIONS, rules['max_contaminant_score'])
-        issues.append(f"**Contaminant Violation:** Site has '{site_details['contaminant_key']}' contaminants, but project allows a maximum of '{req_contaminant}'.")
-    if 'max_water_quality_score' in rules and site_details['water_quality_score'] > rules['max_water_quality_score']:
-        req_water = get_key_from_score(WATER_QUALITY_OPTIONS, rules['max_water_quality_score'])
-        issues.append(f"**Water Quality Violation:** Site water is '{site_details['water_quality_key']}', but project allows a maximum of '{req_water}'.")
-
-    # --- Check Environmental & Risk ---
-    if 'min_eia_status_score' in rules and site_details['eia_score'] < rules['min_eia_status_score']:
-        req_eia = get_key_from_score(EIA_STATUS_OPTIONS, rules['min_eia_status_score'])
-        issues.append(f"**EIA Violation:** Site EIA status is '{site_details['eia_key']}', but project requires at least '{req_eia}'.")
-    if 'min_phase1_score' in rules and site_details['phase1_score'] < rules['min_phase1_score']:
-        req_phase1 = get_key_from_score(PHASE1_ESA_OPTIONS, rules['min_phase1_score'])
-        issues.append(f"**Phase I ESA Violation:** Site status is '{site_details['phase1_key']}', but project requires at least '{req_phase1}'.")
-    if 'min_phase2_score' in rules and site_details['phase2_score'] < rules['min_phase2_score']:
-        req_phase2 = get_key_from_score(PHASE2_ESA_OPTIONS, rules['min_phase2_score'])
-        issues.append(f"**Phase II ESA Violation:** Site status is '{site_details['phase2_key']}', but project requires at least '{req_phase2}'.")
-    if 'max_biodiversity_impact_score' in rules and site_details['biodiversity_score'] > rules['max_biodiversity_impact_score']:
-        req_bio = get_key_from_score(BIODIVERSITY_IMPACT_OPTIONS, rules['max_biodiversity_impact_score'])
-        issues.append(f"**Biodiversity Violation:** Site impact is '{site_details['biodiversity_key']}', but project allows a maximum of '{req_bio}'.")
-    if 'max_wetland_percentage' in rules and site_details['wetland_percentage'] > rules['max_wetland_percentage']:
-        issues.append(f"**Wetland Violation:** Site is `{site_details['wetland_percentage']}%` wetland, but project allows a maximum of `{rules['max_wetland_percentage']}%`.")
-    if 'max_flood_risk_score' in rules and site_details['flood_score'] > rules['max_flood_risk_score']:
-        req_flood = get_key_from_score(FLOOD_RISK_OPTIONS, rules['max_flood_risk_score'])
-        issues.append(f"**Flood Risk Violation:** Site is in '{site_details['flood_key']}', but project allows a maximum of '{req_flood}'.")
-    if 'max_drainage_score' in rules and site_details['drainage_score'] > rules['max_drainage_score']:
-        req_drainage = get_key_from_score(DRAINAGE_OPTIONS, rules['max_drainage_score'])
-        issues.append(f"**Drainage Violation:** Site drainage is '{site_details['drainage_key']}', but project allows a maximum of '{req_drainage}'.")
-    if 'max_seismic_zone_score' in rules and site_details['seismic_score'] > rules['max_seismic_zone_score']:
-        req_seismic = get_key_from_score(SEISMIC_ZONE_OPTIONS, rules['max_seismic_zone_score'])
-        issues.append(f"**Seismic Violation:** Site is in '{site_details['seismic_key']}', but project allows a maximum of '{req_seismic}'.")
-    if 'max_air_quality_aqi' in rules and site_details['air_quality_aqi'] > rules['max_air_quality_aqi']:
-        issues.append(f"**Air Quality Violation:** Local AQI is `{site_details['air_quality_aqi']}`, but project requires a maximum of `{rules['max_air_quality_aqi']}`.")
-    if 'max_noise_level_dba' in rules and site_details['noise_level_dba'] > rules['max_noise_level_dba']:
-        issues.append(f"**Noise Violation:** Average noise is `{site_details['noise_level_dba']} dBA`, but project requires a maximum of `{rules['max_noise_level_dba']} dBA`.")
-    if 'min_hazardous_site_proximity_ft' in rules and site_details['hazardous_site_proximity_ft'] < rules['min_hazardous_site_proximity_ft']:
-        issues.append(f"**Hazardous Site Violation:** Site is `{site_details['hazardous_site_proximity_ft']} ft` from a known hazard, but project requires a minimum of `{rules['min_hazardous_site_proximity_ft']} ft`.")
-
-    # --- Check Infrastructure & Community ---
-    if 'min_utility_level' in rules and site_details['utility_level'] < rules['min_utility_level']:
-        required_utility = get_key_from_score(UTILITY_OPTIONS, rules['min_utility_level'])
-        issues.append(f"**Utility Violation:** Project requires '{required_utility}', but site is '{site_details['utility_key']}'.")
-    if ('max_pop_density_per_sq_km' in rules and site_details['pop_density_per_sq_km'] > rules['max_pop_density_per_sq_km']) or \
-       ('min_pop_density_per_sq_km' in rules and site_details['pop_density_per_sq_km'] < rules['min_pop_density_per_sq_km']):
-        issues.append(f"**Population Density Violation:** Site density is `{site_details['pop_density_per_sq_km']}/km²`, which is outside the project's allowed range.")
-    if 'max_traffic_impact_score' in rules and site_details['traffic_score'] > rules['max_traffic_impact_score']:
-        req_traffic = get_key_from_score(TRAFFIC_IMPACT_OPTIONS, rules['max_traffic_impact_score'])
-        issues.append(f"**Traffic Violation:** Site traffic impact is '{site_details['traffic_key']}', but project allows a maximum of '{req_traffic}'.")
+    if count is None:
+        count = len(next(iter(columns.values()))) if columns else 0
+    mask = np.ones(count, dtype=bool)
+    violated = np.empty((count, 1), dtype=bool)
+    checked = []
+    for key in RULE_KEYS:
+        field = RULE_SPECS[key][0]
+        if key not in rules or field not in columns:
+            continue
+        _batch_rule_violations(key, columns[field], [rules], violated)
+        mask &= ~violated[:, 0]
+        checked.append(key)
+    return mask, checked
 
-    return issues
+# --- INCREMENTAL RE-EVALUATION ---
+# When only a few fields of a site change, only the rules reading those fields
+# need to run again. FIELD_RULES is that dependency map: the compared field of
+# each rule, plus the option key its message quotes.
+
+FIELD_RULES = {}
+for _key, (_field, _, _, _label_field, _) in RULE_SPECS.items():
+    for _read in {_field, _label_field} - {None}:
+        FIELD_RULES.setdefault(_read, []).append(_key)
+FIELD_RULES = {field: tuple(keys) for field, keys in FIELD_RULES.items()}
 
-def generate_report_text(site_details, desired_project, project_issues):
+def start_evaluation(site_details, project_name):
     """
-    Generates a text string for the download button.
-    (Removed suitable_projects)
+    Evaluates every rule of a project and returns the evaluation state that
+    reevaluate() updates: {'project', 'rules', 'values', 'violated', 'issues'}.
+    Raises KeyError for unknown projects.
+    """
+    rules = get_compiled_rules(project_name)
+    violated = {rule.key for rule in evaluate_rules(site_details, project_name)}
+    return _evaluation_state(project_name, rules, site_details, violated)
+
+def _evaluation_state(project_name, rules, site_details, violated):
+    values = {field: site_details[field] for field in FIELD_RULES}
+    issues = render_issues([rule for rule in rules if rule.key in violated], site_details)
+    return {'project': project_name, 'rules': rules, 'values': values, 'violated': violated, 'issues': issues}
+
+def reevaluate(state, site_details):
+    """
+    Brings an evaluation state up to date with new site details, re-running
+    only the rules that read a changed field (everything, if the project's
+    rules were replaced). Returns (new state, diff) where diff has
+    'changed_fields', 'evaluated' (rule keys re-run), 'now_failing' and
+    'now_passing' (rule keys), and 'added_issues' / 'resolved_issues'.
+    """
+    project_name = state['project']
+    rules = get_compiled_rules(project_name)
+    changed = [field for field, value in state['values'].items() if site_details[field] != value]
+    if rules is not state['rules']:
+        evaluate = rules
+    else:
+        touched = {key for field in changed for key in FIELD_RULES[field]}
+        evaluate = [rule for rule in rules if rule.key in touched]
+
+    violated = set(state['violated']) - {rule.key for rule in evaluate}
+    violated.update(rule.key for rule in evaluate if rule.test(site_details[rule.field], rule.limit))
+    new_state = _evaluation_state(project_name, rules, site_details, violated)
+
+    previous_issues = set(state['issues'])
+    current_issues = set(new_state['issues'])
+    diff = {
+        'changed_fields': changed,
+        'evaluated': [rule.key for rule in evaluate],
+        'now_failing': [rule.key for rule in rules if rule.key in violated and rule.key not in state['violated']],
+        'now_passing': [rule.key for rule in state['rules'] if rule.key in state['violated'] and rule.key not in violated],
+        'added_issues': [issue for issue in new_state['issues'] if issue not in previous_issues],
+        'resolved_issues': [issue for issue in state['issues'] if issue not in current_issues],
+    }
+    return new_state, diff
+
+def rescreen_batch(violations, columns, changes, projects=None):
+    """
+    Updates a check_suitability_batch result after some sites changed, instead
+    of recomputing it. `violations` and the pack_sites() `columns` it came from
+    are updated in place. `changes` maps a field to (site indexes, new values);
+    categorical fields (zoning) take option keys. Only the rules reading a
+    changed field are recomputed, and only for the changed sites.
+    Returns (sites, suitable before, suitable after): the changed site indexes
+    and their pass/fail per project before and after the update.
+    """
+    if projects is None:
+        projects = list(CONSTRUCTION_RULES)
+    project_rules = [CONSTRUCTION_RULES[name] for name in projects]
+    sites = np.unique(np.concatenate([np.asarray(rows, dtype=np.intp) for rows, _ in changes.values()])) \
+        if changes else np.empty(0, dtype=np.intp)
+    before = ~violations[sites].any(axis=2)
+
+    touched = set()
+    for field, (rows, values) in changes.items():
+        if field in CATEGORICAL_FIELDS:
+            options = CATEGORICAL_FIELDS[field]
+            codes = {key: code for code, key in enumerate(options)}
+            values = [codes.get(value, len(options)) for value in values]
+        columns[field][np.asarray(rows, dtype=np.intp)] = values
+        touched.update(key for key in FIELD_RULES.get(field, ()) if RULE_SPECS[key][0] == field)
+
+    for key in touched:
+        if not any(key in rules for rules in project_rules):
+            continue
+        index = RULE_KEYS.index(key)
+        updated = np.empty((len(sites), len(project_rules)), dtype=bool)
+        _batch_rule_violations(key, columns[RULE_SPECS[key][0]][sites], project_rules, updated)
+        violations[sites, :, index] = updated
+
+    return sites, before, ~violations[sites].any(axis=2)
+
+# --- MARGINS (near-miss analysis) ---
+# How far a site is from each threshold, signed so that a negative margin is a
+# violation by that much and zero or more passes:
+#   'min' rules: value - limit        'max' rules: limit - value
+# Normalized margins divide by the rule's scale: the span of scores for
+# option-backed rules, otherwise the size of the limit (1 when it is 0).
+# Zoning ('in') rules have no distance and are left out (NaN in batch arrays).
+
+def margin_scale(rule_key, limit):
+    """The divisor that normalizes a rule's raw margin."""
+    options = RULE_SPECS[rule_key][4]
+    if options:
+        scores = [option['score'] for option in options.values()]
+        return float(max(scores) - min(scores)) or 1.0
+    return abs(float(limit)) or 1.0
+
+def compute_margins(site_details, project_name):
+    """
+    Returns {rule key: {'field', 'value', 'limit', 'margin', 'normalized'}}
+    for every numeric and score rule of a project, in report order.
+    Raises KeyError for unknown projects.
+    """
+    margins = {}
+    for rule in get_compiled_rules(project_name):
+        op = RULE_SPECS[rule.key][1]
+        if op == 'in':
+            continue
+        value = site_details[rule.field]
+        margin = value - rule.limit if op == 'min' else rule.limit - value
+        margins[rule.key] = {
+            'field': rule.field,
+            'value': value,
+            'limit': rule.limit,
+            'margin': margin,
+            'normalized': margin / margin_scale(rule.key, rule.limit),
+        }
+    return margins
+
+def compute_margins_batch(sites, projects=None):
+    """
+    Vectorized compute_margins over many sites and projects. `sites` is a list
+    of site detail dicts or the column dict from pack_sites(); `projects`
+    defaults to every project. Returns (raw, normalized) float arrays of shape
+    (sites, projects, len(RULE_KEYS)), NaN where a project has no such rule.
+    """
+    columns = sites if isinstance(sites, dict) else pack_sites(sites)
+    if projects is None:
+        projects = list(CONSTRUCTION_RULES)
+    project_rules = [CONSTRUCTION_RULES[name] for name in projects]
+    count = len(next(iter(columns.values()))) if columns else 0
+
+    raw = np.full((count, len(project_rules), len(RULE_KEYS)), np.nan)
+    scales = np.full((len(project_rules), len(RULE_KEYS)), np.nan)
+    for index, key in enumerate(RULE_KEYS):
+        field, op, *_ = RULE_SPECS[key]
+        if op == 'in' or not any(key in rules for rules in project_rules):
+            continue
+        limits = np.array([rules.get(key, np.nan) for rules in project_rules], dtype=np.float64)
+        values = columns[field][:, None]
+        raw[:, :, index] = values - limits if op == 'min' else limits - values
+        scales[:, index] = [margin_scale(key, rules[key]) if key in rules else np.nan for rules in project_rules]
+    return raw, raw / scales
+
+def near_miss_sites(sites, project_name, tolerance=0.1):
+    """
+    Finds the sites that fail project_name only narrowly: zoning passes and no
+    numeric or score rule misses by more than `tolerance` (normalized).
+    Returns [{'site': index, 'worst_margin', 'failing_rules'}], closest first.
+    """
+    columns = sites if isinstance(sites, dict) else pack_sites(sites)
+    _, normalized = compute_margins_batch(columns, [project_name])
+    normalized = normalized[:, 0, :]
+    categorical = [index for index, key in enumerate(RULE_KEYS) if RULE_SPECS[key][1] == 'in']
+    zoning_ok = ~check_suitability_batch(columns, [project_name])[:, 0, categorical].any(axis=1)
+    worst = np.where(np.isnan(normalized), np.inf, normalized).min(axis=1)
+    candidates = np.flatnonzero(zoning_ok & (worst < 0) & (worst >= -tolerance))
+    candidates = candidates[np.argsort(-worst[candidates], kind='stable')]
+    return [
+        {
+            'site': int(site),
+            'worst_margin': float(worst[site]),
+            'failing_rules': [RULE_KEYS[index] for index in np.flatnonzero(normalized[site] < 0)],
+        }
+        for site in candidates
+    ]
+
+# --- MONTE CARLO UNCERTAINTY ---
+# Field measurements are uncertain. simulate_suitability draws many scenarios
+# of the uncertain fields at once (numpy arrays, no per-sample Python loop) and
+# reports how often each project passes and which rules bind.
+# An uncertainty spec maps a numeric field to (distribution, spread):
+#   ('normal', sd)             measured value + N(0, sd)
+#   ('uniform', half_width)    anywhere within measured value +/- half_width
+#   ('triangular', half_width) same range, most likely at the measured value
+#   ('lognormal', sigma)       measured value * exp(N(0, sigma)), for skewed errors
+# Draws are clipped at 0 and integer fields (e.g. SPT N) are rounded.
+
+UNCERTAINTY_DISTRIBUTIONS = ('normal', 'uniform', 'triangular', 'lognormal')
+
+# Typical field-test scatter for the most uncertain measurements.
+DEFAULT_MEASUREMENT_UNCERTAINTY = {
+    'spt_n': ('normal', 3.0),
+    'bearing_capacity': ('lognormal', 0.15),
+    'groundwater_depth': ('normal', 2.0),
+    'percolation_rate_min_inch': ('lognormal', 0.25),
+}
+
+def sample_site_values(site_details, uncertainty, samples, rng):
+    """
+    Draws `samples` values of every field in `uncertainty` around the site's
+    measured values. Returns {field: float64 array}. Raises ValueError for
+    non-numeric fields or unknown distributions.
+    """
+    columns = {}
+    for field, (distribution, spread) in uncertainty.items():
+        if field not in SITE_NUMERIC_FIELDS:
+            raise ValueError(f"'{field}' is not a numeric site field.")
+        value = float(site_details[field])
+        if distribution == 'normal':
+            draws = rng.normal(value, spread, samples)
+        elif distribution == 'uniform':
+            draws = rng.uniform(value - spread, value + spread, samples)
+        elif distribution == 'triangular':
+            draws = rng.triangular(value - spread, value, value + spread, samples) if spread > 0 else np.full(samples, value)
+        elif distribution == 'lognormal':
+            draws = value * rng.lognormal(0.0, spread, samples)
+        else:
+            raise ValueError(f"Unknown distribution '{distribution}'. Use one of {UNCERTAINTY_DISTRIBUTIONS}.")
+        np.maximum(draws, 0.0, out=draws)
+        if SITE_NUMERIC_FIELDS[field] is int:
+            np.rint(draws, out=draws)
+        columns[field] = draws
+    return columns
+
+def simulate_suitability(site_details, uncertainty=None, projects=None, samples=100000, seed=None, chunk_size=262144):
+    """
+    Monte Carlo suitability of one site. `uncertainty` defaults to
+    DEFAULT_MEASUREMENT_UNCERTAINTY and `projects` to every project. Samples
+    are drawn `chunk_size` at a time, shared by every project.
+    Returns {project: {'pass_probability', 'samples', 'binding'}} where
+    'binding' maps each rule violated in any scenario to the share of
+    scenarios violating it, most frequent first.
+    """
+    uncertainty = DEFAULT_MEASUREMENT_UNCERTAINTY if uncertainty is None else uncertainty
+    projects = list(CONSTRUCTION_RULES) if projects is None else projects
+    rng = np.random.default_rng(seed)
+    plans = {project: get_compiled_rules(project) for project in projects}
+    passes = dict.fromkeys(projects, 0)
+    violations = {project: dict.fromkeys((rule.key for rule in rules), 0) for project, rules in plans.items()}
+
+    for start in range(0, samples, chunk_size):
+        count = min(chunk_size, samples - start)
+        columns = sample_site_values(site_details, uncertainty, count, rng)
+        for project, rules in plans.items():
+            failed = np.zeros(count, dtype=bool)
+            for rule in rules:
+                if rule.field in columns:
+                    violated = (np.less if RULE_SPECS[rule.key][1] == 'min' else np.greater)(columns[rule.field], rule.limit)
+                    violations[project][rule.key] += int(np.count_nonzero(violated))
+                    failed |= violated
+                elif rule.test(site_details[rule.field], rule.limit):
+                    violations[project][rule.key] += count
+                    failed[:] = True
+            passes[project] += count - int(np.count_nonzero(failed))
+
+    results = {}
+    for project in projects:
+        binding = sorted(((key, hits / samples) for key, hits in violations[project].items() if hits),
+                         key=lambda item: -item[1])
+        results[project] = {
+            'pass_probability': passes[project] / samples if samples else 0.0,
+            'samples': samples,
+            'binding': dict(binding),
+        }
+    return results
+
+# --- REPORT TEMPLATE ---
+# The "SITE DETAILS SUMMARY" part of the report, as (section title, lines).
+# Each line is a format string filled with the listed site_details fields in order;
+# option fields (see OPTION_LABELS) are shown as "key (description)".
+REPORT_SECTIONS = (
+    ("Legal, Survey & Site", (
+        ("- Zoning: {}", ('zoning',)),
+        ("- Slope: {}%", ('slope_pct',)),
+        ("- FSI: {}", ('fsi_available',)),
+        ("- Envelope: {} ft (Width) x {} ft (Depth)", ('envelope_width', 'envelope_depth')),
+        ("- Protected Trees: {}", ('protected_trees_count',)),
+    )),
+    ("Geotechnical (Soil Properties)", (
+        ("- SPT N-value: {}", ('spt_n',)),
+        ("- Bearing Capacity: {} kPa", ('bearing_capacity',)),
+        ("- CBR: {}%", ('cbr_pct',)),
+        ("- Plate Load Settlement: {} mm", ('plate_load_settlement_mm',)),
+        ("- Proctor Compaction: {}%", ('proctor_compaction',)),
+        ("- Plasticity Index: {}", ('plasticity_index',)),
+        ("- UCS: {} kPa", ('ucs_kpa',)),
+        ("- Soil Texture: {}", ('soil_texture_key',)),
+        ("- Cohesion: {} kPa", ('cohesion_kpa',)),
+        ("- Friction Angle: {}°", ('friction_angle_deg',)),
+        ("- Permeability: {} cm/sec", ('permeability_cm_sec',)),
+        ("- Percent Fines: {}%", ('percent_fines',)),
+        ("- Dry Density: {} kg/m³", ('core_cutter_density',)),
+        ("- Soil pH: {}", ('soil_ph',)),
+    )),
+    ("Geotechnical (Water & Contaminants)", (
+        ("- Groundwater Depth: {} ft", ('groundwater_depth',)),
+        ("- Percolation Rate: {} min/inch", ('percolation_rate_min_inch',)),
+        ("- Soil Resistivity: {} Ohm-m", ('soil_resistivity_ohm_m',)),
+        ("- Contaminants: {}", ('contaminant_key',)),
+        ("- Water Quality: {}", ('water_quality_key',)),
+    )),
+    ("Environmental & Risk", (
+        ("- EIA: {}", ('eia_key',)),
+        ("- Phase I ESA: {}", ('phase1_key',)),
+        ("- Phase II ESA: {}", ('phase2_key',)),
+        ("- Biodiversity Impact: {}", ('biodiversity_key',)),
+        ("- Wetland %: {}%", ('wetland_percentage',)),
+        ("- Flood Risk: {}", ('flood_key',)),
+        ("- Drainage: {}", ('drainage_key',)),
+        ("- Seismic: {}", ('seismic_key',)),
+        ("- Air Quality (AQI): {}", ('air_quality_aqi',)),
+        ("- Noise Level (dBA): {}", ('noise_level_dba',)),
+        ("- Hazardous Site Proximity: {} ft", ('hazardous_site_proximity_ft',)),
+    )),
+    ("Infrastructure & Community", (
+        ("- Utilities: {}", ('utility_key',)),
+        ("- Population Density: {} people/km²", ('pop_density_per_sq_km',)),
+        ("- Traffic Impact: {}", ('traffic_key',)),
+    )),
+)
+
+# Option field -> {option key: "key (description)"}, formatted once at import.
+OPTION_LABELS = dict(
+    {'zoning': {key: format_option(key, ZONING_OPTIONS) for key in ZONING_OPTIONS}},
+    **{field: {key: format_option(key, options) for key in options}
+       for field, (_, options) in SITE_OPTION_FIELDS.items()}
+)
+
+def _compile_report_summary():
+    # The whole summary becomes one format string plus the fields to fill it with.
+    parts = ["=========================================\n--- SITE DETAILS SUMMARY ---\n"]
+    fields = []
+    for title, lines in REPORT_SECTIONS:
+        parts.append(f"\n{title}:\n")
+        for line, line_fields in lines:
+            parts.append(line + "\n")
+            fields.extend(line_fields)
+    parts.append("\n")
+    return ''.join(parts), tuple((field, OPTION_LABELS.get(field)) for field in fields)
+
+REPORT_SUMMARY_TEMPLATE, REPORT_SUMMARY_FIELDS = _compile_report_summary()
+
+def write_report(handle, site_details, desired_project, project_issues, suitable_projects=None):
+    """
+    Writes the report to any object with a write() method (an open file,
+    io.StringIO, ...). See generate_report_text for the arguments.
     """
     today = datetime.date.today().isoformat()
-    report = f"CONSTRUCTION SUITABILITY ANALYSIS REPORT\n"
-    report += f"Report Date: {today}\n"
-    report += f"Project Site: {site_details.get('project_heading', 'N/A')}\n"
-    report += f"=========================================\n\n"
-    
-    report += f"--- ANALYSIS FOR: {desired_project} ---\n"
-    
+    write = handle.write
+    write(
+        "CONSTRUCTION SUITABILITY ANALYSIS REPORT\n"
+        f"Report Date: {today}\n"
+        f"Project Site: {site_details.get('project_heading', 'N/A')}\n"
+        "=========================================\n\n"
+        f"--- ANALYSIS FOR: {desired_project} ---\n"
+    )
+
     if not project_issues:
-        report += f"SUCCESS: Your project '{desired_project}' is suitable for this site!\n\n"
+        write(f"SUCCESS: Your project '{desired_project}' is suitable for this site!\n\n")
     else:
-        report += f"FAILURE: Your project '{desired_project}' is NOT suitable for this site.\n"
-        report += "Issues Found:\n"
-        for issue in project_issues:
-            report += f"- {issue.replace('**', '')}\n" # Remove markdown
-        report += "\n"
-
-    # "Other Suitable Projects" section has been removed.
-            
-    report += f"=========================================\n"
-    report += "--- SITE DETAILS SUMMARY ---\n"
-    
-    report += f"\nLegal, Survey & Site:\n"
-    report += f"- Zoning: {site_details['zoning']} ({ZONING_OPTIONS[site_details['zoning']]['desc']})\n"
-    report += f"- Slope: {site_details['slope_pct']}%\n"
-    report += f"- FSI: {site_details['fsi_available']}\n"
-    report += f"- Envelope: {site_details['envelope_width']} ft (Width) x {site_details['envelope_depth']} ft (Depth)\n"
-    report += f"- Protected Trees: {site_details['protected_trees_count']}\n"
-
-    report += f"\nGeotechnical (Soil Properties):\n"
-    report += f"- SPT N-value: {site_details['spt_n']}\n"
-    report += f"- Bearing Capacity: {site_details['bearing_capacity']} kPa\n"
-    report += f"- CBR: {site_details['cbr_pct']}%\n"
-    report += f"- Plate Load Settlement: {site_details['plate_load_settlement_mm']} mm\n"
-    report += f"- Proctor Compaction: {site_details['proctor_compaction']}%\n"
-    report += f"- Plasticity Index: {site_details['plasticity_index']}\n"
-    report += f"- UCS: {site_details['ucs_kpa']} kPa\n"
-    report += f"- Soil Texture: {site_details['soil_texture_key']} ({SOIL_TEXTURE_OPTIONS[site_details['soil_texture_key']]['desc']})\n"
-    report += f"- Cohesion: {site_details['cohesion_kpa']} kPa\n"
-    report += f"- Friction Angle: {site_details['friction_angle_deg']}°\n"
-    report += f"- Permeability: {site_details['permeability_cm_sec']} cm/sec\n"
-    report += f"- Percent Fines: {site_details['percent_fines']}%\n"
-    report += f"- Dry Density: {site_details['core_cutter_density']} kg/m³\n"
-    report += f"- Soil pH: {site_details['soil_ph']}\n"
-
-    report += f"\nGeotechnical (Water & Contaminants):\n"
-    report += f"- Groundwater Depth: {site_details['groundwater_depth']} ft\n"
-    report += f"- Percolation Rate: {site_details['percolation_rate_min_inch']} min/inch\n"
-    report += f"- Soil Resistivity: {site_details['soil_resistivity_ohm_m']} Ohm-m\n"
-    report += f"- Contaminants: {site_details['contaminant_key']} ({SOIL_CONTAMINANT_OPTIONS[site_details['contaminant_key']]['desc']})\n"
-    report += f"- Water Quality: {site_details['water_quality_key']} ({WATER_QUALITY_OPTIONS[site_details['water_quality_key']]['desc']})\n"
-    
-    report += f"\nEnvironmental & Risk:\n"
-    report += f"- EIA: {site_details['eia_key']} ({EIA_STATUS_OPTIONS[site_details['eia_key']]['desc']})\n"
-    report += f"- Phase I ESA: {site_details['phase1_key']} ({PHASE1_ESA_OPTIONS[site_details['phase1_key']]['desc']})\n"
-    report += f"- Phase II ESA: {site_details['phase2_key']} ({PHASE2_ESA_OPTIONS[site_details['phase2_key']]['desc']})\n"
-    report += f"- Biodiversity Impact: {site_details['biodiversity_key']} ({BIODIVERSITY_IMPACT_OPTIONS[site_details['biodiversity_key']]['desc']})\n"
-    report += f"- Wetland %: {site_details['wetland_percentage']}%\n"
-    report += f"- Flood Risk: {site_details['flood_key']} ({FLOOD_RISK_OPTIONS[site_details['flood_key']]['desc']})\n"
-    report += f"- Drainage: {site_details['drainage_key']} ({DRAINAGE_OPTIONS[site_details['drainage_key']]['desc']})\n"
-    report += f"- Seismic: {site_details['seismic_key']} ({SEISMIC_ZONE_OPTIONS[site_details['seismic_key']]['desc']})\n"
-    report += f"- Air Quality (AQI): {site_details['air_quality_aqi']}\n"
-    report += f"- Noise Level (dBA): {site_details['noise_level_dba']}\n"
-    report += f"- Hazardous Site Proximity: {site_details['hazardous_site_proximity_ft']} ft\n"
-    
-    report += f"\nInfrastructure & Community:\n"
-    report += f"- Utilities: {site_details['utility_key']} ({UTILITY_OPTIONS[site_details['utility_key']]['desc']})\n"
-    report += f"- Population Density: {site_details['pop_density_per_sq_km']} people/km²\n"
-    report += f"- Traffic Impact: {site_details['traffic_key']} ({TRAFFIC_IMPACT_OPTIONS[site_details['traffic_key']]['desc']})\n\n"
-    
-    return report
+        write(f"FAILURE: Your project '{desired_project}' is NOT suitable for this site.\nIssues Found:\n")
+        write(''.join([f"- {issue.replace('**', '')}\n" for issue in project_issues])) # Remove markdown
+        write("\n")
+
+    if suitable_projects is not None:
+        other_projects = [project for project in suitable_projects if project != desired_project]
+        write("--- OTHER SUITABLE PROJECTS ---\n")
+        if other_projects:
+            write(''.join([f"- {project}\n" for project in other_projects]))
+        else:
+            write("No other project types in the database are suitable for this site.\n")
+        write("\n")
+
+    write(REPORT_SUMMARY_TEMPLATE.format(*[
+        labels[site_details[field]] if labels else site_details[field]
+        for field, labels in REPORT_SUMMARY_FIELDS
+    ]))
+
+def generate_report_text(site_details, desired_project, project_issues, suitable_projects=None):
+    """
+    Generates a text string for the download button.
+    `suitable_projects` (from find_suitable_projects) adds the
+    "Other Suitable Projects" section when it is given.
+    """
+    buffer = io.StringIO()
+    write_report(buffer, site_details, desired_project, project_issues, suitable_projects)
+    return buffer.getvalue()
+
+# --- SITE SUMMARY (report tab) ---
+# The "Site Details Summary" blocks of the report tab, one st.json dict per
+# section: (title, ((label, format or None for the raw value, fields), ...)).
+SITE_SUMMARY_SECTIONS = (
+    ("Legal, Survey & Site", (
+        ('Zoning', "{}", ('zoning',)),
+        ('Slope', "{}%", ('slope_pct',)),
+        ('FSI', None, ('fsi_available',)),
+        ('Envelope', "{} ft (Width) x {} ft (Depth)", ('envelope_width', 'envelope_depth')),
+        ('Protected Trees', None, ('protected_trees_count',)),
+    )),
+    ("Geotechnical (Soil Properties)", (
+        ('SPT N-value', None, ('spt_n',)),
+        ('Bearing Capacity', "{} kPa", ('bearing_capacity',)),
+        ('CBR', "{}%", ('cbr_pct',)),
+        ('Plate Load Settlement', "{} mm", ('plate_load_settlement_mm',)),
+        ('Proctor Compaction', "{}%", ('proctor_compaction',)),
+        ('Plasticity Index', None, ('plasticity_index',)),
+        ('UCS', "{} kPa", ('ucs_kpa',)),
+        ('Soil Texture', "{}", ('soil_texture_key',)),
+        ('Cohesion', "{} kPa", ('cohesion_kpa',)),
+        ('Friction Angle', "{}°", ('friction_angle_deg',)),
+        ('Permeability', "{} cm/sec", ('permeability_cm_sec',)),
+        ('Percent Fines', "{}%", ('percent_fines',)),
+        ('Dry Density', "{} kg/m³", ('core_cutter_density',)),
+        ('Soil pH', None, ('soil_ph',)),
+    )),
+    ("Geotechnical (Water & Contaminants)", (
+        ('Groundwater Depth', "{} ft", ('groundwater_depth',)),
+        ('Percolation Rate', "{} min/inch", ('percolation_rate_min_inch',)),
+        ('Soil Resistivity', "{} Ohm-m", ('soil_resistivity_ohm_m',)),
+        ('Contaminants', "{}", ('contaminant_key',)),
+        ('Water Quality', "{}", ('water_quality_key',)),
+    )),
+    ("Environmental & Risk", (
+        ('EIA', "{}", ('eia_key',)),
+        ('Phase I ESA', "{}", ('phase1_key',)),
+        ('Phase II ESA', "{}", ('phase2_key',)),
+        ('Biodiversity Impact', "{}", ('biodiversity_key',)),
+        ('Wetland %', "{}%", ('wetland_percentage',)),
+        ('Flood Risk', "{}", ('flood_key',)),
+        ('Drainage', "{}", ('drainage_key',)),
+        ('Seismic', "{}", ('seismic_key',)),
+        ('Air Quality (AQI)', None, ('air_quality_aqi',)),
+        ('Noise Level (dBA)', None, ('noise_level_dba',)),
+        ('Hazardous Site Proximity', "{} ft", ('hazardous_site_proximity_ft',)),
+    )),
+    ("Infrastructure & Community", (
+        ('Utilities', "{}", ('utility_key',)),
+        ('Population Density', "{} people/km²", ('pop_density_per_sq_km',)),
+        ('Traffic Impact', "{}", ('traffic_key',)),
+    )),
+)
+
+def format_site_summary(site_details):
+    """
+    Returns [(section title, {label: value}), ...] for the report tab's
+    "Site Details Summary". Option fields are shown as "key (description)".
+    """
+    summary = []
+    for title, entries in SITE_SUMMARY_SECTIONS:
+        values = {}
+        for label, template, fields in entries:
+            parts = [OPTION_LABELS[field][site_details[field]] if field in OPTION_LABELS else site_details[field]
+                     for field in fields]
+            values[label] = parts[0] if template is None else template.format(*parts)
+        summary.append((title, values))
+    return summary
+
+# --- BULK REPORTS ---
+
+class ReportDirectory:
+    """Writes reports as files in a directory; the same writestr/close API as zipfile.ZipFile."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def writestr(self, name, text):
+        with open(os.path.join(self.path, name), 'w', encoding='utf-8') as handle:
+            handle.write(text)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def open_report_bundle(path):
+    """Opens a .zip file (deflated) or a directory to write many reports into."""
+    if path.lower().endswith('.zip'):
+        return zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+    return ReportDirectory(path)
+
+def report_file_name(number, desired_project):
+    """File name for one report in a bundle, e.g. '0000042_Farm_Barn.txt'."""
+    slug = ''.join(char if char.isalnum() else '_' for char in desired_project).strip('_')
+    return f"{number:07d}_{slug}.txt"
+
+def write_report_bundle(path, sites, desired_project):
+    """
+    Analyzes every site for desired_project and writes one report per site
+    into a .zip file or directory at `path`. Returns the number of reports.
+    """
+    count = 0
+    with open_report_bundle(path) as bundle:
+        for number, site_details in enumerate(sites, start=1):
+            issues = check_suitability(site_details, desired_project)
+            report = generate_report_text(site_details, desired_project, issues, find_suitable_projects(site_details))
+            bundle.writestr(report_file_name(number, desired_project), report)
+            count += 1
+    return count
 
 def format_rules_for_display(project_name):
     """
@@ -211,6 +1089,14 @@ def format_rules_for_display(project_name):
         return {"Error": "Project not found."}
     
     rules = CONSTRUCTION_RULES[project_name]
+
+    def score_label(rule_key):
+        # e.g. "Score 1 (ML/CL)", naming the option the threshold score belongs to
+        if rule_key not in rules:
+            return "Score N/A"
+        options = RULE_SPECS[rule_key][4]
+        return f"Score {rules[rule_key]} ({get_key_from_score(options, rules[rule_key])})"
+
     formatted = {
         "Project": project_name,
         "Legal & Survey": {
@@ -228,7 +1114,7 @@ def format_rules_for_display(project_name):
             "Min Proctor Compaction": f"{rules.get('min_proctor_compaction_pct', 'N/A')}%",
             "Max Plasticity Index": rules.get('max_plasticity_index', 'N/A'),
             "Min UCS": f"{rules.get('min_ucs_kpa', 'N/A')} kPa",
-            "Min Soil Texture": f"Score {rules.get('min_soil_texture_score', 'N/A')}",
+            "Min Soil Texture": score_label('min_soil_texture_score'),
             "Min Cohesion": f"{rules.get('min_cohesion_kpa', 'N/A')} kPa",
             "Min Friction Angle": f"{rules.get('min_friction_angle_deg', 'N/A')}°",
             "Soil pH Range": f"{rules.get('min_soil_ph', 'N/A')} - {rules.get('max_soil_ph', 'N/A')}"
@@ -237,26 +1123,26 @@ def format_rules_for_display(project_name):
             "Min Groundwater Depth": f"{rules.get('min_groundwater_depth_ft', 'N/L/A')} ft",
             "Max Percolation Rate": f"{rules.get('max_percolation_rate_min_inch', 'N/A')} min/inch",
             "Min Soil Resistivity": f"{rules.get('min_soil_resistivity_ohm_m', 'N/A')} Ohm-m",
-            "Max Contaminant Level": f"Score {rules.get('max_contaminant_score', 'N/A')}",
-            "Max Water Aggressiveness": f"Score {rules.get('max_water_quality_score', 'N/A')}"
+            "Max Contaminant Level": score_label('max_contaminant_score'),
+            "Max Water Aggressiveness": score_label('max_water_quality_score')
         },
         "Environmental & Risk": {
-            "Min EIA Status": f"Score {rules.get('min_eia_status_score', 'N/A')}",
-            "Min Phase I ESA": f"Score {rules.get('min_phase1_score', 'N/A')}",
-            "Min Phase II ESA": f"Score {rules.get('min_phase2_score', 'N/A')}",
-            "Max Biodiversity Impact": f"Score {rules.get('max_biodiversity_impact_score', 'N/A')}",
+            "Min EIA Status": score_label('min_eia_status_score'),
+            "Min Phase I ESA": score_label('min_phase1_score'),
+            "Min Phase II ESA": score_label('min_phase2_score'),
+            "Max Biodiversity Impact": score_label('max_biodiversity_impact_score'),
             "Max Wetland %": f"{rules.get('max_wetland_percentage', 'N/A')}%",
-            "Max Flood Risk": f"Score {rules.get('max_flood_risk_score', 'N/A')}",
-            "Max Drainage Issues": f"Score {rules.get('max_drainage_score', 'N/A')}",
-            "Max Seismic Zone": f"Score {rules.get('max_seismic_zone_score', 'N/A')}",
+            "Max Flood Risk": score_label('max_flood_risk_score'),
+            "Max Drainage Issues": score_label('max_drainage_score'),
+            "Max Seismic Zone": score_label('max_seismic_zone_score'),
             "Max Air Quality (AQI)": rules.get('max_air_quality_aqi', 'N/A'),
             "Max Noise Level (dBA)": rules.get('max_noise_level_dba', 'N/A'),
             "Min Hazard Proximity": f"{rules.get('min_hazardous_site_proximity_ft', 'N/A')} ft"
         },
         "Infrastructure & Community": {
-            "Min Utility Level": f"Score {rules.get('min_utility_level', 'N/A')}",
+            "Min Utility Level": score_label('min_utility_level'),
             "Population Density": f"{rules.get('min_pop_density_per_sq_km', 'N/A')} - {rules.get('max_pop_density_per_sq_km', 'N/A')}",
-            "Max Traffic Impact": f"Score {rules.get('max_traffic_impact_score', 'N/A')}"
+            "Max Traffic Impact": score_label('max_traffic_impact_score')
         }
     }
     # Clean up 'N/A - N/A' or 'N/A' scores
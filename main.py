@@ -1,24 +1,29 @@
 import streamlit as st
 import state
 import ui
+from rule_files import install_from_environment
 
 # --- 1. SET UP PAGE ---
 st.set_page_config(layout="wide")
 st.title("🏗️ Technical Construction Suitability Advisor")
 
-# --- 2. INITIALIZE STATE ---
+# --- 2. LOAD RULE FILES (optional: set ADVISOR_RULES) ---
+install_from_environment()
+
+# --- 3. INITIALIZE STATE ---
 # This is the most important step. It runs once and sets up 
 # st.session_state, which prevents the form from resetting.
 state.initialize_state()
 
-# --- 3. CREATE TABS ---
-tab1, tab2, tab3 = st.tabs([
+# --- 4. CREATE TABS ---
+tab1, tab2, tab3, tab4 = st.tabs([
     "Enter Site Details (Measure)", 
     "View Analysis Report", 
-    "Check Project Requirements"
+    "Check Project Requirements",
+    "Analysis History"
 ])
 
-# --- 4. RENDER TABS ---
+# --- 5. RENDER TABS ---
 with tab1:
     ui.render_input_tab()
 
@@ -26,4 +31,12 @@ with tab2:
     ui.render_report_tab()
     
 with tab3:
-    ui.render_requirements_tab()
\ No newline at end of file
+    ui.render_requirements_tab()
+
+with tab4:
+    ui.render_history_tab()
+
+# --- 6. DIAGNOSTICS (hidden: open the app with ?diagnostics=1) ---
+if st.query_params.get("diagnostics") == "1":
+    with st.sidebar:
+        ui.render_diagnostics_panel()
@@ -0,0 +1,112 @@
+import numpy as np
+from data import *
+from logic import CATEGORICAL_FIELDS, RULE_SPECS, get_compiled_rules, is_suitable, pack_sites
+
+# --- SITE PORTFOLIO INDEX ("Which stored sites fit project X?") ---
+# The reverse of the Requirements tab. Every field read by RULE_SPECS gets a
+# sorted index (values in ascending order plus the site ids in that order), so
+# each rule of a project selects a contiguous slice instead of a full scan.
+# A query starts from the most selective rule's slice and filters only those
+# candidates through the remaining rules.
+#
+# New sites are appended to a small pending list that queries check directly
+# with is_suitable(). Once it reaches `merge_threshold` sites it is merged into
+# the sorted indexes in one O(N) pass, so adding sites never re-sorts everything.
+
+def build_portfolio(sites=(), merge_threshold=4096):
+    """
+    Creates a portfolio index over site detail dicts.
+    Site ids are positions in portfolio['sites'], in the order sites were added.
+    """
+    portfolio = {
+        'sites': [],
+        'columns': {},  # field -> values of the indexed sites, by site id
+        'sorted': {},   # field -> the same values in ascending order
+        'order': {},    # field -> site ids in that ascending order
+        'indexed': 0,   # sites [0, indexed) are in the sorted indexes
+        'merge_threshold': merge_threshold,
+    }
+    add_sites(portfolio, sites)
+    flush_portfolio(portfolio)
+    return portfolio
+
+def add_sites(portfolio, sites):
+    """Adds sites to the portfolio. Returns the ids they were given."""
+    first = len(portfolio['sites'])
+    portfolio['sites'].extend(sites)
+    if len(portfolio['sites']) - portfolio['indexed'] >= portfolio['merge_threshold']:
+        flush_portfolio(portfolio)
+    return range(first, len(portfolio['sites']))
+
+def flush_portfolio(portfolio):
+    """Merges every pending site into the sorted indexes."""
+    start = portfolio['indexed']
+    pending = portfolio['sites'][start:]
+    if not pending and portfolio['columns']:
+        return
+    new_columns = pack_sites(pending)
+    for field, values in new_columns.items():
+        new_order = np.argsort(values, kind='stable')
+        new_sorted = values[new_order]
+        if field not in portfolio['columns']:
+            portfolio['columns'][field] = values
+            portfolio['sorted'][field] = new_sorted
+            portfolio['order'][field] = new_order
+            continue
+        # Insert the new (already sorted) values after any equal old ones.
+        positions = np.searchsorted(portfolio['sorted'][field], new_sorted, side='right')
+        portfolio['columns'][field] = np.concatenate([portfolio['columns'][field], values])
+        portfolio['sorted'][field] = np.insert(portfolio['sorted'][field], positions, new_sorted)
+        portfolio['order'][field] = np.insert(portfolio['order'][field], positions, new_order + start)
+    portfolio['indexed'] = len(portfolio['sites'])
+
+def _rule_slice(portfolio, field, op, limit):
+    # Site ids (unsorted) passing one rule, read straight from the sorted index.
+    values = portfolio['sorted'][field]
+    order = portfolio['order'][field]
+    if op == 'in':
+        options = list(CATEGORICAL_FIELDS[field])
+        parts = []
+        for code, option in enumerate(options):
+            if option in limit:
+                parts.append(order[np.searchsorted(values, code, 'left'):np.searchsorted(values, code, 'right')])
+        return np.concatenate(parts) if parts else order[:0]
+    if op == 'min':
+        # NaN sorts last and, like check_suitability, never counts as a violation.
+        return order[np.searchsorted(values, limit, 'left'):]
+    upper = np.searchsorted(values, limit, 'right')
+    nan_start = np.searchsorted(values, np.nan, 'left')
+    return np.concatenate([order[:upper], order[nan_start:]])
+
+def _rule_filter(portfolio, candidates, field, op, limit):
+    values = portfolio['columns'][field][candidates]
+    if op == 'in':
+        allowed = [code for code, option in enumerate(CATEGORICAL_FIELDS[field]) if option in limit]
+        return candidates[np.isin(values, allowed)]
+    if op == 'min':
+        return candidates[~(values < limit)]
+    return candidates[~(values > limit)]
+
+def query_sites(portfolio, project_name):
+    """
+    Returns the sorted ids of every stored site that passes project_name,
+    matching check_suitability exactly. Raises KeyError for unknown projects.
+    Use portfolio['sites'][site_id] to get a site back.
+    """
+    plan = [(rule.field, RULE_SPECS[rule.key][1], rule.limit) for rule in get_compiled_rules(project_name)]
+
+    indexed = portfolio['indexed']
+    if not plan or indexed == 0:
+        candidates = np.arange(indexed)
+    else:
+        # Start from the rule that lets the fewest sites through.
+        slices = [_rule_slice(portfolio, *step) for step in plan]
+        first = min(range(len(plan)), key=lambda position: len(slices[position]))
+        candidates = slices[first]
+        for position, step in enumerate(plan):
+            if position != first and len(candidates):
+                candidates = _rule_filter(portfolio, candidates, *step)
+
+    pending = [site_id for site_id in range(indexed, len(portfolio['sites']))
+               if is_suitable(portfolio['sites'][site_id], project_name)]
+    return np.concatenate([np.sort(candidates), np.array(pending, dtype=np.intp)])
@@ -0,0 +1,386 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import numpy as np
+from data import *
+from hazards import row_coordinates
+
+# --- RASTER LAYERS ---
+# Gridded maps (flood zones, seismic zones, AQI, noise, ...) that fill
+# site_details fields from site coordinates instead of the form's dropdowns.
+# A layer directory holds one pair of files per layer:
+#
+#   <layers>/<name>.json   header: the field it fills, grid size and placement,
+#                          dtype, nodata value and how cell values map to options
+#   <layers>/<name>.bin    the cells, row by row from the north-west corner
+#
+# The grid is a regular latitude/longitude grid (WGS84 degrees). Cells are
+# memory-mapped and a batch of sites reads only the pages its cells are on, in
+# file order, so country-scale rasters never have to fit in RAM.
+#
+# A layer for an option field (e.g. flood_key) maps cell values to option
+# keys: through its "classes" table ({"1": "Zone X (Low)", ...}) or, without
+# one, by taking the cell value as the option's score. A zoning layer works the
+# same way, its default being the position in ZONING_OPTIONS. A layer for a numeric
+# field (e.g. air_quality_aqi) is used as is. Nodata cells, unmapped values
+# and sites outside the grid keep the value the site already has.
+#
+# Usage:
+#   python rasters.py import flood.asc layers/flood.json --field flood_key
+#   python rasters.py sample layers 40.7128 -74.0060
+#   python batch.py parcels.csv -o results.jsonl --layers layers
+#   ADVISOR_LAYERS=layers streamlit run main.py
+
+LAYER_VERSION = 1
+SAMPLE_CHUNK_SIZE = 65536
+RULE_TABLE_SPAN = 65536 # integer cell values spanning at most this use a lookup table
+
+_REQUIRED_HEADER = ('field', 'dtype', 'rows', 'cols', 'west', 'north', 'cell_lon', 'cell_lat')
+
+def _option_table(field):
+    # The options table of an option key field (or zoning), None for a numeric field.
+    if field == 'zoning':
+        return ZONING_OPTIONS
+    return SITE_OPTION_FIELDS[field][1] if field in SITE_OPTION_FIELDS else None
+
+def _default_classes(field):
+    # Cell value -> option key without a "classes" table: the option's score,
+    # or for zoning its position in ZONING_OPTIONS.
+    if field == 'zoning':
+        return {float(code): key for code, key in enumerate(ZONING_OPTIONS)}
+    return {float(option['score']): key for key, option in _option_table(field).items()}
+
+def _check_header(header, source):
+    missing = [key for key in _REQUIRED_HEADER if key not in header]
+    if missing:
+        raise ValueError(f"{source}: header is missing {missing}.")
+    field = header['field']
+    if _option_table(field) is None and field not in SITE_NUMERIC_FIELDS:
+        raise ValueError(f"{source}: '{field}' is not a numeric, option or zoning field of site_details.")
+    if header['rows'] < 1 or header['cols'] < 1 or header['cell_lon'] <= 0 or header['cell_lat'] <= 0:
+        raise ValueError(f"{source}: rows, cols and cell sizes must be positive.")
+    options = _option_table(field)
+    classes = header.get('classes')
+    if classes is not None:
+        if options is None:
+            raise ValueError(f"{source}: 'classes' only applies to option fields.")
+        unknown = sorted(set(classes.values()) - set(options))
+        if unknown:
+            raise ValueError(f"{source}: unknown {field} keys {unknown} in 'classes'.")
+
+class RasterLayer:
+    """One memory-mapped layer (see the module comment). Open with open_layer()."""
+
+    def __init__(self, header, path, header_path=None):
+        self.header = header
+        self.path = path
+        self.header_path = header_path
+        self.field = header['field']
+        self.rows, self.cols = header['rows'], header['cols']
+        self.nodata = header.get('nodata')
+        self._cells = np.memmap(path, dtype=header['dtype'], mode='r', shape=(self.rows * self.cols,))
+        # cell value -> option key (None for numeric fields, whose cells are the values)
+        if _option_table(self.field) is None:
+            self._convert = None
+        elif header.get('classes') is not None:
+            self._convert = {float(value): key for value, key in header['classes'].items()}
+        else:
+            self._convert = _default_classes(self.field)
+
+    @property
+    def rule_field(self):
+        """The field the rules compare for this layer (an option layer's score field)."""
+        return SITE_OPTION_FIELDS[self.field][0] if self.field in SITE_OPTION_FIELDS else self.field
+
+    def same_grid(self, other):
+        """True when `other` (a layer) has exactly this layer's cells."""
+        keys = ('rows', 'cols', 'west', 'north', 'cell_lon', 'cell_lat')
+        return all(self.header[key] == other.header[key] for key in keys)
+
+    def cell_centres(self, row, col, rows, cols):
+        """Latitudes (per row) and longitudes (per column) of a window's cell centres."""
+        header = self.header
+        latitudes = header['north'] - (np.arange(row, row + rows) + 0.5) * header['cell_lat']
+        longitudes = header['west'] + (np.arange(col, col + cols) + 0.5) * header['cell_lon']
+        return latitudes, longitudes
+
+    def cell_indexes(self, latitudes, longitudes):
+        """Flat cell index for each coordinate, -1 outside the grid."""
+        header = self.header
+        row = np.floor((header['north'] - np.asarray(latitudes, dtype=np.float64)) / header['cell_lat'])
+        col = np.floor((np.asarray(longitudes, dtype=np.float64) - header['west']) / header['cell_lon'])
+        inside = (row >= 0) & (row < self.rows) & (col >= 0) & (col < self.cols)
+        return np.where(inside, row * self.cols + col, -1).astype(np.int64)
+
+    def sample(self, latitudes, longitudes):
+        """
+        Raw cell values (float64) for arrays of coordinates, and a mask of the
+        ones that hold data (inside the grid, not nodata, not NaN).
+        """
+        indexes = self.cell_indexes(latitudes, longitudes)
+        values = np.full(len(indexes), np.nan)
+        inside = np.flatnonzero(indexes >= 0)
+        # Read the cells in file order: each page is touched once, front to back.
+        in_file_order = inside[np.argsort(indexes[inside], kind='stable')]
+        values[in_file_order] = self._cells[indexes[in_file_order]]
+        return values, self._has_data(values)
+
+    def sample_grid(self, latitudes, longitudes):
+        """
+        sample() at every point of a regular grid: each latitude (a row) with
+        each longitude (a column), flattened row by row. Each axis is located
+        once, and north-to-south rows of west-to-east points read in file order.
+        """
+        header = self.header
+        row = np.floor((header['north'] - np.asarray(latitudes, dtype=np.float64)) / header['cell_lat'])
+        col = np.floor((np.asarray(longitudes, dtype=np.float64) - header['west']) / header['cell_lon'])
+        row_inside = (row >= 0) & (row < self.rows)
+        col_inside = (col >= 0) & (col < self.cols)
+        indexes = np.where(row_inside, row, 0).astype(np.int64)[:, None] * self.cols + \
+                  np.where(col_inside, col, 0).astype(np.int64)[None, :]
+        values = np.asarray(self._cells[indexes.ravel()], dtype=np.float64)
+        values[~(row_inside[:, None] & col_inside[None, :]).ravel()] = np.nan
+        return values, self._has_data(values)
+
+    def read_window(self, row, col, rows, cols):
+        """
+        Raw cell values (float64) of a rows x cols window, flattened row by
+        row, and the mask of the ones that hold data. Full-width windows are
+        one contiguous read.
+        """
+        grid = self._cells.reshape(self.rows, self.cols)
+        values = np.asarray(grid[row:row + rows, col:col + cols], dtype=np.float64).ravel()
+        return values, self._has_data(values)
+
+    def _has_data(self, values):
+        valid = ~np.isnan(values)
+        if self.nodata is not None:
+            valid &= values != self.nodata
+        return valid
+
+    def rule_column(self, values, valid):
+        """
+        Converts raw cell values (from sample or read_window) into the column
+        the rules compare, laid out like logic.pack_sites: scores for option
+        fields, ZONING_OPTIONS codes for zoning, numbers otherwise. Returns
+        (rule field, column, valid), with unmapped cell values no longer valid.
+        """
+        if self._convert is None:
+            return self.field, values, valid
+        cells, targets, missing = self._rule_lookup()
+        if np.issubdtype(self._cells.dtype, np.integer) and cells[-1] - cells[0] <= RULE_TABLE_SPAN:
+            # Integer cells: look the values up in a table indexed by value
+            low = int(cells[0])
+            table = np.full(int(cells[-1]) - low + 1, missing, dtype=targets.dtype)
+            known = np.zeros(len(table), dtype=bool)
+            table[cells.astype(np.intp) - low] = targets
+            known[cells.astype(np.intp) - low] = True
+            offsets = np.where(valid, values - low, -1)
+            mapped = (offsets >= 0) & (offsets < len(table))
+            positions = np.where(mapped, offsets, 0).astype(np.intp)
+            mapped &= known[positions]
+        else:
+            positions = np.minimum(np.searchsorted(cells, values), len(cells) - 1)
+            mapped = valid & (cells[positions] == values)
+            table = targets
+        return self.rule_field, np.where(mapped, table[positions], missing), mapped
+
+    def _rule_lookup(self):
+        # Sorted cell values, the rule value of each (score or zoning code) and
+        # the column value for unmapped cells.
+        options = _option_table(self.field)
+        cells = np.array(sorted(self._convert), dtype=np.float64)
+        if self.field == 'zoning':
+            codes = {key: code for code, key in enumerate(options)}
+            return cells, np.array([codes[self._convert[cell]] for cell in cells], dtype=np.intp), len(options)
+        targets = np.array([options[self._convert[cell]]['score'] for cell in cells], dtype=np.float64)
+        return cells, targets, np.nan
+
+    def field_values(self, latitudes, longitudes):
+        """
+        Values for the layer's site_details field (option keys or numbers, as
+        a list) and a mask of the sites that got one.
+        """
+        values, valid = self.sample(latitudes, longitudes)
+        if self._convert is not None:
+            keys = [self._convert.get(value) if ok else None for value, ok in zip(values.tolist(), valid.tolist())]
+            return keys, np.array([key is not None for key in keys], dtype=bool)
+        if SITE_NUMERIC_FIELDS[self.field] is int:
+            return [int(round(value)) if ok else None for value, ok in zip(values.tolist(), valid.tolist())], valid
+        return [value if ok else None for value, ok in zip(values.tolist(), valid.tolist())], valid
+
+def open_layer(header_path):
+    """Opens the layer described by a .json header (its .bin is next to it)."""
+    with open(header_path, encoding='utf-8') as handle:
+        header = json.load(handle)
+    if header.get('version') != LAYER_VERSION:
+        raise ValueError(f"{header_path}: unsupported layer version {header.get('version')}.")
+    _check_header(header, header_path)
+    data_path = os.path.splitext(header_path)[0] + '.bin'
+    expected = header['rows'] * header['cols'] * np.dtype(header['dtype']).itemsize
+    if os.path.getsize(data_path) != expected:
+        raise ValueError(f"{data_path}: expected {expected} bytes for a {header['rows']} x {header['cols']} grid.")
+    return RasterLayer(header, data_path, header_path)
+
+def open_layers(path):
+    """Opens every layer in a directory (or one .json header). Returns [RasterLayer] in name order."""
+    if os.path.isdir(path):
+        return [open_layer(os.path.join(path, name)) for name in sorted(os.listdir(path)) if name.endswith('.json')]
+    return [open_layer(path)]
+
+# --- WRITING LAYERS ---
+
+def _write_header(header_path, header):
+    header = dict(header, version=LAYER_VERSION)
+    _check_header(header, header_path)
+    temporary = header_path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as handle:
+        json.dump(header, handle, indent=2)
+    os.replace(temporary, header_path)
+
+def write_layer(header_path, field, grid, west, north, cell_lon, cell_lat=None, nodata=None, classes=None):
+    """
+    Saves a 2-D array (row 0 = northernmost) as a layer: `header_path` (.json)
+    plus the .bin next to it. `grid` may itself be a memmap.
+    """
+    grid = np.asarray(grid)
+    if grid.ndim != 2:
+        raise ValueError("grid must be a 2-D array.")
+    header = {
+        'field': field, 'dtype': grid.dtype.newbyteorder('<').str, 'rows': grid.shape[0], 'cols': grid.shape[1],
+        'west': west, 'north': north, 'cell_lon': cell_lon, 'cell_lat': cell_lat or cell_lon,
+        'nodata': nodata, 'classes': classes,
+    }
+    data_path = os.path.splitext(header_path)[0] + '.bin'
+    with open(data_path, 'wb') as handle:
+        for start in range(0, grid.shape[0], 1024):
+            np.ascontiguousarray(grid[start:start + 1024], dtype=header['dtype']).tofile(handle)
+    _write_header(header_path, header)
+
+def import_ascii_grid(source, header_path, field, dtype=None, classes=None):
+    """
+    Converts an ESRI ASCII grid (.asc) into a layer, streaming it row by row so
+    the grid never has to fit in memory. Returns the layer header.
+    """
+    dtype = np.dtype(dtype or ('<i2' if _option_table(field) is not None else '<f4')).newbyteorder('<')
+    with open(source, encoding='ascii') as handle:
+        grid = {}
+        for line in handle:
+            key, _, value = line.strip().partition(' ')
+            if not key or key[0] in '-+.0123456789':
+                first_values = line
+                break
+            grid[key.lower()] = float(value)
+        else:
+            raise ValueError(f"{source}: no grid values.")
+        try:
+            cols, rows = int(grid['ncols']), int(grid['nrows'])
+            cell = grid['cellsize']
+            west = grid['xllcorner'] if 'xllcorner' in grid else grid['xllcenter'] - cell / 2
+            south = grid['yllcorner'] if 'yllcorner' in grid else grid['yllcenter'] - cell / 2
+        except KeyError as error:
+            raise ValueError(f"{source}: header is missing {error}.")
+        nodata = grid.get('nodata_value')
+
+        data_path = os.path.splitext(header_path)[0] + '.bin'
+        written = 0
+        with open(data_path, 'wb') as output:
+            for line in itertools.chain([first_values], handle):
+                values = np.array(line.split(), dtype=np.float64)
+                values.astype(dtype).tofile(output)
+                written += len(values)
+        if written != rows * cols:
+            raise ValueError(f"{source}: expected {rows * cols} values, found {written}.")
+
+    header = {
+        'field': field, 'dtype': dtype.str, 'rows': rows, 'cols': cols, 'west': west, 'north': south + rows * cell,
+        'cell_lon': cell, 'cell_lat': cell, 'nodata': nodata, 'classes': classes,
+    }
+    _write_header(header_path, header)
+    return header
+
+# --- FILLING SITE ROWS ---
+
+def fill_from_layers(rows, layers):
+    """
+    Sets each layer's field on every raw site row (dict) in the list that has
+    valid latitude/longitude values and a data cell in that layer. Other rows
+    keep their own values. Returns {field: rows filled}.
+    """
+    positions, latitudes, longitudes = row_coordinates(rows)
+    filled = {}
+    for layer in layers:
+        values, valid = layer.field_values(latitudes, longitudes)
+        for position, value, ok in zip(positions.tolist(), values, valid.tolist()):
+            if ok:
+                rows[position][layer.field] = value
+        filled[layer.field] = int(valid.sum())
+    return filled
+
+def fill_from_layers_stream(rows, layers, chunk_size=SAMPLE_CHUNK_SIZE):
+    """fill_from_layers over an iterable of rows, a chunk at a time. Yields the rows."""
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        fill_from_layers(chunk, layers)
+        yield from chunk
+
+_LAYERS = None
+_LAYERS_LOCK = threading.Lock()
+
+def get_raster_layers():
+    """
+    The layers at ADVISOR_LAYERS (a layer directory), opened on first use.
+    An empty list when the variable is not set. Raises ValueError for bad layers.
+    """
+    global _LAYERS
+    path = os.environ.get('ADVISOR_LAYERS')
+    if not path:
+        return []
+    with _LAYERS_LOCK:
+        if _LAYERS is None or _LAYERS[0] != path:
+            _LAYERS = (path, open_layers(path))
+        return _LAYERS[1]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import and sample raster layers for site fields.")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    importer = subcommands.add_parser('import', help="Convert an ESRI ASCII grid (.asc) into a layer.")
+    importer.add_argument('source', help="The .asc file.")
+    importer.add_argument('header', help="Layer header to write (.json; the .bin goes next to it).")
+    importer.add_argument('--field', required=True, help="site_details field the layer fills (e.g. flood_key).")
+    importer.add_argument('--dtype', help="Cell type (default int16 for option fields, float32 otherwise).")
+    importer.add_argument('--classes', metavar='JSON',
+                          help="JSON file mapping cell values to option keys (default: cell value = option score).")
+    sampler = subcommands.add_parser('sample', help="Print the field values the layers give a coordinate.")
+    sampler.add_argument('layers', help="Layer directory or header.")
+    sampler.add_argument('latitude', type=float)
+    sampler.add_argument('longitude', type=float)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'import':
+            classes = None
+            if args.classes:
+                with open(args.classes, encoding='utf-8') as handle:
+                    classes = json.load(handle)
+            header = import_ascii_grid(args.source, args.header, args.field, args.dtype, classes)
+            print(f"Wrote a {header['rows']} x {header['cols']} {args.field} layer to {args.header}.", file=sys.stderr)
+            return 0
+        values = {}
+        for layer in open_layers(args.layers):
+            field_values, valid = layer.field_values([args.latitude], [args.longitude])
+            values[layer.field] = field_values[0] if valid[0] else None
+        print(json.dumps(values, indent=2))
+        return 0
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import pickle
+import re
+import sys
+import tempfile
+from data import *
+from logic import CATEGORICAL_FIELDS, RULE_SPECS, compile_rules, get_key_from_score, register_compiled_rules, rules_changed
+
+# --- EXTERNAL RULE FILES ---
+# Project rules kept outside the code (e.g. one file per jurisdiction), in the
+# same shape as data.CONSTRUCTION_RULES:
+#
+#   {"projects": {"Farm Barn": {"zoning_allowed": ["AG"], "min_fsi": 0.1, ...}, ...}}
+#
+# (the "projects" wrapper is optional). JSON and TOML work out of the box;
+# YAML needs PyYAML. Every file is validated against RULE_SPECS, compiled into
+# the engine's CompiledRule tables and cached on disk. A cached file is reused
+# while the source's size and mtime are unchanged, or its content hash still
+# matches, so loading thousands of projects does not slow down app start.
+#
+# The cache holds pickles: keep it in a directory only this app writes to.
+#
+# Usage:
+#   ADVISOR_RULES=rules/ streamlit run main.py     (files or directories, os.pathsep-separated)
+#   python rule_files.py check rules/
+#   python rule_files.py export builtin_rules.json
+
+RULE_FILE_EXTENSIONS = ('.json', '.toml', '.yaml', '.yml')
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'construction-advisor', 'rules')
+
+# Rule keys whose message quotes other rules, e.g. the soil pH range.
+_REFERENCED_RULES = {
+    key: tuple(re.findall(r"\{rules\[(\w+)\]\}", template)) for key, (_, _, template, _, _) in RULE_SPECS.items()
+}
+
+def _engine_fingerprint():
+    # Compiled tables depend on the rule specs and the option tables they quote.
+    engine = repr((CACHE_FORMAT_VERSION, list(RULE_SPECS.items()), ZONING_OPTIONS, list(SCORED_OPTIONS.items())))
+    return hashlib.blake2b(engine.encode('utf-8'), digest_size=16).hexdigest()
+
+ENGINE_FINGERPRINT = _engine_fingerprint()
+
+# --- PARSING & VALIDATION ---
+
+def parse_rule_file(path, content):
+    """Parses the bytes of a rule file by its extension. Returns {project: rules}."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        document = json.loads(content.decode('utf-8'))
+    elif extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError(f"{path}: TOML rule files need Python 3.11+; use JSON.")
+        document = tomllib.loads(content.decode('utf-8'))
+    elif extension in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f"{path}: reading YAML rule files needs PyYAML (pip install pyyaml).")
+        document = yaml.safe_load(content)
+    else:
+        raise ValueError(f"{path}: unsupported rule file type (use one of {', '.join(RULE_FILE_EXTENSIONS)}).")
+    if isinstance(document, dict) and isinstance(document.get('projects'), dict):
+        document = document['projects']
+    if not isinstance(document, dict):
+        raise ValueError(f"{path}: expected a mapping of project names to rules.")
+    return document
+
+def _rule_errors(key, value):
+    # Problems with one rule value, as a list of messages.
+    if key not in RULE_SPECS:
+        return [f"unknown rule '{key}'"]
+    field, op, _, _, options = RULE_SPECS[key]
+    if op == 'in':
+        allowed = CATEGORICAL_FIELDS[field]
+        if not isinstance(value, list) or not value or not all(isinstance(item, str) for item in value):
+            return [f"'{key}' must be a non-empty list of {field} keys"]
+        unknown = [item for item in value if item not in allowed]
+        return [f"'{key}' has unknown {field} keys {unknown}"] if unknown else []
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        return [f"'{key}' must be a number, got {value!r}"]
+    if options is not None and get_key_from_score(options, value) == "Unknown":
+        scores = sorted(option['score'] for option in options.values())
+        return [f"'{key}' must be one of the scores {scores}, got {value!r}"]
+    return []
+
+def validate_rule_set(projects, source="<rules>"):
+    """
+    Checks every project's rules against RULE_SPECS: known rule keys, numbers
+    for thresholds, existing scores for rated options, known zoning keys,
+    referenced rules present and min <= max for paired limits.
+    Raises ValueError listing every problem found.
+    """
+    errors = []
+    for project, rules in projects.items():
+        if not isinstance(project, str) or not project.strip():
+            errors.append(f"project name {project!r} must be a non-empty string")
+            continue
+        if not isinstance(rules, dict):
+            errors.append(f"{project}: rules must be a mapping")
+            continue
+        problems = []
+        for key, value in rules.items():
+            value_errors = _rule_errors(key, value)
+            problems.extend(value_errors)
+            for referenced in _REFERENCED_RULES.get(key, ()):
+                if referenced not in rules:
+                    problems.append(f"'{key}' needs '{referenced}' as well")
+            upper = 'max_' + key[4:]
+            if key.startswith('min_') and upper in rules and not value_errors and not _rule_errors(upper, rules[upper]):
+                if value > rules[upper]:
+                    problems.append(f"'{key}' is above '{upper}'")
+        errors.extend(f"{project}: {problem}" for problem in problems)
+    if errors:
+        raise ValueError(f"{source}: invalid rules:\n  " + "\n  ".join(errors))
+
+# --- COMPILED DISK CACHE ---
+
+def _cache_path(path, cache_dir):
+    name = hashlib.blake2b(os.path.abspath(path).encode('utf-8'), digest_size=16).hexdigest()
+    return os.path.join(cache_dir, name + '.pickle')
+
+def _read_cache(cache_file):
+    try:
+        with open(cache_file, 'rb') as handle:
+            entry = pickle.load(handle)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(entry, dict) or entry.get('engine') != ENGINE_FINGERPRINT:
+        return None
+    return entry
+
+def _write_cache(cache_file, entry):
+    # Atomic replace; a read-only or full cache directory just means no caching.
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as handle:
+            pickle.dump(entry, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, cache_file)
+    except OSError:
+        pass
+
+def load_rule_file(path, cache_dir=None):
+    """
+    Loads, validates and compiles one rule file, going through the disk cache
+    (`cache_dir` defaults to DEFAULT_CACHE_DIR; False disables it).
+    Returns {'source', 'projects': {name: rules}, 'compiled': {name: CompiledRules},
+    'cached': bool}. Raises ValueError for invalid files.
+    """
+    cache_dir = DEFAULT_CACHE_DIR if cache_dir is None else cache_dir
+    status = os.stat(path)
+    cache_file = _cache_path(path, cache_dir) if cache_dir else None
+    entry = _read_cache(cache_file) if cache_file else None
+    if entry and (entry['mtime_ns'], entry['size']) == (status.st_mtime_ns, status.st_size):
+        return {'source': path, 'projects': entry['projects'], 'compiled': entry['compiled'], 'cached': True}
+
+    with open(path, 'rb') as handle:
+        content = handle.read()
+    content_hash = hashlib.blake2b(content, digest_size=16).hexdigest()
+    if entry is None or entry['content_hash'] != content_hash:
+        projects = parse_rule_file(path, content)
+        validate_rule_set(projects, path)
+        entry = {
+            'engine': ENGINE_FINGERPRINT,
+            'content_hash': content_hash,
+            'projects': projects,
+            'compiled': {name: compile_rules(rules) for name, rules in projects.items()},
+        }
+        cached = False
+    else:
+        cached = True # Touched but unchanged: refresh the stat below.
+    entry['mtime_ns'], entry['size'] = status.st_mtime_ns, status.st_size
+    if cache_file:
+        _write_cache(cache_file, entry)
+    return {'source': path, 'projects': entry['projects'], 'compiled': entry['compiled'], 'cached': cached}
+
+def rule_file_paths(paths):
+    """Expands files and directories (their rule files, sorted) into a list of rule files."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(RULE_FILE_EXTENSIONS)
+            )
+        else:
+            files.append(path)
+    return files
+
+def load_rule_files(paths, cache_dir=None):
+    """load_rule_file for every rule file in `paths` (files or directories), in order."""
+    return [load_rule_file(path, cache_dir) for path in rule_file_paths(paths)]
+
+# --- INSTALLING INTO THE ENGINE ---
+
+def install_rule_sets(loaded, replace=False):
+    """
+    Adds the projects of loaded rule files to CONSTRUCTION_RULES (later files
+    win on duplicate names), with their precompiled tables. replace=True
+    removes every other project first. Returns the number of projects installed.
+    Raises ValueError (leaving the rules untouched) when no project would be left.
+    """
+    if replace:
+        if not any(rule_set['projects'] for rule_set in loaded):
+            raise ValueError("The rule files define no projects: replacing the built-in rules would leave none.")
+        CONSTRUCTION_RULES.clear()
+    installed = {}
+    for rule_set in loaded:
+        for name, rules in rule_set['projects'].items():
+            CONSTRUCTION_RULES[name] = rules
+            installed[name] = (rules, rule_set['compiled'][name])
+    rules_changed()
+    # After rules_changed(): tables registered before it would count as stale.
+    for name, (rules, compiled) in installed.items():
+        register_compiled_rules(name, rules, compiled)
+    return len(installed)
+
+_INSTALLED_FROM_ENVIRONMENT = None
+
+def install_from_environment(variable='ADVISOR_RULES'):
+    """
+    Installs the rule files named by an environment variable (files or
+    directories separated by os.pathsep), once per process. Set
+    ADVISOR_RULES_REPLACE=1 to drop the built-in projects.
+    """
+    global _INSTALLED_FROM_ENVIRONMENT
+    value = os.environ.get(variable, '')
+    if not value or value == _INSTALLED_FROM_ENVIRONMENT:
+        return 0
+    paths = [path for path in value.split(os.pathsep) if path]
+    count = install_rule_sets(load_rule_files(paths), replace=os.environ.get('ADVISOR_RULES_REPLACE') == '1')
+    _INSTALLED_FROM_ENVIRONMENT = value
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate, precompile and export construction rule files.")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    checker = subcommands.add_parser('check', help="Validate rule files and warm the compiled cache.")
+    checker.add_argument('paths', nargs='+', help="Rule files or directories of them.")
+    checker.add_argument('--cache-dir', help=f"Compiled cache directory (default {DEFAULT_CACHE_DIR}).")
+    exporter = subcommands.add_parser('export', help="Write the built-in rules as a JSON rule file to start from.")
+    exporter.add_argument('output', help="JSON file to write.")
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump({'projects': CONSTRUCTION_RULES}, handle, indent=2)
+            handle.write("\n")
+        print(f"Wrote {len(CONSTRUCTION_RULES)} projects to {args.output}.", file=sys.stderr)
+        return 0
+
+    failed = 0
+    for path in rule_file_paths(args.paths):
+        try:
+            rule_set = load_rule_file(path, args.cache_dir)
+        except (OSError, ValueError) as error:
+            print(error, file=sys.stderr)
+            failed += 1
+            continue
+        origin = "cached" if rule_set['cached'] else "compiled"
+        print(f"{path}: {len(rule_set['projects'])} projects OK ({origin}).", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
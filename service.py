@@ -0,0 +1,438 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+from data import *
+from logic import check_suitability, compute_margins, find_suitable_projects
+from rule_files import install_from_environment
+from hazards import fill_hazard_proximity, get_hazard_index
+from rasters import fill_from_layers, get_raster_layers
+from batch import chunked, evaluate_sites, parse_site, parse_sites
+from cache import (
+    cached_check_suitability, cached_format_rules_for_display, cached_generate_report_text, cached_generate_rules_text,
+)
+
+# --- HTTP JSON SERVICE ---
+# A small asyncio HTTP/1.1 server for other systems to call the advisor
+# without Streamlit. Connections are kept alive and requests may be pipelined:
+# each one is handled as soon as it is read and the responses go back in order.
+# Single sites are checked on the event loop (a check takes microseconds);
+# large batches are split across a process pool. A connection that sends no
+# complete request for READ_TIMEOUT seconds is closed.
+#
+#   GET  /health
+#   GET  /projects
+#   GET  /rules/<project>          JSON rules sheet (?format=text for the .txt version)
+#   POST /check   {"site": {...}, "projects": [...], "first_failure": false, "report": false, "margins": false}
+#   POST /batch   {"sites": [{...}, ...], "projects": [...], "first_failure": false}
+#
+# Sites use the same keys as a batch.py row (the form's site_details fields);
+# "projects" defaults to every project. Sites with latitude/longitude get
+# fields measured from the local map data, if configured: hazard proximity
+# (ADVISOR_HAZARDS, see hazards.py) and raster layers (ADVISOR_LAYERS, rasters.py).
+#
+# Usage:
+#   python service.py serve --port 8000
+#   python service.py loadtest --port 8000 --requests 20000
+
+MAX_BODY_BYTES = 64 * 1024 * 1024
+MAX_HEADERS = 100
+MAX_PIPELINE = 64 # requests read ahead of their responses, per connection
+READ_TIMEOUT = 60 # seconds to receive a whole request (or to wait for the next one)
+INLINE_BATCH_SITES = 64 # batches up to this size skip the process pool
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+class HttpError(Exception):
+    """An error to send back to the client as {"error": message}."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# --- REQUEST HANDLERS ---
+# Each returns (status, body): a dict/list is sent as JSON, a str as plain text.
+
+def _projects_from(payload):
+    projects = payload.get('projects') or list(CONSTRUCTION_RULES)
+    if not isinstance(projects, list) or not all(isinstance(project, str) for project in projects):
+        raise HttpError(400, "'projects' must be a list of project names.")
+    for project in projects:
+        if project not in CONSTRUCTION_RULES:
+            raise HttpError(404, f"Unknown project '{project}'.")
+    return projects
+
+def _site_from(row):
+    if not isinstance(row, dict):
+        raise HttpError(400, "'site' must be an object.")
+    try:
+        return parse_site(row)
+    except KeyError as error:
+        raise HttpError(400, f"Missing field {error}.")
+    except ValueError as error:
+        raise HttpError(400, str(error))
+
+def _fill_from_maps(rows):
+    # Measures fields of rows with coordinates from the local GIS data, if configured.
+    hazard_index = get_hazard_index()
+    if hazard_index is not None:
+        fill_hazard_proximity(rows, hazard_index)
+    layers = get_raster_layers()
+    if layers:
+        fill_from_layers(rows, layers)
+
+def handle_check(payload):
+    row = payload.get('site')
+    if not isinstance(row, dict):
+        raise HttpError(400, "'site' must be an object.")
+    _fill_from_maps([row])
+    site = _site_from(row)
+    projects = _projects_from(payload)
+    first_failure = bool(payload.get('first_failure'))
+    suitable_projects = find_suitable_projects(site)
+    results = []
+    for project in projects:
+        if first_failure:
+            issues = check_suitability(site, project, first_failure=True)
+        else:
+            issues = cached_check_suitability(site, project)
+        result = {'project': project, 'suitable': not issues, 'issues': issues}
+        if payload.get('report'):
+            full_issues = cached_check_suitability(site, project)
+            result['report'] = cached_generate_report_text(site, project, full_issues, suitable_projects)
+        if payload.get('margins'):
+            result['margins'] = compute_margins(site, project)
+        results.append(result)
+    return 200, {'project_heading': site['project_heading'], 'results': results,
+                 'suitable_projects': suitable_projects}
+
+def _screen_chunk(rows, start, projects, first_failure):
+    # Runs in a worker process.
+    return list(evaluate_sites(parse_sites(rows, start), projects, first_failure=first_failure))
+
+async def handle_batch(service, payload):
+    rows = payload.get('sites')
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise HttpError(400, "'sites' must be a list of site objects.")
+    projects = _projects_from(payload)
+    first_failure = bool(payload.get('first_failure'))
+    if len(rows) <= INLINE_BATCH_SITES:
+        _fill_from_maps(rows)
+    else:
+        # Sampling the map data for many sites would hold up every other connection.
+        await asyncio.get_running_loop().run_in_executor(None, _fill_from_maps, rows)
+    if service['pool'] is None or len(rows) <= INLINE_BATCH_SITES:
+        return 200, {'results': _screen_chunk(rows, 1, projects, first_failure)}
+
+    loop = asyncio.get_running_loop()
+    jobs = []
+    start = 1
+    for chunk in chunked(rows, service['chunk_size']):
+        jobs.append(loop.run_in_executor(service['pool'], _screen_chunk, chunk, start, projects, first_failure))
+        start += len(chunk)
+    results = []
+    for records in await asyncio.gather(*jobs):
+        results.extend(records)
+    return 200, {'results': results}
+
+def handle_rules(project, query):
+    if project not in CONSTRUCTION_RULES:
+        raise HttpError(404, f"Unknown project '{project}'.")
+    if query.get('format', ['json'])[0] == 'text':
+        return 200, cached_generate_rules_text(project)
+    return 200, cached_format_rules_for_display(project)
+
+def _json_payload(body):
+    try:
+        payload = json.loads(body or b'{}')
+    except (UnicodeDecodeError, json.JSONDecodeError) as error:
+        raise HttpError(400, f"Invalid JSON body: {error}")
+    if not isinstance(payload, dict):
+        raise HttpError(400, "The request body must be a JSON object.")
+    return payload
+
+async def dispatch(service, method, target, body):
+    """Routes one request. Returns (status, body)."""
+    parts = urlsplit(target)
+    path = unquote(parts.path).rstrip('/') or '/'
+    query = parse_qs(parts.query)
+    try:
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/projects':
+            return 200, list(CONSTRUCTION_RULES)
+        if path.startswith('/rules/'):
+            if method != 'GET':
+                raise HttpError(405, "Use GET.")
+            return handle_rules(path[len('/rules/'):], query)
+        if path == '/check':
+            if method != 'POST':
+                raise HttpError(405, "Use POST.")
+            return handle_check(_json_payload(body))
+        if path == '/batch':
+            if method != 'POST':
+                raise HttpError(405, "Use POST.")
+            return await handle_batch(service, _json_payload(body))
+        raise HttpError(404, f"No endpoint at {path}.")
+    except HttpError as error:
+        return error.status, {'error': str(error)}
+    except Exception as error:
+        print(f"{method} {target} failed: {error!r}", file=sys.stderr)
+        return 500, {'error': "Internal error."}
+
+# --- HTTP/1.1 PLUMBING ---
+
+async def read_request(reader):
+    """
+    Reads one request. Returns (method, target, headers, body), or None when
+    the client has closed the connection. Raises HttpError for bad requests.
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line.")
+    headers = {'_version': version}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        if len(headers) > MAX_HEADERS:
+            raise HttpError(400, "Too many headers.")
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'transfer-encoding' in headers:
+        raise HttpError(411, "Send a Content-Length instead of a chunked body.")
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HttpError(400, "Bad Content-Length.")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, f"Bodies are limited to {MAX_BODY_BYTES} bytes.")
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target, headers, body
+
+def _keep_alive(headers):
+    connection = headers.get('connection', '').lower()
+    if headers['_version'] == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+def encode_response(status, body, keep_alive=True):
+    if isinstance(body, str):
+        payload, content_type = body.encode('utf-8'), 'text/plain; charset=utf-8'
+    else:
+        payload, content_type = json.dumps(body, ensure_ascii=False).encode('utf-8'), 'application/json'
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(payload)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode('latin-1') + payload
+
+async def _write_responses(writer, pending):
+    # Sends each pipelined response as soon as it and every earlier one are ready.
+    while True:
+        item = await pending.get()
+        if item is None:
+            return
+        task, keep_alive = item
+        status, body = await task
+        writer.write(encode_response(status, body, keep_alive))
+        await writer.drain()
+
+async def _enqueue(pending, sender, item):
+    # Queues a response for the sender. Returns False (dropping the item) if
+    # the sender has stopped, e.g. the client went away, instead of waiting
+    # forever for room in a full queue.
+    if sender.done():
+        return False
+    if not pending.full():
+        pending.put_nowait(item)
+        return True
+    put = asyncio.ensure_future(pending.put(item))
+    await asyncio.wait({put, sender}, return_when=asyncio.FIRST_COMPLETED)
+    if not put.done():
+        put.cancel()
+        return False
+    return True
+
+async def handle_connection(service, reader, writer):
+    pending = asyncio.Queue(MAX_PIPELINE)
+    sender = asyncio.create_task(_write_responses(writer, pending))
+    # The read timeout cancels this task from a timer: asyncio.wait_for would
+    # start a task per request and cost a fifth of the pipelined throughput.
+    loop = asyncio.get_running_loop()
+    handler = asyncio.current_task()
+    timed_out = []
+
+    def expire():
+        timed_out.append(True)
+        handler.cancel()
+
+    try:
+        while not sender.done():
+            timer = loop.call_later(READ_TIMEOUT, expire)
+            try:
+                request = await read_request(reader)
+            except HttpError as error:
+                await _enqueue(pending, sender, (_ready(error.status, {'error': str(error)}), False))
+                break
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except asyncio.CancelledError:
+                if not timed_out:
+                    raise
+                break
+            finally:
+                timer.cancel()
+            if request is None:
+                break
+            method, target, headers, body = request
+            keep_alive = _keep_alive(headers)
+            task = asyncio.ensure_future(dispatch(service, method, target, body))
+            if not await _enqueue(pending, sender, (task, keep_alive)) or not keep_alive:
+                break
+    finally:
+        await _enqueue(pending, sender, None)
+        try:
+            await sender
+        except ConnectionError:
+            pass
+        writer.close()
+
+def _ready(status, body):
+    future = asyncio.get_running_loop().create_future()
+    future.set_result((status, body))
+    return future
+
+async def serve(host='127.0.0.1', port=8000, workers=0, chunk_size=500):
+    """Runs the service until cancelled. workers=0 uses every CPU core, 1 disables the pool."""
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=install_from_environment) if workers > 1 else None
+    service = {'pool': pool, 'chunk_size': chunk_size}
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(service, reader, writer), host, port
+    )
+    print(f"Serving on http://{host}:{port} ({workers} batch workers)", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+# --- LOAD TEST CLIENT ---
+
+async def _load_connection(host, port, request, count, pipeline, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    sent = 0
+    received = 0
+    in_flight = []
+    while received < count:
+        while sent < count and len(in_flight) < pipeline:
+            writer.write(request)
+            in_flight.append(time.perf_counter())
+            sent += 1
+        await writer.drain()
+        status_line = await reader.readline()
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+        await reader.readexactly(length)
+        if not status_line.startswith(b'HTTP/1.1 200'):
+            raise RuntimeError(f"Unexpected response: {status_line!r}")
+        latencies.append(time.perf_counter() - in_flight.pop(0))
+        received += 1
+    writer.close()
+
+async def load_test(host='127.0.0.1', port=8000, requests=10000, connections=16, pipeline=8, path='/check'):
+    """
+    Sends `requests` POSTs of one synthetic site to `path` over `connections`
+    keep-alive connections, `pipeline` requests in flight on each.
+    Returns throughput and latency figures.
+    """
+    from benchmark import generate_sites # Synthetic sites; only needed here.
+
+    site = generate_sites(1)[0]
+    payload = {'site': site} if path == '/check' else {'sites': [site]}
+    body = json.dumps(payload).encode('utf-8')
+    request = (
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode('latin-1') + body
+
+    latencies = []
+    shares = [requests // connections + (index < requests % connections) for index in range(connections)]
+    started = time.perf_counter()
+    await asyncio.gather(*(_load_connection(host, port, request, share, pipeline, latencies)
+                           for share in shares if share))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1e3,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3,
+    }
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="HTTP JSON service for the construction advisor.")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    server = subcommands.add_parser('serve', help="Run the service.")
+    server.add_argument('--host', default='127.0.0.1', help="Interface to listen on (default 127.0.0.1).")
+    server.add_argument('--port', type=int, default=8000, help="Port to listen on (default 8000).")
+    server.add_argument('-w', '--workers', type=int, default=0,
+                        help="Processes for /batch. 0 (default) uses every CPU core, 1 runs batches inline.")
+    server.add_argument('--chunk-size', type=int, default=500, help="Batch sites sent to a worker at a time (default 500).")
+    tester = subcommands.add_parser('loadtest', help="Hammer a running service and report requests/second.")
+    tester.add_argument('--host', default='127.0.0.1')
+    tester.add_argument('--port', type=int, default=8000)
+    tester.add_argument('--path', default='/check', choices=['/check', '/batch'])
+    tester.add_argument('--requests', type=int, default=10000, help="Total requests (default 10000).")
+    tester.add_argument('--connections', type=int, default=16, help="Concurrent connections (default 16).")
+    tester.add_argument('--pipeline', type=int, default=8, help="Requests in flight per connection (default 8).")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'serve':
+        if args.workers < 0 or args.chunk_size < 1:
+            print("--workers must be >= 0 and --chunk-size must be >= 1.", file=sys.stderr)
+            return 2
+        try:
+            install_from_environment()
+            get_hazard_index() # load the map data (if any) before taking requests
+            get_raster_layers()
+        except (OSError, ValueError) as error:
+            print(error, file=sys.stderr)
+            return 2
+        try:
+            asyncio.run(serve(args.host, args.port, args.workers, args.chunk_size))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.requests < 1 or args.connections < 1 or args.pipeline < 1:
+        print("--requests, --connections and --pipeline must be >= 1.", file=sys.stderr)
+        return 2
+    result = asyncio.run(load_test(args.host, args.port, args.requests, args.connections, args.pipeline, args.path))
+    print(json.dumps(result, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
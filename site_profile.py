@@ -0,0 +1,138 @@
+from array import array
+from data import *
+
+# --- COMPACT SITE RECORD ---
+# A site_details dict holds ~50 string keys plus a boxed value for each one.
+# SiteProfile stores the same data in four slots: the heading, the zoning key,
+# every numeric field packed into one array of doubles and every option choice
+# as a one-byte code. Scores and option keys are decoded on access.
+#
+# It reads like the dict (profile['spt_n'], profile.get(...)) so
+# check_suitability, generate_report_text and the batch evaluator accept it
+# directly, and each field is also a typed attribute (profile.spt_n).
+
+_NUMERIC_FIELDS = list(SITE_NUMERIC_FIELDS)
+_OPTION_FIELDS = list(SITE_OPTION_FIELDS)
+
+def _number_reader(position, kind):
+    if kind is int:
+        def read(profile):
+            value = profile._numbers[position]
+            return int(value) if value.is_integer() else value
+    else:
+        def read(profile):
+            return profile._numbers[position]
+    return read
+
+def _option_reader(position, values):
+    def read(profile):
+        return values[profile._options[position]]
+    return read
+
+# site_details field -> function reading it from a SiteProfile
+_READERS = {
+    'project_heading': lambda profile: profile.project_heading,
+    'zoning': lambda profile: profile.zoning,
+}
+for _position, _field in enumerate(_NUMERIC_FIELDS):
+    _READERS[_field] = _number_reader(_position, SITE_NUMERIC_FIELDS[_field])
+for _position, (_key_field, (_score_field, _options)) in enumerate(SITE_OPTION_FIELDS.items()):
+    _READERS[_key_field] = _option_reader(_position, list(_options))
+    _READERS[_score_field] = _option_reader(_position, [option['score'] for option in _options.values()])
+
+# Dict layout used by to_dict(): ui.render_input_tab's order, each score after its key.
+_DICT_FIELDS = []
+for _field in SITE_SESSION_KEYS:
+    _DICT_FIELDS.append(_field)
+    if _field in SITE_OPTION_FIELDS:
+        _DICT_FIELDS.append(SITE_OPTION_FIELDS[_field][0])
+
+class SiteProfile:
+    """
+    Memory-compact, read-only record of one site's details.
+    Build one with from_dict() or from_session_state().
+    """
+    __slots__ = ('project_heading', 'zoning', '_numbers', '_options')
+
+    def __init__(self, project_heading, zoning, numbers, options):
+        self.project_heading = project_heading
+        self.zoning = zoning
+        self._numbers = numbers
+        self._options = options
+
+    @classmethod
+    def from_dict(cls, site_details):
+        """
+        Packs a site_details dict. Scores are re-derived from the option keys.
+        Raises KeyError for missing fields or unknown option keys.
+        """
+        numbers = array('d', [site_details[field] for field in _NUMERIC_FIELDS])
+        options = bytes(
+            _OPTION_CODES[field][site_details[field]] for field in _OPTION_FIELDS
+        )
+        zoning = site_details['zoning']
+        if zoning not in ZONING_OPTIONS:
+            raise KeyError(zoning)
+        return cls(site_details.get('project_heading', "Untitled Site"), zoning, numbers, options)
+
+    @classmethod
+    def from_session_state(cls, session_state):
+        """Packs the values of the input form's widgets (see SITE_SESSION_KEYS)."""
+        site_details = {field: session_state[key] for field, key in SITE_SESSION_KEYS.items()}
+        site_details['project_heading'] = site_details['project_heading'] or "Untitled Site"
+        return cls.from_dict(site_details)
+
+    def to_dict(self):
+        """Returns the site_details dict, laid out exactly as the input form builds it."""
+        return {field: _READERS[field](self) for field in _DICT_FIELDS}
+
+    def to_session_state(self, session_state):
+        """Writes the profile back into the input form's widget keys."""
+        for field, key in SITE_SESSION_KEYS.items():
+            session_state[key] = _READERS[field](self)
+
+    # --- Read-only mapping interface (what the rule engine uses) ---
+    def __getitem__(self, field):
+        try:
+            reader = _READERS[field]
+        except KeyError:
+            raise KeyError(field) from None
+        return reader(self)
+
+    def get(self, field, default=None):
+        reader = _READERS.get(field)
+        return default if reader is None else reader(self)
+
+    def __contains__(self, field):
+        return field in _READERS
+
+    def keys(self):
+        return list(_DICT_FIELDS)
+
+    def __eq__(self, other):
+        if not isinstance(other, SiteProfile):
+            return NotImplemented
+        return (self.project_heading, self.zoning, self._numbers, self._options) == \
+               (other.project_heading, other.zoning, other._numbers, other._options)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"SiteProfile({self.project_heading!r}, zoning={self.zoning!r})"
+
+    def __getstate__(self):
+        return (self.project_heading, self.zoning, self._numbers, self._options)
+
+    def __setstate__(self, state):
+        self.project_heading, self.zoning, self._numbers, self._options = state
+
+# option key field -> {option key: code}
+_OPTION_CODES = {
+    field: {option: code for code, option in enumerate(options)}
+    for field, (_, options) in SITE_OPTION_FIELDS.items()
+}
+
+# Typed read-only attributes for every other field (profile.spt_n, profile.flood_score, ...).
+for _field, _reader in _READERS.items():
+    if _field not in SiteProfile.__slots__:
+        setattr(SiteProfile, _field, property(_reader))
@@ -0,0 +1,248 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import numpy as np
+from data import *
+from logic import CATEGORICAL_FIELDS, RULE_SPECS, check_suitability_batch
+
+# --- COLUMNAR SITE STORE ---
+# A site portfolio saved as one raw binary file per field, so it can be opened
+# memory-mapped and scanned a column at a time without loading it into RAM.
+#
+#   <store>/schema.json              row count, dtypes and option categories
+#   <store>/<field>.bin              numeric fields as float64
+#   <store>/<key field>.bin          option choices (and zoning) as uint8 codes
+#   <store>/project_heading.bin      UTF-8 headings, back to back
+#   <store>/project_heading.offsets  int64 start offset of each heading (rows + 1)
+#
+# The columns are the site_details fields behind the input form's widgets
+# (data.SITE_SESSION_KEYS, the same keys state.initialize_state sets up).
+# Scores are not stored; they are decoded from the option codes.
+#
+# Usage:
+#   python store.py import parcels.csv parcels.store
+#   python batch.py parcels.store -o results.jsonl
+
+SCHEMA_FILE = 'schema.json'
+STORE_VERSION = 1
+
+# Categorical columns -> options table. Codes are positions in the table's keys
+# at write time; the keys themselves are kept in the schema.
+STORE_CATEGORIES = dict(
+    {'zoning': ZONING_OPTIONS},
+    **{key_field: options for key_field, (_, options) in SITE_OPTION_FIELDS.items()}
+)
+
+def _store_fields():
+    # Numeric and categorical columns, in form order.
+    return [field for field in SITE_SESSION_KEYS if field != 'project_heading']
+
+def _read_schema(path):
+    with open(os.path.join(path, SCHEMA_FILE), encoding='utf-8') as handle:
+        return json.load(handle)
+
+def _write_schema(path, rows):
+    columns = {}
+    for field in _store_fields():
+        if field in STORE_CATEGORIES:
+            columns[field] = {'dtype': 'u1', 'categories': list(STORE_CATEGORIES[field])}
+        else:
+            columns[field] = {'dtype': '<f8', 'kind': SITE_NUMERIC_FIELDS[field].__name__}
+    schema = {'version': STORE_VERSION, 'rows': rows, 'columns': columns}
+    temporary = os.path.join(path, SCHEMA_FILE + '.tmp')
+    with open(temporary, 'w', encoding='utf-8') as handle:
+        json.dump(schema, handle, indent=2)
+    os.replace(temporary, os.path.join(path, SCHEMA_FILE))
+
+def write_store(path, sites, append=False, chunk_size=65536):
+    """
+    Streams site detail dicts into a columnar store at `path` (a directory),
+    `chunk_size` sites at a time. With append=True, adds to an existing store.
+    Raises KeyError for missing fields or unknown option keys, leaving the
+    store as it was: a new store is written to temporary files that replace
+    the old ones only once every site is in, and the files of a failed append
+    are cut back to their length before the call.
+    Returns the total number of rows in the store.
+    """
+    os.makedirs(path, exist_ok=True)
+    rows = 0
+    heading_offset = 0
+    if append and os.path.exists(os.path.join(path, SCHEMA_FILE)):
+        schema = _read_schema(path)
+        rows = schema['rows']
+        for field, options in STORE_CATEGORIES.items():
+            if schema['columns'][field]['categories'] != list(options):
+                raise ValueError(f"Options for '{field}' changed since the store was written; rewrite it.")
+        heading_offset = int(np.fromfile(os.path.join(path, 'project_heading.offsets'), dtype='<i8')[-1])
+    else:
+        append = False
+
+    mode, suffix = ('ab', '') if append else ('wb', '.tmp')
+    names = [field + '.bin' for field in _store_fields()] + ['project_heading.bin', 'project_heading.offsets']
+    codes = {field: {key: code for code, key in enumerate(options)} for field, options in STORE_CATEGORIES.items()}
+    every_file = [open(os.path.join(path, name + suffix), mode) for name in names]
+    handles = dict(zip(_store_fields(), every_file))
+    headings, offsets = every_file[-2:]
+    start_sizes = [handle.tell() for handle in every_file]
+    try:
+        if not append:
+            np.array([0], dtype='<i8').tofile(offsets)
+        iterator = iter(sites)
+        while True:
+            chunk = list(itertools.islice(iterator, chunk_size))
+            if not chunk:
+                break
+            # Encode the whole chunk before writing, so a bad site cannot
+            # leave some column files longer than others.
+            columns = {}
+            for field in handles:
+                if field in codes:
+                    lookup = codes[field]
+                    columns[field] = np.fromiter((lookup[site[field]] for site in chunk), dtype='u1', count=len(chunk))
+                else:
+                    columns[field] = np.fromiter((site[field] for site in chunk), dtype='<f8', count=len(chunk))
+            encoded = [site.get('project_heading', "Untitled Site").encode('utf-8') for site in chunk]
+            ends = heading_offset + np.cumsum([len(text) for text in encoded], dtype='<i8')
+            for field, handle in handles.items():
+                columns[field].tofile(handle)
+            headings.write(b''.join(encoded))
+            ends.tofile(offsets)
+            heading_offset = int(ends[-1])
+            rows += len(chunk)
+    except BaseException:
+        # Drop what this call wrote: the schema still describes the old files.
+        for handle, size in zip(every_file, start_sizes):
+            handle.truncate(size)
+            handle.close()
+            if not append:
+                os.remove(handle.name)
+        raise
+    finally:
+        for handle in every_file:
+            handle.close()
+
+    if not append:
+        # No schema while the files are swapped: a half-replaced store cannot be opened.
+        if os.path.exists(os.path.join(path, SCHEMA_FILE)):
+            os.remove(os.path.join(path, SCHEMA_FILE))
+        for name in names:
+            os.replace(os.path.join(path, name + suffix), os.path.join(path, name))
+    _write_schema(path, rows)
+    return rows
+
+def open_store(path):
+    """
+    Opens a store read-only. Columns are memory-mapped on first use, so
+    opening is instant and only the pages that are read get loaded.
+    """
+    schema = _read_schema(path)
+    if schema.get('version') != STORE_VERSION:
+        raise ValueError(f"Unsupported store version {schema.get('version')}.")
+    return {'path': path, 'rows': schema['rows'], 'schema': schema, 'maps': {}}
+
+def _column(store, name, dtype, length):
+    maps = store['maps']
+    if name not in maps:
+        if length == 0:
+            maps[name] = np.empty(0, dtype=dtype)
+        else:
+            maps[name] = np.memmap(os.path.join(store['path'], name), dtype=dtype, mode='r', shape=(length,))
+    return maps[name]
+
+def raw_column(store, field):
+    """The stored column for a field: float64 values, or uint8 option codes."""
+    spec = store['schema']['columns'][field]
+    return _column(store, field + '.bin', spec['dtype'], store['rows'])
+
+def store_columns(store, start=0, stop=None):
+    """
+    Returns the rows [start, stop) as the column dict check_suitability_batch
+    takes: every field RULE_SPECS reads, with scores decoded from the option
+    codes and zoning as CATEGORICAL_FIELDS codes. Numeric columns are memmap views.
+    """
+    stop = store['rows'] if stop is None else stop
+    score_sources = {score_field: (key_field, options) for key_field, (score_field, options) in SITE_OPTION_FIELDS.items()}
+    columns = {}
+    for field, *_ in RULE_SPECS.values():
+        if field in columns:
+            continue
+        if field in score_sources:
+            key_field, options = score_sources[field]
+            categories = store['schema']['columns'][key_field]['categories']
+            scores = np.array([options[key]['score'] if key in options else np.nan for key in categories], dtype=np.float64)
+            columns[field] = scores[raw_column(store, key_field)[start:stop]]
+        elif field in CATEGORICAL_FIELDS:
+            current = {key: code for code, key in enumerate(CATEGORICAL_FIELDS[field])}
+            categories = store['schema']['columns'][field]['categories']
+            remap = np.array([current.get(key, len(current)) for key in categories], dtype=np.intp)
+            columns[field] = remap[raw_column(store, field)[start:stop]]
+        else:
+            columns[field] = raw_column(store, field)[start:stop]
+    return columns
+
+def read_sites(store, start=0, stop=None):
+    """Yields rows [start, stop) back as site_details dicts, in form layout."""
+    stop = store['rows'] if stop is None else stop
+    offsets = _column(store, 'project_heading.offsets', '<i8', store['rows'] + 1)
+    headings = _column(store, 'project_heading.bin', 'u1', int(offsets[-1]) if store['rows'] else 0)
+    schema_columns = store['schema']['columns']
+    for row in range(start, stop):
+        site = {'project_heading': bytes(headings[offsets[row]:offsets[row + 1]]).decode('utf-8')}
+        for field in _store_fields():
+            value = raw_column(store, field)[row]
+            if field in STORE_CATEGORIES:
+                site[field] = schema_columns[field]['categories'][value]
+                if field in SITE_OPTION_FIELDS:
+                    score_field, options = SITE_OPTION_FIELDS[field]
+                    site[score_field] = options[site[field]]['score']
+            elif SITE_NUMERIC_FIELDS[field] is int and value.is_integer():
+                site[field] = int(value)
+            else:
+                site[field] = float(value)
+        yield site
+
+def screen_store(store, projects=None, chunk_size=262144):
+    """
+    Runs check_suitability_batch over the whole store, `chunk_size` rows at a
+    time. Yields (first row, violations) per chunk; see check_suitability_batch.
+    """
+    for start in range(0, store['rows'], chunk_size):
+        stop = min(start + chunk_size, store['rows'])
+        yield start, check_suitability_batch(store_columns(store, start, stop), projects)
+
+def is_store(path):
+    """True if `path` is a store directory."""
+    return os.path.isfile(os.path.join(path, SCHEMA_FILE))
+
+def main(argv=None):
+    # Imported here because batch.py reads stores through this module.
+    import batch
+
+    parser = argparse.ArgumentParser(description="Build a columnar site store from a CSV/JSONL file.")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    importer = subcommands.add_parser('import', help="Parse a site file once and save it as a store.")
+    importer.add_argument('input', help="Site file (.csv or .jsonl).")
+    importer.add_argument('store', help="Store directory to create.")
+    importer.add_argument('--append', action='store_true', help="Add to an existing store.")
+    args = parser.parse_args(argv)
+
+    skipped = 0
+    def parsed_sites(rows):
+        nonlocal skipped
+        for number, site, error in batch.parse_sites(rows):
+            if site is None:
+                skipped += 1
+                print(f"Row {number} skipped: {error}", file=sys.stderr)
+            else:
+                yield site
+
+    with open(args.input, newline='', encoding='utf-8') as handle:
+        rows = batch.read_rows(handle, batch.detect_format(args.input))
+        total = write_store(args.store, parsed_sites(rows), append=args.append)
+    print(f"Store now holds {total} sites ({skipped} rows skipped).", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
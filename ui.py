@@ -2,31 +2,44 @@ import streamlit as st
 import datetime
 from data import *
 from logic import *
-
+from site_profile import SiteProfile
+from history import DEFAULT_PAGE_SIZE, get_history
+from hazards import fill_hazard_proximity, get_hazard_index
+from rasters import fill_from_layers, get_raster_layers
+from cache import (
+    RESULT_CACHE, cached_generate_report_text, cached_format_site_summary, cached_start_evaluation,
+    cached_format_rules_for_display, cached_generate_rules_text,
+)
+
+# --- Selectbox labels ---
+# Widget key -> function giving the "key (description)" label of a choice.
+# Built once per server process (see data.FORM_CHOICES for the choices), so a
+# rerun only looks labels up instead of re-formatting every option.
+FORM_LABELS = {SITE_SESSION_KEYS[field]: labels.__getitem__ for field, labels in OPTION_LABELS.items()}
+
+# Each tab is a fragment: interacting with one tab reruns only that tab.
+# (Streamlit does not allow fragments inside a form, so the whole input form
+# is one fragment; its widgets don't rerun anything until it is submitted.)
+
+@st.fragment
 def render_input_tab():
     """
     Renders all the Streamlit widgets for the input form.
     """
 
-    # --- Get Lists for Dropdowns ---
-    zoning_list = list(ZONING_OPTIONS.keys())
-    eia_list = list(EIA_STATUS_OPTIONS.keys())
-    phase1_list = list(PHASE1_ESA_OPTIONS.keys())
-    phase2_list = list(PHASE2_ESA_OPTIONS.keys())
-    biodiversity_list = list(BIODIVERSITY_IMPACT_OPTIONS.keys())
-    flood_list = list(FLOOD_RISK_OPTIONS.keys())
-    drainage_list = list(DRAINAGE_OPTIONS.keys())
-    seismic_list = list(SEISMIC_ZONE_OPTIONS.keys())
-    contaminant_list = list(SOIL_CONTAMINANT_OPTIONS.keys())
-    water_quality_list = list(WATER_QUALITY_OPTIONS.keys())
-    utility_list = list(UTILITY_OPTIONS.keys())
-    traffic_list = list(TRAFFIC_IMPACT_OPTIONS.keys())
-    soil_texture_list = list(SOIL_TEXTURE_OPTIONS.keys())
-    project_list = list(CONSTRUCTION_RULES.keys())
-
     st.header("Enter Your Site's Details")
     st.markdown("Fill out the details from your site reports below. The form is organized into sections.")
 
+    # Local GIS data (optional): with site coordinates, fields are measured from it
+    try:
+        hazard_index = get_hazard_index()
+        raster_layers = get_raster_layers()
+    except (OSError, ValueError) as error:
+        st.warning(f"Could not load the local map data: {error}")
+        hazard_index, raster_layers = None, []
+    measured_fields = (['hazardous_site_proximity_ft'] if hazard_index is not None else []) + \
+                      [layer.field for layer in raster_layers]
+
     with st.form(key="site_details_form"):
 
         # --- Section 0: Report Heading ---
@@ -44,9 +57,9 @@ def render_input_tab():
             with col1_form:
                 st.selectbox(
                     "Land Use and Zoning Verification",
-                    zoning_list,
-                    index=zoning_list.index(st.session_state.zoning_choice), # Set index from state
-                    format_func=lambda x: format_option(x, ZONING_OPTIONS),
+                    FORM_CHOICES['zoning_choice'],
+                    index=FORM_CHOICES['zoning_choice'].index(st.session_state.zoning_choice),
+                    format_func=FORM_LABELS['zoning_choice'],
                     key="zoning_choice" # Link to st.session_state.zoning_choice
                 )
                 st.number_input(
@@ -76,6 +89,24 @@ def render_input_tab():
                     min_value=0, step=1,
                     key="vegetation_survey"
                 )
+            if measured_fields:
+                col1_form, col2_form = st.columns(2)
+                with col1_form:
+                    st.number_input(
+                        "Site Latitude (°)",
+                        min_value=-90.0, max_value=90.0, step=0.0001, format="%.6f",
+                        key="site_latitude"
+                    )
+                with col2_form:
+                    st.number_input(
+                        "Site Longitude (°)",
+                        min_value=-180.0, max_value=180.0, step=0.0001, format="%.6f",
+                        key="site_longitude"
+                    )
+                st.caption(
+                    "With both coordinates, these fields are measured from the local map data instead of "
+                    f"the values entered below: {', '.join(measured_fields)}."
+                )
 
         # --- Section 2: Geotechnical (Soil Properties) ---
         with st.expander("2. Geotechnical (Soil Properties)", expanded=False):
@@ -126,9 +157,9 @@ def render_input_tab():
             with col2_form:
                 st.selectbox(
                     "Soil Texture and Classification",
-                    soil_texture_list,
-                    index=soil_texture_list.index(st.session_state.soil_texture_choice),
-                    format_func=lambda x: format_option(x, SOIL_TEXTURE_OPTIONS),
+                    FORM_CHOICES['soil_texture_choice'],
+                    index=FORM_CHOICES['soil_texture_choice'].index(st.session_state.soil_texture_choice),
+                    format_func=FORM_LABELS['soil_texture_choice'],
                     key="soil_texture_choice"
                 )
                 st.number_input(
@@ -190,16 +221,16 @@ def render_input_tab():
             with col2_form:
                 st.selectbox(
                     "Chemical Analysis of Soil",
-                    contaminant_list,
-                    index=contaminant_list.index(st.session_state.contaminant_choice),
-                    format_func=lambda x: format_option(x, SOIL_CONTAMINANT_OPTIONS),
+                    FORM_CHOICES['contaminant_choice'],
+                    index=FORM_CHOICES['contaminant_choice'].index(st.session_state.contaminant_choice),
+                    format_func=FORM_LABELS['contaminant_choice'],
                     key="contaminant_choice"
                 )
                 st.selectbox(
                     "Water Quality Test (for foundation)",
-                    water_quality_list,
-                    index=water_quality_list.index(st.session_state.water_quality_choice),
-                    format_func=lambda x: format_option(x, WATER_QUALITY_OPTIONS),
+                    FORM_CHOICES['water_quality_choice'],
+                    index=FORM_CHOICES['water_quality_choice'].index(st.session_state.water_quality_choice),
+                    format_func=FORM_LABELS['water_quality_choice'],
                     key="water_quality_choice"
                 )
 
@@ -209,30 +240,30 @@ def render_input_tab():
             with col1_form:
                 st.selectbox(
                     "Environmental Impact Assessment (EIA)",
-                    eia_list,
-                    index=eia_list.index(st.session_state.eia_choice),
-                    format_func=lambda x: format_option(x, EIA_STATUS_OPTIONS),
+                    FORM_CHOICES['eia_choice'],
+                    index=FORM_CHOICES['eia_choice'].index(st.session_state.eia_choice),
+                    format_func=FORM_LABELS['eia_choice'],
                     key="eia_choice"
                 )
                 st.selectbox(
                     "Phase I Environmental Site Assessment",
-                    phase1_list,
-                    index=phase1_list.index(st.session_state.phase1_choice),
-                    format_func=lambda x: format_option(x, PHASE1_ESA_OPTIONS),
+                    FORM_CHOICES['phase1_choice'],
+                    index=FORM_CHOICES['phase1_choice'].index(st.session_state.phase1_choice),
+                    format_func=FORM_LABELS['phase1_choice'],
                     key="phase1_choice"
                 )
                 st.selectbox(
                     "Phase II Environmental Site Assessment",
-                    phase2_list,
-                    index=phase2_list.index(st.session_state.phase2_choice),
-                    format_func=lambda x: format_option(x, PHASE2_ESA_OPTIONS),
+                    FORM_CHOICES['phase2_choice'],
+                    index=FORM_CHOICES['phase2_choice'].index(st.session_state.phase2_choice),
+                    format_func=FORM_LABELS['phase2_choice'],
                     key="phase2_choice"
                 )
                 st.selectbox(
                     "Biodiversity Impact Assessment",
-                    biodiversity_list,
-                    index=biodiversity_list.index(st.session_state.biodiversity_choice),
-                    format_func=lambda x: format_option(x, BIODIVERSITY_IMPACT_OPTIONS),
+                    FORM_CHOICES['biodiversity_choice'],
+                    index=FORM_CHOICES['biodiversity_choice'].index(st.session_state.biodiversity_choice),
+                    format_func=FORM_LABELS['biodiversity_choice'],
                     key="biodiversity_choice"
                 )
                 st.number_input(
@@ -243,23 +274,23 @@ def render_input_tab():
             with col2_form:
                 st.selectbox(
                     "Flood Risk Assessment",
-                    flood_list,
-                    index=flood_list.index(st.session_state.flood_choice),
-                    format_func=lambda x: format_option(x, FLOOD_RISK_OPTIONS),
+                    FORM_CHOICES['flood_choice'],
+                    index=FORM_CHOICES['flood_choice'].index(st.session_state.flood_choice),
+                    format_func=FORM_LABELS['flood_choice'],
                     key="flood_choice"
                 )
                 st.selectbox(
                     "Drainage Pattern Analysis",
-                    drainage_list,
-                    index=drainage_list.index(st.session_state.drainage_choice),
-                    format_func=lambda x: format_option(x, DRAINAGE_OPTIONS),
+                    FORM_CHOICES['drainage_choice'],
+                    index=FORM_CHOICES['drainage_choice'].index(st.session_state.drainage_choice),
+                    format_func=FORM_LABELS['drainage_choice'],
                     key="drainage_choice"
                 )
                 st.selectbox(
                     "Seismic Hazard Assessment",
-                    seismic_list,
-                    index=seismic_list.index(st.session_state.seismic_choice),
-                    format_func=lambda x: format_option(x, SEISMIC_ZONE_OPTIONS),
+                    FORM_CHOICES['seismic_choice'],
+                    index=FORM_CHOICES['seismic_choice'].index(st.session_state.seismic_choice),
+                    format_func=FORM_LABELS['seismic_choice'],
                     key="seismic_choice"
                 )
                 st.number_input(
@@ -286,9 +317,9 @@ def render_input_tab():
             with col1_form:
                 st.selectbox(
                     "Utility Availability",
-                    utility_list,
-                    index=utility_list.index(st.session_state.utility_choice),
-                    format_func=lambda x: format_option(x, UTILITY_OPTIONS),
+                    FORM_CHOICES['utility_choice'],
+                    index=FORM_CHOICES['utility_choice'].index(st.session_state.utility_choice),
+                    format_func=FORM_LABELS['utility_choice'],
                     key="utility_choice"
                 )
                 st.number_input(
@@ -299,9 +330,9 @@ def render_input_tab():
             with col2_form:
                 st.selectbox(
                     "Traffic Impact Assessment",
-                    traffic_list,
-                    index=traffic_list.index(st.session_state.traffic_choice),
-                    format_func=lambda x: format_option(x, TRAFFIC_IMPACT_OPTIONS),
+                    FORM_CHOICES['traffic_choice'],
+                    index=FORM_CHOICES['traffic_choice'].index(st.session_state.traffic_choice),
+                    format_func=FORM_LABELS['traffic_choice'],
                     key="traffic_choice"
                 )
 
@@ -309,6 +340,7 @@ def render_input_tab():
 
         # --- Section 6: Desired Project ---
         st.subheader("6. Your Desired Project")
+        project_list = list(CONSTRUCTION_RULES.keys())
         st.selectbox(
             "Select your desired construction project",
             project_list,
@@ -323,85 +355,58 @@ def render_input_tab():
 
         if submitted:
             # Collate all details into session state from the widget keys
-            st.session_state.site_details = {
-                'project_heading': st.session_state.project_heading or "Untitled Site",
-                # Legal & Survey
-                'zoning': st.session_state.zoning_choice,
-                'fsi_available': st.session_state.fsi_available,
-                'envelope_width': st.session_state.envelope_width,
-                'envelope_depth': st.session_state.envelope_depth,
-                'slope_pct': st.session_state.slope_pct,
-                'protected_trees_count': st.session_state.vegetation_survey,
-
-                # Geotechnical (Soil)
-                'spt_n': st.session_state.spt_n_value,
-                'bearing_capacity': st.session_state.bearing_capacity_kpa,
-                'cbr_pct': st.session_state.cbr_pct,
-                'plate_load_settlement_mm': st.session_state.plate_load_settlement_mm,
-                'proctor_compaction': st.session_state.proctor_compaction_pct,
-                'plasticity_index': st.session_state.plasticity_index,
-                'ucs_kpa': st.session_state.ucs_kpa,
-                'soil_texture_key': st.session_state.soil_texture_choice,
-                'soil_texture_score': SOIL_TEXTURE_OPTIONS[st.session_state.soil_texture_choice]['score'],
-                'cohesion_kpa': st.session_state.cohesion_kpa,
-                'friction_angle_deg': st.session_state.friction_angle_deg,
-                'permeability_cm_sec': st.session_state.permeability_cm_sec,
-                'percent_fines': st.session_state.percent_fines,
-                'core_cutter_density': st.session_state.core_cutter_density,
-                'soil_ph': st.session_state.soil_ph,
-
-                # Geotechnical (Water & Contaminants)
-                'groundwater_depth': st.session_state.groundwater_depth_ft,
-                'percolation_rate_min_inch': st.session_state.percolation_rate_min_inch,
-                'soil_resistivity_ohm_m': st.session_state.soil_resistivity_ohm_m,
-                'contaminant_key': st.session_state.contaminant_choice,
-                'contaminant_score': SOIL_CONTAMINANT_OPTIONS[st.session_state.contaminant_choice]['score'],
-                'water_quality_key': st.session_state.water_quality_choice,
-                'water_quality_score': WATER_QUALITY_OPTIONS[st.session_state.water_quality_choice]['score'],
-
-                # Environmental & Risk
-                'eia_key': st.session_state.eia_choice,
-                'eia_score': EIA_STATUS_OPTIONS[st.session_state.eia_choice]['score'],
-                'phase1_key': st.session_state.phase1_choice,
-                'phase1_score': PHASE1_ESA_OPTIONS[st.session_state.phase1_choice]['score'],
-                'phase2_key': st.session_state.phase2_choice,
-                'phase2_score': PHASE2_ESA_OPTIONS[st.session_state.phase2_choice]['score'],
-                'biodiversity_key': st.session_state.biodiversity_choice,
-                'biodiversity_score': BIODIVERSITY_IMPACT_OPTIONS[st.session_state.biodiversity_choice]['score'],
-                'wetland_percentage': st.session_state.wetland_percentage,
-                'flood_key': st.session_state.flood_choice,
-                'flood_score': FLOOD_RISK_OPTIONS[st.session_state.flood_choice]['score'],
-                'drainage_key': st.session_state.drainage_choice,
-                'drainage_score': DRAINAGE_OPTIONS[st.session_state.drainage_choice]['score'],
-                'seismic_key': st.session_state.seismic_choice,
-                'seismic_score': SEISMIC_ZONE_OPTIONS[st.session_state.seismic_choice]['score'],
-                'air_quality_aqi': st.session_state.air_quality_aqi,
-                'noise_level_dba': st.session_state.noise_level_dba,
-                'hazardous_site_proximity_ft': st.session_state.hazardous_site_proximity_ft,
-
-                # Infrastructure & Community
-                'utility_key': st.session_state.utility_choice,
-                'utility_level': UTILITY_OPTIONS[st.session_state.utility_choice]['score'],
-                'pop_density_per_sq_km': st.session_state.pop_density_per_sq_km,
-                'traffic_key': st.session_state.traffic_choice,
-                'traffic_score': TRAFFIC_IMPACT_OPTIONS[st.session_state.traffic_choice]['score'],
-            }
+            # (SiteProfile maps each widget key to its site_details field and derives the scores)
+            st.session_state.site_details = SiteProfile.from_session_state(st.session_state).to_dict()
             st.session_state.desired_project = st.session_state.desired_project_choice
+            coordinates = (st.session_state.site_latitude, st.session_state.site_longitude)
+            if measured_fields and None not in coordinates:
+                # Measured values replace the entered ones; from_dict re-derives the option scores
+                row = dict(st.session_state.site_details, **dict(zip(SITE_COORDINATE_FIELDS, coordinates)))
+                if hazard_index is not None:
+                    fill_hazard_proximity([row], hazard_index)
+                fill_from_layers([row], raster_layers)
+                st.session_state.site_details = SiteProfile.from_dict(row).to_dict()
 
             # --- Run Analysis and store results in session state ---
-            st.session_state.project_issues = check_suitability(
-                st.session_state.site_details,
-                st.session_state.desired_project
-            )
-
-            # "Other Suitable Projects" has been removed
-            # st.session_state.suitable_projects = suitable_projects_list
+            # Resubmitting for the same project only re-runs the rules whose fields changed;
+            # a first analysis comes from the result cache shared by every session
+            previous = st.session_state.evaluation_state
+            if previous and previous['project'] == st.session_state.desired_project:
+                evaluation, st.session_state.analysis_diff = reevaluate(previous, st.session_state.site_details)
+            else:
+                evaluation = cached_start_evaluation(st.session_state.site_details, st.session_state.desired_project)
+                st.session_state.analysis_diff = None
+            st.session_state.evaluation_state = evaluation
+            st.session_state.project_issues = evaluation['issues']
+
+            # "Other Suitable Projects" comes from the bitset index, not one check per project
+            st.session_state.suitable_projects = find_suitable_projects(st.session_state.site_details)
+
+            # Save the analysis (and its report) to the history, noting earlier runs of the same site
+            history = get_history()
+            st.session_state.previous_analyses = []
+            if history is not None:
+                st.session_state.previous_analyses = history.lookup(
+                    st.session_state.site_details, st.session_state.desired_project
+                )
+                history.record(
+                    st.session_state.site_details, st.session_state.desired_project, st.session_state.project_issues,
+                    cached_generate_report_text(
+                        st.session_state.site_details, st.session_state.desired_project,
+                        st.session_state.project_issues, st.session_state.suitable_projects
+                    )
+                )
+
+            # The report tab is outside this fragment, so rerun the whole app to refresh it
+            st.session_state.analysis_complete = True
+            st.rerun()
 
     # After the form, show a success message to guide the user to the next tab
-    if submitted:
+    if st.session_state.pop('analysis_complete', False):
         st.success("Analysis Complete! Click the 'View Analysis Report' tab to see your results.")
 
 
+@st.fragment
 def render_report_tab():
     """
     Renders all the Streamlit widgets for the report page.
@@ -418,11 +423,29 @@ def render_report_tab():
         project_heading = site_details.get('project_heading', 'Untitled Site')
         today_str = datetime.date.today().isoformat()
         project_issues = st.session_state.project_issues
-        # suitable_projects = st.session_state.suitable_projects (Removed)
+        suitable_projects = st.session_state.suitable_projects
 
         # --- PART 1: Check the user's desired project ---
         st.subheader(f"Analysis for: {desired_project}")
 
+        # What changed since the previous analysis of this project
+        analysis_diff = st.session_state.analysis_diff
+        if analysis_diff and analysis_diff['changed_fields']:
+            st.info(
+                f"Since the previous analysis: {len(analysis_diff['added_issues'])} new issue(s), "
+                f"{len(analysis_diff['resolved_issues'])} resolved "
+                f"({len(analysis_diff['evaluated'])} rule(s) re-checked for the changed fields)."
+            )
+            for issue in analysis_diff['resolved_issues']:
+                st.markdown(f"- Resolved: ~~{issue}~~")
+
+        previous_analyses = st.session_state.previous_analyses
+        if previous_analyses:
+            st.caption(
+                f"These measurements were analyzed for {desired_project} {len(previous_analyses)} time(s) before, "
+                f"most recently on {previous_analyses[0]['created']} (see the 'Analysis History' tab)."
+            )
+
         if not project_issues:
             st.success(f"✅ SUCCESS: Your project '{desired_project}' is suitable for this site!")
         else:
@@ -431,76 +454,45 @@ def render_report_tab():
             for issue in project_issues:
                 st.markdown(f"- {issue}")
 
+        # How far the site is from each threshold (negative = fails by that much)
+        with st.expander(f"Rule Margins for {desired_project}", expanded=False):
+            margins = compute_margins(site_details, desired_project)
+            st.caption("Signed distance to each limit: negative fails by that much, zero or more passes. "
+                       "Normalized is relative to the limit (or to the score range for rated options).")
+            st.dataframe(
+                sorted(({'rule': key, **values} for key, values in margins.items()), key=lambda row: row['normalized']),
+                hide_index=True, use_container_width=True
+            )
+
+        # Probability of suitability when the field measurements are uncertain
+        with st.expander("Measurement Uncertainty (Monte Carlo)", expanded=False):
+            render_uncertainty_panel(site_details, desired_project)
+
         st.divider()
 
-        # --- PART 2: "Other Suitable Projects" section has been removed ---
+        # --- PART 2: Other Suitable Projects ---
+        st.subheader("Other Suitable Projects")
+        other_projects = [project for project in suitable_projects if project != desired_project]
+        if other_projects:
+            st.markdown("This site also meets every requirement for:")
+            for project in other_projects:
+                st.markdown(f"- ✅ {project}")
+        else:
+            st.info("No other project types in the database are suitable for this site.")
+
+        st.divider()
 
         # --- Display Summary Expander ---
         expander_title = f"Details for '{project_heading}' (Report Date: {today_str}) - Click to Expand & Download"
         with st.expander(expander_title, expanded=False):
 
-            # Generate report text without suitable_projects
-            report_data = generate_report_text(site_details, desired_project, project_issues)
+            report_data = cached_generate_report_text(site_details, desired_project, project_issues, suitable_projects)
 
             st.subheader("Site Details Summary")
 
-            st.markdown(f"**Legal, Survey & Site:**")
-            st.json({
-                'Zoning': f"{site_details['zoning']} ({ZONING_OPTIONS[site_details['zoning']]['desc']})",
-                'Slope': f"{site_details['slope_pct']}%",
-                'FSI': site_details['fsi_available'],
-                'Envelope': f"{site_details['envelope_width']} ft (Width) x {site_details['envelope_depth']} ft (Depth)",
-                'Protected Trees': site_details['protected_trees_count']
-            })
-
-            st.markdown(f"**Geotechnical (Soil Properties):**")
-            st.json({
-                'SPT N-value': site_details['spt_n'],
-                'Bearing Capacity': f"{site_details['bearing_capacity']} kPa",
-                'CBR': f"{site_details['cbr_pct']}%",
-                'Plate Load Settlement': f"{site_details['plate_load_settlement_mm']} mm",
-                'Proctor Compaction': f"{site_details['proctor_compaction']}%",
-                'Plasticity Index': site_details['plasticity_index'],
-                'UCS': f"{site_details['ucs_kpa']} kPa",
-                'Soil Texture': f"{site_details['soil_texture_key']} ({SOIL_TEXTURE_OPTIONS[site_details['soil_texture_key']]['desc']})",
-                'Cohesion': f"{site_details['cohesion_kpa']} kPa",
-                'Friction Angle': f"{site_details['friction_angle_deg']}°",
-                'Permeability': f"{site_details['permeability_cm_sec']} cm/sec",
-                'Percent Fines': f"{site_details['percent_fines']}%",
-                'Dry Density': f"{site_details['core_cutter_density']} kg/m³",
-                'Soil pH': site_details['soil_ph']
-            })
-
-            st.markdown(f"**Geotechnical (Water & Contaminants):**")
-            st.json({
-                'Groundwater Depth': f"{site_details['groundwater_depth']} ft",
-                'Percolation Rate': f"{site_details['percolation_rate_min_inch']} min/inch",
-                'Soil Resistivity': f"{site_details['soil_resistivity_ohm_m']} Ohm-m",
-                'Contaminants': f"{site_details['contaminant_key']} ({SOIL_CONTAMINANT_OPTIONS[site_details['contaminant_key']]['desc']})",
-                'Water Quality': f"{site_details['water_quality_key']} ({WATER_QUALITY_OPTIONS[site_details['water_quality_key']]['desc']})"
-            })
-
-            st.markdown(f"**Environmental & Risk:**")
-            st.json({
-                'EIA': f"{site_details['eia_key']} ({EIA_STATUS_OPTIONS[site_details['eia_key']]['desc']})",
-                'Phase I ESA': f"{site_details['phase1_key']} ({PHASE1_ESA_OPTIONS[site_details['phase1_key']]['desc']})",
-                'Phase II ESA': f"{site_details['phase2_key']} ({PHASE2_ESA_OPTIONS[site_details['phase2_key']]['desc']})",
-                'Biodiversity Impact': f"{site_details['biodiversity_key']} ({BIODIVERSITY_IMPACT_OPTIONS[site_details['biodiversity_key']]['desc']})",
-                'Wetland %': f"{site_details['wetland_percentage']}%",
-                'Flood Risk': f"{site_details['flood_key']} ({FLOOD_RISK_OPTIONS[site_details['flood_key']]['desc']})",
-                'Drainage': f"{site_details['drainage_key']} ({DRAINAGE_OPTIONS[site_details['drainage_key']]['desc']})",
-                'Seismic': f"{site_details['seismic_key']} ({SEISMIC_ZONE_OPTIONS[site_details['seismic_key']]['desc']})",
-                'Air Quality (AQI)': site_details['air_quality_aqi'],
-                'Noise Level (dBA)': site_details['noise_level_dba'],
-                'Hazardous Site Proximity': f"{site_details['hazardous_site_proximity_ft']} ft"
-            })
-
-            st.markdown(f"**Infrastructure & Community:**")
-            st.json({
-                'Utilities': f"{site_details['utility_key']} ({UTILITY_OPTIONS[site_details['utility_key']]['desc']})",
-                'Population Density': f"{site_details['pop_density_per_sq_km']} people/km²",
-                'Traffic Impact': f"{site_details['traffic_key']} ({TRAFFIC_IMPACT_OPTIONS[site_details['traffic_key']]['desc']})"
-            })
+            for section_title, section_values in cached_format_site_summary(site_details):
+                st.markdown(f"**{section_title}:**")
+                st.json(section_values)
 
             st.divider()
 
@@ -514,6 +506,55 @@ def render_report_tab():
 
         st.divider()
 
+# Field label, distribution and help for each input of the uncertainty panel
+# (the defaults come from logic.DEFAULT_MEASUREMENT_UNCERTAINTY).
+UNCERTAINTY_INPUTS = {
+    'spt_n': ("SPT N-value ± (std. dev.)", "Scatter of the N-value between borings."),
+    'bearing_capacity': ("Bearing Capacity (log std. dev.)", "0.15 is roughly ±15%."),
+    'groundwater_depth': ("Groundwater Depth ± ft (std. dev.)", "Seasonal and measurement variation."),
+    'percolation_rate_min_inch': ("Percolation Rate (log std. dev.)", "0.25 is roughly ±25%."),
+}
+
+def render_uncertainty_panel(site_details, desired_project):
+    """
+    Renders the Monte Carlo panel of the report tab: per-field uncertainty
+    inputs, then the pass probability of every project and the rules that bind.
+    """
+    with st.form(key="uncertainty_form"):
+        col1_form, col2_form = st.columns(2)
+        spreads = {}
+        for position, (field, (label, help_text)) in enumerate(UNCERTAINTY_INPUTS.items()):
+            with (col1_form if position % 2 == 0 else col2_form):
+                spreads[field] = st.number_input(
+                    label, min_value=0.0, step=0.05,
+                    value=float(DEFAULT_MEASUREMENT_UNCERTAINTY[field][1]),
+                    help=help_text, key=f"uncertainty_{field}"
+                )
+        samples = st.select_slider("Scenarios", options=[10_000, 100_000, 1_000_000], value=100_000)
+        simulate = st.form_submit_button("Run Simulation", use_container_width=True)
+
+    if not simulate:
+        st.caption("Set how uncertain each measurement is, then run the simulation.")
+        return
+
+    uncertainty = {field: (DEFAULT_MEASUREMENT_UNCERTAINTY[field][0], spread) for field, spread in spreads.items()}
+    results = simulate_suitability(site_details, uncertainty, samples=samples, seed=0)
+
+    desired = results[desired_project]
+    st.metric(f"Probability '{desired_project}' is suitable", f"{desired['pass_probability']:.1%}")
+    if desired['binding']:
+        st.markdown("**Most frequently binding constraints:**")
+        st.dataframe(
+            [{'rule': key, 'share of scenarios failing': rate} for key, rate in list(desired['binding'].items())[:5]],
+            hide_index=True, use_container_width=True
+        )
+    st.markdown("**All projects:**")
+    st.dataframe(
+        [{'project': project, 'pass probability': result['pass_probability']} for project, result in results.items()],
+        hide_index=True, use_container_width=True
+    )
+
+@st.fragment
 def render_requirements_tab():
     """
     Renders the "Check Project Requirements" tool in its own tab.
@@ -539,11 +580,11 @@ def render_requirements_tab():
     if selected_project_to_check != "Select a project...":
 
         # Get the formatted rules
-        rules_display = format_rules_for_display(selected_project_to_check)
+        rules_display = cached_format_rules_for_display(selected_project_to_check)
         st.json(rules_display)
 
         # Generate text for download
-        rules_text = generate_rules_text(selected_project_to_check)
+        rules_text = cached_generate_rules_text(selected_project_to_check)
 
         st.download_button(
             label=f"Download Requirements for {selected_project_to_check} (.txt)",
@@ -551,4 +592,142 @@ def render_requirements_tab():
             file_name=f"Requirements_{selected_project_to_check}.txt",
             mime="text/plain",
             use_container_width=True
-        )
\ No newline at end of file
+        )
+
+def _reset_history_pages():
+    # A filter changed: go back to the newest page.
+    st.session_state.history_pages = [None]
+
+def _next_history_page(before_id):
+    st.session_state.history_pages.append(before_id)
+
+def _previous_history_page():
+    st.session_state.history_pages.pop()
+
+# "Result" filter choice -> value of the suitable column (None = any)
+HISTORY_OUTCOMES = {"All results": None, "Suitable": True, "Not suitable": False}
+
+@st.fragment
+def render_history_tab():
+    """
+    Renders the saved analyses (see history.py), newest first, with filters
+    and one page of DEFAULT_PAGE_SIZE at a time.
+    """
+    st.header("Analysis History")
+    history = get_history()
+    if history is None:
+        st.info("The analysis history is turned off or could not be opened (see the ADVISOR_HISTORY setting).")
+        return
+
+    # --- Filters ---
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        project = st.selectbox("Project", ["All projects"] + list(CONSTRUCTION_RULES),
+                               key="history_project", on_change=_reset_history_pages)
+    with col2:
+        outcome = st.selectbox("Result", list(HISTORY_OUTCOMES), key="history_outcome", on_change=_reset_history_pages)
+    with col3:
+        zoning = st.selectbox("Zoning", ["All zones"] + list(FORM_CHOICES['zoning_choice']),
+                              format_func=lambda key: key if key == "All zones" else FORM_LABELS['zoning_choice'](key),
+                              key="history_zoning", on_change=_reset_history_pages)
+    with col4:
+        dates = st.date_input("Date range", value=(), key="history_dates", on_change=_reset_history_pages)
+
+    filters = {
+        'project': None if project == "All projects" else project,
+        'suitable': HISTORY_OUTCOMES[outcome],
+        'zoning': None if zoning == "All zones" else zoning,
+        'date_from': dates[0].isoformat() if len(dates) > 0 else None,
+        'date_to': dates[1].isoformat() if len(dates) > 1 else None,
+    }
+
+    # --- One page (one row more than shown, to know whether there is a next page) ---
+    pages = st.session_state.history_pages
+    rows = history.page(**filters, before_id=pages[-1], limit=DEFAULT_PAGE_SIZE + 1)
+    has_next = len(rows) > DEFAULT_PAGE_SIZE
+    rows = rows[:DEFAULT_PAGE_SIZE]
+
+    st.caption(f"{history.count(**filters)} matching analyses - page {len(pages)}")
+    if not rows:
+        st.info("No saved analyses match these filters yet.")
+        return
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("Newer", on_click=_previous_history_page, disabled=len(pages) == 1, use_container_width=True)
+    with col2:
+        st.button("Older", on_click=_next_history_page, args=(rows[-1]['id'],), disabled=not has_next,
+                  use_container_width=True)
+
+    # --- One analysis in full ---
+    analysis_id = st.selectbox(
+        "Open analysis", [row['id'] for row in rows], key="history_open",
+        format_func=lambda row_id: next(
+            f"#{row['id']} - {row['project_heading']} - {row['project']} ({row['created']})" for row in rows if row['id'] == row_id
+        )
+    )
+    analysis = history.get(analysis_id)
+    if analysis['issues']:
+        st.markdown("**Issues Found:**")
+        for issue in analysis['issues']:
+            st.markdown(f"- {issue}")
+    else:
+        st.success(f"✅ '{analysis['project']}' was suitable for this site.")
+    with st.expander("Site Details", expanded=False):
+        st.json(analysis['site_details'])
+    if analysis['report'] is not None:
+        st.download_button(
+            label="Download Saved Report (.txt)",
+            data=analysis['report'],
+            file_name=f"Construction_Analysis_{analysis['created'][:10]}_{analysis['id']}.txt",
+            mime="text/plain",
+            use_container_width=True
+        )
+
+@st.fragment
+def render_diagnostics_panel():
+    """
+    Renders the hidden diagnostics panel (open the app with ?diagnostics=1):
+    per-rule engine counters and the result cache statistics. Call it inside
+    `with st.sidebar:` - a fragment cannot write to the sidebar itself.
+    """
+    st.header("Diagnostics")
+
+    # The counters are process-wide, so this toggle affects every session.
+    profiling = st.toggle(
+        "Profile rule evaluation",
+        value=rule_profiling_enabled(),
+        help="Counts evaluations, violations and time per rule for every session on this server. "
+             "Analyses served from the result cache are not re-evaluated, so they are not counted."
+    )
+    if profiling and not rule_profiling_enabled():
+        start_rule_profiling()
+    elif not profiling and rule_profiling_enabled():
+        stop_rule_profiling()
+
+    profile = get_rule_profile()
+    if profile:
+        st.dataframe(
+            [{'rule': key, **counters} for key, counters in profile.items()],
+            hide_index=True, use_container_width=True
+        )
+        st.download_button(
+            label="Download Rule Profile (.json)",
+            data=rule_profile_json(),
+            file_name=f"Rule_Profile_{datetime.date.today().isoformat()}.json",
+            mime="application/json",
+            use_container_width=True
+        )
+        st.button("Reset Counters", on_click=start_rule_profiling, use_container_width=True)
+        st.button(
+            "Reorder First-Failure Screening",
+            on_click=update_screening_order,
+            help=f"Tries the rules most often violated above first (rules with at least {MIN_OBSERVATIONS} evaluations).",
+            use_container_width=True
+        )
+    elif profiling:
+        st.caption("No rules evaluated yet. Run an analysis to collect counters.")
+
+    st.subheader("Result Cache")
+    st.json(RESULT_CACHE.stats())